@@ -0,0 +1,377 @@
+import { spawn, type ChildProcess } from 'node:child_process';
+import { writeFile } from 'node:fs/promises';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+import pg from 'pg';
+import dotenv from 'dotenv';
+import { startMockTarget, startFakeSendgrid } from './servers.js';
+
+dotenv.config();
+
+// End-to-end throughput benchmark. Boots the API and a worker against the
+// local Postgres and Redis from .env (migrated, and ideally disposable), with
+// a mock HTTP target and a fake SendGrid, then drives webhook, manual and
+// cron triggers at fixed rates and reports throughput, trigger-to-completion
+// latency, DB queries per execution and worker memory.
+//
+//   npm run bench                       defaults below
+//   BENCH_WEBHOOK_RATE=100 npm run bench
+
+const DURATION_S = parseInt(process.env.BENCH_DURATION_S || '30');
+// Triggers per second
+const WEBHOOK_RATE = parseFloat(process.env.BENCH_WEBHOOK_RATE || '20');
+const MANUAL_RATE = parseFloat(process.env.BENCH_MANUAL_RATE || '5');
+// Each cron workflow fires once per second
+const CRON_WORKFLOWS = parseInt(process.env.BENCH_CRON_WORKFLOWS || '2');
+// Latency of the mock target and size of its responses
+const TARGET_LATENCY_MS = parseInt(process.env.BENCH_TARGET_LATENCY_MS || '20');
+const TARGET_ITEMS = parseInt(process.env.BENCH_TARGET_ITEMS || '50');
+const SENDGRID_LATENCY_MS = parseInt(process.env.BENCH_SENDGRID_LATENCY_MS || '50');
+// How long to wait for in-flight executions after the load stops
+const DRAIN_TIMEOUT_S = parseInt(process.env.BENCH_DRAIN_TIMEOUT_S || '60');
+const OUTPUT_FILE = process.env.BENCH_OUTPUT;
+const VERBOSE = process.env.BENCH_VERBOSE === '1';
+
+const API_PORT = parseInt(process.env.BENCH_API_PORT || '3901');
+const MOCK_TARGET_PORT = API_PORT + 1;
+const FAKE_SENDGRID_PORT = API_PORT + 2;
+const API_METRICS_PORT = API_PORT + 3;
+const WORKER_METRICS_PORT = API_PORT + 4;
+
+const API_URL = `http://localhost:${API_PORT}`;
+const BACKEND_DIR = path.resolve(path.dirname(fileURLToPath(import.meta.url)), '..');
+
+interface Trigger {
+  kind: 'webhook' | 'manual' | 'schedule';
+  sentAt: number;
+}
+
+// Helpers
+
+function percentile(sorted: number[], p: number): number {
+  if (sorted.length === 0) return 0;
+  const index = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1);
+  return sorted[Math.max(0, index)];
+}
+
+function sleep(ms: number): Promise<void> {
+  return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+function startProcess(name: string, entry: string, env: Record<string, string>): ChildProcess {
+  const child = spawn(process.execPath, ['--import', 'tsx', entry], {
+    cwd: BACKEND_DIR,
+    env: { ...process.env, ...env },
+    stdio: VERBOSE ? 'inherit' : ['ignore', 'ignore', 'inherit'],
+  });
+  child.on('exit', (code, signal) => {
+    if (!shuttingDown) {
+      console.error(`${name} exited unexpectedly (${signal || code})`);
+      process.exit(1);
+    }
+  });
+  return child;
+}
+
+async function api(method: string, route: string, token?: string, body?: any): Promise<any> {
+  const response = await fetch(`${API_URL}${route}`, {
+    method,
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+    body: body === undefined ? undefined : JSON.stringify(body),
+  });
+  const json: any = await response.json().catch(() => ({}));
+  if (!response.ok) {
+    throw new Error(`${method} ${route} failed (${response.status}): ${json.error || response.statusText}`);
+  }
+  return json.data;
+}
+
+async function metrics(port: number): Promise<Record<string, any>> {
+  const response = await fetch(`http://localhost:${port}/metrics`);
+  return response.json() as Promise<Record<string, any>>;
+}
+
+async function waitFor(check: () => Promise<unknown>, timeoutMs: number, what: string): Promise<void> {
+  const deadline = Date.now() + timeoutMs;
+  for (;;) {
+    try {
+      await check();
+      return;
+    } catch (error) {
+      if (Date.now() > deadline) {
+        throw new Error(`Timed out waiting for ${what}: ${error instanceof Error ? error.message : error}`);
+      }
+      await sleep(250);
+    }
+  }
+}
+
+function benchSteps() {
+  return [
+    {
+      id: 'fetch',
+      type: 'http_request',
+      config: {
+        method: 'GET',
+        url: `http://localhost:${MOCK_TARGET_PORT}/items?count=${TARGET_ITEMS}&delay=${TARGET_LATENCY_MS}`,
+      },
+    },
+    {
+      id: 'summary',
+      type: 'transform_data',
+      config: {
+        language: 'expression',
+        expression: "{ 'count': $count(fetch.response.body.items), 'total': $sum(fetch.response.body.items.price) }",
+      },
+    },
+    {
+      id: 'notify',
+      type: 'send_email',
+      config: {
+        to: 'bench@example.com',
+        subject: 'Benchmark digest',
+        body: 'Items: {{summary.response.count}}, total: {{summary.response.total}}',
+      },
+    },
+  ];
+}
+
+// Run
+
+let shuttingDown = false;
+
+async function main() {
+  const mockTarget = startMockTarget(MOCK_TARGET_PORT);
+  const fakeSendgrid = startFakeSendgrid(FAKE_SENDGRID_PORT, SENDGRID_LATENCY_MS);
+
+  const childEnv = {
+    PORT: String(API_PORT),
+    API_METRICS_PORT: String(API_METRICS_PORT),
+    WORKER_METRICS_PORT: String(WORKER_METRICS_PORT),
+    SENDGRID_API_KEY: 'SG.benchmark',
+    SENDGRID_API_BASE_URL: `http://localhost:${FAKE_SENDGRID_PORT}`,
+    EMAIL_FROM: 'bench@example.com',
+  };
+  const apiProcess = startProcess('API', 'src/index.ts', childEnv);
+  const workerProcess = startProcess('Worker', 'src/worker.ts', childEnv);
+
+  const db = new pg.Pool({ connectionString: process.env.DATABASE_URL, max: 2 });
+  const workflowIds: string[] = [];
+  let token = '';
+
+  const cleanup = async () => {
+    shuttingDown = true;
+    for (const id of workflowIds) {
+      await api('DELETE', `/api/workflows/${id}`, token).catch(() => {});
+    }
+    apiProcess.kill('SIGTERM');
+    workerProcess.kill('SIGTERM');
+    mockTarget.server.close();
+    fakeSendgrid.server.close();
+    await db.end();
+  };
+
+  try {
+    await waitFor(() => api('GET', '/health').then(() => metrics(WORKER_METRICS_PORT)), 30000, 'API and worker');
+
+    // Setup: a fresh user and one workflow per trigger type
+    const email = `bench-${Date.now()}@example.com`;
+    await api('POST', '/api/auth/register', undefined, { email, password: 'benchmark-password', name: 'Benchmark' });
+    token = (await api('POST', '/api/auth/login', undefined, { email, password: 'benchmark-password' })).token;
+
+    const createWorkflow = async (name: string, trigger: Record<string, any>) => {
+      const workflow = await api('POST', '/api/workflows', token, {
+        name,
+        workflow_definition: { trigger, steps: benchSteps() },
+      });
+      workflowIds.push(workflow.id);
+      return workflow;
+    };
+
+    const webhookWorkflow = await createWorkflow('bench-webhook', { type: 'webhook' });
+    await api('POST', `/api/workflows/${webhookWorkflow.id}/activate`, token);
+    const manualWorkflow = await createWorkflow('bench-manual', { type: 'manual' });
+    const cronWorkflows = [];
+    for (let i = 0; i < CRON_WORKFLOWS; i++) {
+      cronWorkflows.push(await createWorkflow(`bench-cron-${i}`, { type: 'schedule', cron: '* * * * * *' }));
+    }
+
+    const [apiBefore, workerBefore] = await Promise.all([metrics(API_METRICS_PORT), metrics(WORKER_METRICS_PORT)]);
+
+    console.log(
+      `🏁 Driving ${WEBHOOK_RATE} webhooks/s, ${MANUAL_RATE} manual runs/s and ${CRON_WORKFLOWS} cron workflows for ${DURATION_S}s`
+    );
+
+    const triggers = new Map<string, Trigger>();
+    let triggerErrors = 0;
+    const startedAt = Date.now();
+
+    for (const workflow of cronWorkflows) {
+      await api('POST', `/api/workflows/${workflow.id}/activate`, token);
+    }
+
+    // Memory of the worker, sampled through the run
+    let peakRss = 0;
+    let peakHeapUsed = 0;
+    const sampler = setInterval(async () => {
+      try {
+        const { memory } = await metrics(WORKER_METRICS_PORT);
+        peakRss = Math.max(peakRss, memory.rss);
+        peakHeapUsed = Math.max(peakHeapUsed, memory.heapUsed);
+      } catch {
+        // A missed sample is fine
+      }
+    }, 1000);
+
+    // Open-loop load: requests go out on schedule whether or not earlier
+    // ones have finished, so server slowdowns show up as latency
+    const fire = (kind: 'webhook' | 'manual') => {
+      const sentAt = Date.now();
+      const request = kind === 'webhook'
+        ? api('POST', `/api/webhooks/${webhookWorkflow.webhook_id}`, undefined, { sentAt })
+        : api('POST', `/api/workflows/${manualWorkflow.id}/run`, token, { triggerData: { sentAt } });
+      request.then(
+        (data) => triggers.set(data.executionId, { kind, sentAt }),
+        () => triggerErrors++
+      );
+    };
+
+    let webhooksSent = 0;
+    let manualSent = 0;
+    await new Promise<void>(resolve => {
+      const driver = setInterval(() => {
+        const elapsed = (Date.now() - startedAt) / 1000;
+        if (elapsed >= DURATION_S) {
+          clearInterval(driver);
+          resolve();
+          return;
+        }
+        while (webhooksSent < Math.floor(elapsed * WEBHOOK_RATE)) {
+          webhooksSent++;
+          fire('webhook');
+        }
+        while (manualSent < Math.floor(elapsed * MANUAL_RATE)) {
+          manualSent++;
+          fire('manual');
+        }
+      }, 10);
+    });
+
+    for (const workflow of cronWorkflows) {
+      await api('POST', `/api/workflows/${workflow.id}/deactivate`, token);
+    }
+    const loadEndedAt = Date.now();
+
+    // Wait for every execution started during the run to finish
+    const loadWorkflowIds = [webhookWorkflow.id, manualWorkflow.id, ...cronWorkflows.map(w => w.id)];
+    let rows: any[] = [];
+    const drainDeadline = Date.now() + DRAIN_TIMEOUT_S * 1000;
+    for (;;) {
+      const result = await db.query(
+        `SELECT id, workflow_id, status, created_at, completed_at,
+                trigger_data->>'scheduledAt' AS scheduled_at
+         FROM workflow_executions WHERE workflow_id = ANY($1)`,
+        [loadWorkflowIds]
+      );
+      rows = result.rows;
+      const unfinished = rows.filter(row => row.status !== 'completed' && row.status !== 'failed').length;
+      const expected = webhooksSent + manualSent - triggerErrors;
+      if ((unfinished === 0 && rows.length >= expected) || Date.now() > drainDeadline) {
+        break;
+      }
+      await sleep(500);
+    }
+    clearInterval(sampler);
+
+    const [apiAfter, workerAfter] = await Promise.all([metrics(API_METRICS_PORT), metrics(WORKER_METRICS_PORT)]);
+
+    // Latency from the trigger (client send time, or the cron tick) to completion
+    const latencies: Record<string, number[]> = { webhook: [], manual: [], schedule: [], all: [] };
+    let completed = 0;
+    let failed = 0;
+    let lastCompletion = startedAt;
+
+    for (const row of rows) {
+      if (row.status === 'failed') failed++;
+      if (row.status !== 'completed') continue;
+      completed++;
+
+      const completedAt = new Date(row.completed_at).getTime();
+      lastCompletion = Math.max(lastCompletion, completedAt);
+      const trigger = triggers.get(row.id);
+      const kind = trigger?.kind || 'schedule';
+      const triggeredAt = trigger?.sentAt ?? new Date(row.scheduled_at ?? row.created_at).getTime();
+      const latency = completedAt - triggeredAt;
+
+      latencies[kind].push(latency);
+      latencies.all.push(latency);
+    }
+
+    const dbQueries = (apiAfter.db.queries - apiBefore.db.queries) + (workerAfter.db.queries - workerBefore.db.queries);
+    const summary = {
+      config: {
+        durationS: DURATION_S,
+        webhookRate: WEBHOOK_RATE,
+        manualRate: MANUAL_RATE,
+        cronWorkflows: CRON_WORKFLOWS,
+        targetLatencyMs: TARGET_LATENCY_MS,
+        targetItems: TARGET_ITEMS,
+      },
+      executions: {
+        total: rows.length,
+        completed,
+        failed,
+        unfinished: rows.length - completed - failed,
+        triggerErrors,
+        perSecond: completed / ((lastCompletion - startedAt) / 1000),
+        drainMs: lastCompletion - loadEndedAt,
+      },
+      latencyMs: Object.fromEntries(
+        Object.entries(latencies).map(([kind, values]) => {
+          const sorted = values.sort((a, b) => a - b);
+          return [kind, {
+            count: sorted.length,
+            p50: percentile(sorted, 50),
+            p95: percentile(sorted, 95),
+            p99: percentile(sorted, 99),
+            max: sorted[sorted.length - 1] || 0,
+          }];
+        })
+      ),
+      dbQueriesPerExecution: rows.length > 0 ? dbQueries / rows.length : 0,
+      worker: {
+        peakRssMb: Math.round(peakRss / 1024 / 1024),
+        peakHeapUsedMb: Math.round(peakHeapUsed / 1024 / 1024),
+      },
+      outbound: {
+        targetRequests: mockTarget.stats.requests,
+        sendgridRequests: fakeSendgrid.stats.requests,
+        emails: fakeSendgrid.stats.emails,
+      },
+    };
+
+    console.log(`\n📊 ${completed} executions completed, ${summary.executions.perSecond.toFixed(1)}/s`);
+    console.table(summary.latencyMs);
+    console.log(`DB queries per execution: ${summary.dbQueriesPerExecution.toFixed(1)}`);
+    console.log(`Worker peak RSS: ${summary.worker.peakRssMb}MB (heap ${summary.worker.peakHeapUsedMb}MB)`);
+    console.log(`SendGrid: ${summary.outbound.emails} emails in ${summary.outbound.sendgridRequests} requests`);
+    if (failed > 0 || summary.executions.unfinished > 0 || triggerErrors > 0) {
+      console.log(`⚠️ ${failed} failed, ${summary.executions.unfinished} unfinished, ${triggerErrors} trigger errors`);
+    }
+
+    if (OUTPUT_FILE) {
+      await writeFile(OUTPUT_FILE, JSON.stringify(summary, null, 2));
+      console.log(`Results written to ${OUTPUT_FILE}`);
+    }
+  } finally {
+    await cleanup();
+  }
+}
+
+main().catch((error) => {
+  console.error('Benchmark failed:', error);
+  process.exit(1);
+});
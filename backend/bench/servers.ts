@@ -0,0 +1,84 @@
+import http from 'node:http';
+import { randomUUID } from 'node:crypto';
+
+// Local stand-ins for the outside world during benchmarks: an HTTP target
+// for http_request steps and a fake SendGrid v3 mail endpoint.
+
+export interface MockTargetStats {
+  requests: number;
+}
+
+// GET /items?count=N&delay=MS answers with N items after MS milliseconds;
+// any other request is echoed back after the delay
+export function startMockTarget(port: number): { server: http.Server; stats: MockTargetStats } {
+  const stats: MockTargetStats = { requests: 0 };
+
+  const server = http.createServer((req, res) => {
+    stats.requests++;
+    const url = new URL(req.url || '/', `http://localhost:${port}`);
+    const delay = parseInt(url.searchParams.get('delay') || '0');
+    const chunks: Buffer[] = [];
+
+    req.on('data', chunk => chunks.push(chunk));
+    req.on('end', () => {
+      setTimeout(() => {
+        let body: any;
+        if (url.pathname === '/items') {
+          const count = parseInt(url.searchParams.get('count') || '10');
+          body = {
+            items: Array.from({ length: count }, (_, i) => ({ id: i, name: `item-${i}`, price: (i % 50) + 0.99 })),
+          };
+        } else {
+          body = { method: req.method, path: url.pathname, body: Buffer.concat(chunks).toString() };
+        }
+        res.writeHead(200, { 'Content-Type': 'application/json' });
+        res.end(JSON.stringify(body));
+      }, delay);
+    });
+  });
+
+  server.listen(port);
+  return { server, stats };
+}
+
+export interface FakeSendgridStats {
+  requests: number;
+  emails: number;
+}
+
+// Accepts POST /v3/mail/send like SendGrid (202 + X-Message-Id) and counts
+// requests and personalizations; nothing is delivered
+export function startFakeSendgrid(port: number, latencyMs = 0): { server: http.Server; stats: FakeSendgridStats } {
+  const stats: FakeSendgridStats = { requests: 0, emails: 0 };
+
+  const server = http.createServer((req, res) => {
+    const chunks: Buffer[] = [];
+    req.on('data', chunk => chunks.push(chunk));
+    req.on('end', () => {
+      if (req.method !== 'POST' || req.url !== '/v3/mail/send') {
+        res.writeHead(404).end();
+        return;
+      }
+
+      let payload: any;
+      try {
+        payload = JSON.parse(Buffer.concat(chunks).toString());
+      } catch {
+        res.writeHead(400, { 'Content-Type': 'application/json' });
+        res.end(JSON.stringify({ errors: [{ message: 'Invalid JSON' }] }));
+        return;
+      }
+
+      stats.requests++;
+      stats.emails += payload.personalizations?.length || 0;
+
+      setTimeout(() => {
+        res.writeHead(202, { 'X-Message-Id': randomUUID() });
+        res.end();
+      }, latencyMs);
+    });
+  });
+
+  server.listen(port);
+  return { server, stats };
+}
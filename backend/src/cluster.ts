@@ -0,0 +1,96 @@
+import cluster, { type Worker } from 'node:cluster';
+import os from 'node:os';
+import dotenv from 'dotenv';
+
+dotenv.config();
+
+// Clustered worker mode: a supervisor forks WORKER_PROCESSES copies of the
+// worker entry point (default: one per core). Children inherit the
+// environment, so they share the same Redis and Postgres settings.
+
+const WORKER_PROCESSES = parseInt(process.env.WORKER_PROCESSES || String(os.availableParallelism()));
+// Postgres connections for all children together, so adding cores does not
+// multiply them past the server's max_connections
+const DB_POOL_MAX = parseInt(process.env.DB_POOL_MAX || '20');
+const CHILD_DB_POOL_MAX = Math.max(2, Math.floor(DB_POOL_MAX / WORKER_PROCESSES));
+const RESTART_BACKOFF_MS = parseInt(process.env.WORKER_RESTART_BACKOFF_MS || '1000');
+const RESTART_BACKOFF_MAX_MS = parseInt(process.env.WORKER_RESTART_BACKOFF_MAX_MS || '30000');
+const SHUTDOWN_TIMEOUT_MS = parseInt(process.env.WORKER_SHUTDOWN_TIMEOUT_MS || '30000');
+// A child that stays up this long resets its restart backoff
+const STABLE_AFTER_MS = 60 * 1000;
+
+interface Slot {
+  worker: Worker | null;
+  startedAt: number;
+  failures: number;
+}
+
+function runSupervisor() {
+  const slots: Slot[] = [];
+  let shuttingDown = false;
+
+  const fork = (index: number) => {
+    const slot = slots[index];
+    slot.worker = cluster.fork({ WORKER_INDEX: String(index), DB_POOL_MAX: String(CHILD_DB_POOL_MAX) });
+    slot.startedAt = Date.now();
+
+    slot.worker.on('exit', (code, signal) => {
+      slot.worker = null;
+      if (shuttingDown) {
+        return;
+      }
+
+      slot.failures = Date.now() - slot.startedAt > STABLE_AFTER_MS ? 1 : slot.failures + 1;
+      const backoff = Math.min(RESTART_BACKOFF_MS * 2 ** (slot.failures - 1), RESTART_BACKOFF_MAX_MS);
+      console.error(`⚠️ Worker process ${index} exited (${signal || code}), restarting in ${backoff}ms`);
+      setTimeout(() => {
+        if (!shuttingDown) fork(index);
+      }, backoff);
+    });
+  };
+
+  console.log(`🔧 Starting ${WORKER_PROCESSES} worker processes...`);
+  for (let i = 0; i < WORKER_PROCESSES; i++) {
+    slots.push({ worker: null, startedAt: 0, failures: 0 });
+    fork(i);
+  }
+
+  // Graceful shutdown: children drain their BullMQ workers on SIGTERM
+  const shutdown = (signal: NodeJS.Signals) => {
+    if (shuttingDown) return;
+    shuttingDown = true;
+    console.log(`Received ${signal}, draining worker processes...`);
+
+    const running = slots.filter(slot => slot.worker).map(slot => slot.worker!);
+    if (running.length === 0) {
+      process.exit(0);
+    }
+
+    let remaining = running.length;
+    for (const worker of running) {
+      worker.once('exit', () => {
+        if (--remaining === 0) {
+          process.exit(0);
+        }
+      });
+      worker.process.kill('SIGTERM');
+    }
+
+    setTimeout(() => {
+      console.error('Worker processes did not drain in time, forcing exit');
+      for (const worker of running) {
+        worker.process.kill('SIGKILL');
+      }
+      process.exit(1);
+    }, SHUTDOWN_TIMEOUT_MS).unref();
+  };
+
+  process.on('SIGTERM', shutdown);
+  process.on('SIGINT', shutdown);
+}
+
+if (cluster.isPrimary) {
+  runSupervisor();
+} else {
+  await import('./worker.js');
+}
@@ -1,5 +1,6 @@
 import pg from 'pg';
 import dotenv from 'dotenv';
+import { registerMetricsSource } from '../lib/metrics.js';
 
 dotenv.config();
 
@@ -7,7 +8,9 @@ const { Pool } = pg;
 
 export const pool = new Pool({
   connectionString: process.env.DATABASE_URL,
-  max: 20,
+  // Connections this process may hold; the cluster runner splits its own
+  // budget between children through the same variable
+  max: parseInt(process.env.DB_POOL_MAX || '20'),
   idleTimeoutMillis: 30000,
   connectionTimeoutMillis: 2000,
 });
@@ -17,14 +20,113 @@ pool.on('error', (err) => {
   process.exit(-1);
 });
 
-export async function query<T extends pg.QueryResultRow = any>(text: string, params?: any[]): Promise<pg.QueryResult<T>> {
-  const start = Date.now();
-  const res = await pool.query<T>(text, params);
-  const duration = Date.now() - start;
-  console.log('Executed query', { text: text.substring(0, 50), duration, rows: res.rowCount });
+// Slow statements are logged, not every statement: at most a sampled share
+// of those over the threshold
+const SLOW_QUERY_MS = parseInt(process.env.DB_SLOW_QUERY_MS || '250');
+const SLOW_QUERY_SAMPLE_RATE = parseFloat(process.env.DB_SLOW_QUERY_SAMPLE_RATE || '1');
+
+// Upper bounds (ms) of the per-statement timing histogram buckets
+const HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500];
+
+// A named statement is parsed and planned once per pooled connection and
+// executed by name afterwards. Use them for fixed-text queries on hot paths.
+export interface PreparedStatement {
+  name: string;
+  text: string;
+}
+
+export function prepared(name: string, text: string): PreparedStatement {
+  return { name, text };
+}
+
+interface StatementTiming {
+  count: number;
+  totalMs: number;
+  maxMs: number;
+  // Counts per HISTOGRAM_BOUNDS_MS bucket, plus one for anything slower
+  buckets: number[];
+}
+
+const queryStats = {
+  queries: 0,
+  errors: 0,
+  slow: 0,
+  totalDurationMs: 0,
+};
+
+// Keyed by statement name; ad-hoc text shares one entry
+const statementTimings = new Map<string, StatementTiming>();
+
+function recordTiming(label: string, durationMs: number): void {
+  let timing = statementTimings.get(label);
+  if (!timing) {
+    timing = { count: 0, totalMs: 0, maxMs: 0, buckets: new Array(HISTOGRAM_BOUNDS_MS.length + 1).fill(0) };
+    statementTimings.set(label, timing);
+  }
+  timing.count++;
+  timing.totalMs += durationMs;
+  timing.maxMs = Math.max(timing.maxMs, durationMs);
+  let bucket = HISTOGRAM_BOUNDS_MS.findIndex((bound) => durationMs <= bound);
+  if (bucket === -1) bucket = HISTOGRAM_BOUNDS_MS.length;
+  timing.buckets[bucket]++;
+}
+
+export async function query<T extends pg.QueryResultRow = any>(
+  statement: string | PreparedStatement,
+  params?: any[]
+): Promise<pg.QueryResult<T>> {
+  const named = typeof statement !== 'string';
+  const label = named ? statement.name : 'adhoc';
+  const config: pg.QueryConfig = named
+    ? { name: statement.name, text: statement.text, values: params }
+    : { text: statement, values: params };
+
+  const start = performance.now();
+  queryStats.queries++;
+  let res: pg.QueryResult<T>;
+  try {
+    res = await pool.query<T>(config);
+  } catch (error) {
+    queryStats.errors++;
+    throw error;
+  }
+  const duration = performance.now() - start;
+  queryStats.totalDurationMs += duration;
+  recordTiming(label, duration);
+
+  if (duration >= SLOW_QUERY_MS) {
+    queryStats.slow++;
+    if (Math.random() < SLOW_QUERY_SAMPLE_RATE) {
+      console.warn(`🐢 Slow query (${label}, ${Math.round(duration)}ms, ${res.rowCount} rows):`, config.text);
+    }
+  }
   return res;
 }
 
+function timingSnapshot(timing: StatementTiming) {
+  const buckets: Record<string, number> = {};
+  HISTOGRAM_BOUNDS_MS.forEach((bound, i) => {
+    buckets[`le${bound}`] = timing.buckets[i];
+  });
+  buckets[`gt${HISTOGRAM_BOUNDS_MS[HISTOGRAM_BOUNDS_MS.length - 1]}`] = timing.buckets[HISTOGRAM_BOUNDS_MS.length];
+  return {
+    count: timing.count,
+    meanMs: timing.count ? timing.totalMs / timing.count : 0,
+    maxMs: timing.maxMs,
+    buckets,
+  };
+}
+
+registerMetricsSource('db', () => ({
+  ...queryStats,
+  poolTotal: pool.totalCount,
+  poolIdle: pool.idleCount,
+  poolWaiting: pool.waitingCount,
+  statements: Object.fromEntries(
+    [...statementTimings].map(([label, timing]) => [label, timingSnapshot(timing)])
+  ),
+}));
+
 export async function getClient() {
   const client = await pool.connect();
   return client;
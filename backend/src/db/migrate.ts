@@ -102,12 +102,16 @@ CREATE TABLE IF NOT EXISTS scheduled_jobs (
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+ALTER TABLE scheduled_jobs ADD COLUMN IF NOT EXISTS timezone VARCHAR(64) NOT NULL DEFAULT 'UTC';
+ALTER TABLE scheduled_jobs ADD COLUMN IF NOT EXISTS offset_ms INTEGER NOT NULL DEFAULT 0;
+
 -- Create indexes
 CREATE INDEX IF NOT EXISTS idx_workflows_user_id ON workflows(user_id);
 CREATE INDEX IF NOT EXISTS idx_workflows_webhook_id ON workflows(webhook_id);
 CREATE INDEX IF NOT EXISTS idx_workflow_executions_workflow_id ON workflow_executions(workflow_id);
 CREATE INDEX IF NOT EXISTS idx_step_executions_execution_id ON step_executions(execution_id);
 CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_next_run ON scheduled_jobs(next_run_at) WHERE is_active = true;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_scheduled_jobs_workflow_id ON scheduled_jobs(workflow_id);
 CREATE INDEX IF NOT EXISTS idx_conversation_sessions_user_id ON conversation_sessions(user_id);
 `;
 
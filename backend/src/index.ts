@@ -6,6 +6,7 @@ import authRoutes from './routes/auth.js';
 import chatRoutes from './routes/chat.js';
 import workflowRoutes from './routes/workflows.js';
 import webhookRoutes from './routes/webhooks.js';
+import { startMetricsServer } from './lib/metrics.js';
 
 dotenv.config();
 
@@ -19,15 +20,18 @@ app.use(cors({
     : ['http://localhost:5173', 'http://localhost:3000'],
   credentials: true,
 }));
-app.use(express.json({ limit: '10mb' }));
-app.use(express.urlencoded({ extended: true }));
-
 // Request logging
 app.use((req, res, next) => {
   console.log(`${new Date().toISOString()} ${req.method} ${req.path}`);
   next();
 });
 
+// Webhooks read their own bodies, with per-workflow size limits
+app.use('/api/webhooks', webhookRoutes);
+
+app.use(express.json({ limit: '10mb' }));
+app.use(express.urlencoded({ extended: true }));
+
 // Health check
 app.get('/health', (req, res) => {
   res.json({ 
@@ -41,7 +45,6 @@ app.get('/health', (req, res) => {
 app.use('/api/auth', authRoutes);
 app.use('/api/chat', chatRoutes);
 app.use('/api/workflows', workflowRoutes);
-app.use('/api/webhooks', webhookRoutes);
 
 // 404 handler
 app.use((req, res) => {
@@ -67,4 +70,9 @@ app.listen(PORT, () => {
   console.log(`📋 Health check: http://localhost:${PORT}/health`);
 });
 
+// Optional process stats (DB, caches) on a separate, non-public port
+if (process.env.API_METRICS_PORT) {
+  startMetricsServer(parseInt(process.env.API_METRICS_PORT));
+}
+
 export default app;
@@ -0,0 +1,122 @@
+import fs from 'node:fs';
+import os from 'node:os';
+import path from 'node:path';
+import { pipeline } from 'node:stream/promises';
+import { Readable } from 'node:stream';
+import { v4 as uuidv4 } from 'uuid';
+import dotenv from 'dotenv';
+import { parseBody } from './body.js';
+
+dotenv.config();
+
+// Local blob store for payloads too large to keep in memory, Postgres rows
+// or job data. Values are replaced by a small handle pointing at the file.
+// Processes that exchange handles must share BLOB_STORE_DIR.
+
+const BLOB_STORE_DIR = process.env.BLOB_STORE_DIR || path.join(os.tmpdir(), 'workflow-blobs');
+// Blobs older than this are deleted by the sweeper (default 7 days); longer
+// than any execution is expected to keep referring to them
+const RETENTION_MS = parseInt(process.env.BLOB_RETENTION_MS || String(7 * 24 * 60 * 60 * 1000));
+const SWEEP_INTERVAL_MS = 60 * 60 * 1000;
+
+export interface BlobHandle {
+  $blob: string;
+  size: number;
+  contentType?: string;
+}
+
+export function isBlobHandle(value: any): value is BlobHandle {
+  return typeof value === 'object' && value !== null && typeof value.$blob === 'string';
+}
+
+function blobPath(id: string): string {
+  // Ids are generated here; reject anything that could escape the directory
+  if (!/^[0-9a-f-]+$/i.test(id)) {
+    throw new Error(`Invalid blob id: ${id}`);
+  }
+  return path.join(BLOB_STORE_DIR, id);
+}
+
+export async function saveBlob(
+  source: Buffer | Iterable<Buffer> | AsyncIterable<Buffer>,
+  contentType?: string
+): Promise<BlobHandle> {
+  await fs.promises.mkdir(BLOB_STORE_DIR, { recursive: true });
+
+  const id = uuidv4();
+  let size = 0;
+
+  try {
+    await pipeline(
+      Readable.from(Buffer.isBuffer(source) ? [source] : source),
+      async function* (chunks: AsyncIterable<Buffer>) {
+        for await (const chunk of chunks) {
+          size += chunk.length;
+          yield chunk;
+        }
+      },
+      fs.createWriteStream(blobPath(id))
+    );
+  } catch (error) {
+    // Don't leave a partial file behind when the source fails midway
+    await fs.promises.rm(blobPath(id), { force: true });
+    throw error;
+  }
+
+  return { $blob: id, size, contentType };
+}
+
+export async function readBlob(handle: BlobHandle): Promise<Buffer> {
+  return fs.promises.readFile(blobPath(handle.$blob));
+}
+
+// Blob contents parsed by their content type, as the body would have been
+// had it not been spilled
+export async function readBlobBody(handle: BlobHandle): Promise<any> {
+  return parseBody(await readBlob(handle), handle.contentType);
+}
+
+export async function deleteBlob(handle: BlobHandle): Promise<void> {
+  await fs.promises.rm(blobPath(handle.$blob), { force: true });
+}
+
+// Deletes blobs past the retention period; returns how many
+export async function sweepExpiredBlobs(maxAgeMs = RETENTION_MS): Promise<number> {
+  let names: string[];
+  try {
+    names = await fs.promises.readdir(BLOB_STORE_DIR);
+  } catch (error) {
+    if ((error as NodeJS.ErrnoException).code === 'ENOENT') return 0;
+    throw error;
+  }
+
+  const cutoff = Date.now() - maxAgeMs;
+  let removed = 0;
+  for (const name of names) {
+    const file = path.join(BLOB_STORE_DIR, name);
+    try {
+      const stat = await fs.promises.stat(file);
+      if (stat.isFile() && stat.mtimeMs < cutoff) {
+        await fs.promises.rm(file, { force: true });
+        removed++;
+      }
+    } catch {
+      // Removed concurrently by another process
+    }
+  }
+  return removed;
+}
+
+export function startBlobSweeper(): NodeJS.Timeout {
+  const sweep = () => {
+    sweepExpiredBlobs()
+      .then((removed) => {
+        if (removed > 0) console.log(`🧹 Removed ${removed} expired blobs`);
+      })
+      .catch((error) => console.error('Blob sweep failed:', error));
+  };
+  sweep();
+  const timer = setInterval(sweep, SWEEP_INTERVAL_MS);
+  timer.unref();
+  return timer;
+}
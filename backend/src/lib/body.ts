@@ -0,0 +1,33 @@
+import qs from 'qs';
+
+// Parsing of raw request and response bodies by content type, shared by
+// webhook capture and by steps reading bodies back from the blob store.
+
+// Same limits as express.urlencoded({ extended: true }), which webhook
+// routes used before they read the body stream themselves
+const URLENCODED_PARAMETER_LIMIT = 1000;
+const URLENCODED_DEPTH = 32;
+
+export function parseBody(buffer: Buffer, contentType: string | undefined): any {
+  if (buffer.length === 0) {
+    return {};
+  }
+
+  const type = (contentType || '').split(';')[0].trim().toLowerCase();
+  const text = buffer.toString('utf8');
+
+  if (type === 'application/json' || type.endsWith('+json')) {
+    // Invalid JSON throws a SyntaxError, answered with 400
+    return JSON.parse(text);
+  }
+  if (type === 'application/x-www-form-urlencoded') {
+    // Nested keys (a[b]=1, a[]=1) become objects and arrays
+    return qs.parse(text, {
+      allowPrototypes: true,
+      arrayLimit: 100,
+      depth: URLENCODED_DEPTH,
+      parameterLimit: URLENCODED_PARAMETER_LIMIT,
+    });
+  }
+  return text;
+}
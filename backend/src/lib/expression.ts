@@ -0,0 +1,762 @@
+// Small JSONata-like expression language for transform_data and conditional
+// steps. Expressions are parsed once into an AST and evaluated against a
+// plain JSON context without eval or access to the prototype chain.
+//
+//   fetch.response.body.items[price > 10].name       path + filter predicate
+//   $sum(orders.total) / $count(orders)              built-in functions
+//   $map(items, function($i) { $i.qty * $i.price })  lambdas
+//   {{check.response.status}} == 200 && !done        templates and JS-style operators
+
+import { LRUCache } from './lru.js';
+
+const EXPRESSION_CACHE_SIZE = parseInt(process.env.EXPRESSION_CACHE_SIZE || '1000');
+
+export type ExpressionNode =
+  | { type: 'literal'; value: any }
+  | { type: 'name'; name: string }
+  | { type: 'variable'; name: string }
+  | { type: 'member'; object: ExpressionNode; property: string }
+  | { type: 'index'; object: ExpressionNode; index: ExpressionNode }
+  | { type: 'call'; callee: ExpressionNode; args: ExpressionNode[] }
+  | { type: 'lambda'; params: string[]; body: ExpressionNode }
+  | { type: 'unary'; op: string; operand: ExpressionNode }
+  | { type: 'binary'; op: string; left: ExpressionNode; right: ExpressionNode }
+  | { type: 'conditional'; test: ExpressionNode; consequent: ExpressionNode; alternate: ExpressionNode }
+  | { type: 'array'; items: ExpressionNode[] }
+  | { type: 'object'; entries: [string, ExpressionNode][] };
+
+// Tokenizer
+
+type TokenType = 'number' | 'string' | 'name' | 'variable' | 'template' | 'operator' | 'eof';
+
+interface Token {
+  type: TokenType;
+  value: string;
+  position: number;
+}
+
+const OPERATORS = [
+  '==', '!=', '<=', '>=', '&&', '||',
+  '.', ',', '(', ')', '[', ']', '{', '}', ':', '?',
+  '+', '-', '*', '/', '%', '&', '=', '<', '>', '!',
+];
+
+function tokenize(source: string): Token[] {
+  const tokens: Token[] = [];
+  let i = 0;
+
+  while (i < source.length) {
+    const char = source[i];
+
+    if (/\s/.test(char)) {
+      i++;
+      continue;
+    }
+
+    const start = i;
+
+    if (source.startsWith('{{', i)) {
+      const end = source.indexOf('}}', i + 2);
+      if (end === -1) {
+        throw new Error(`Unterminated template at position ${i}`);
+      }
+      tokens.push({ type: 'template', value: source.slice(i + 2, end).trim(), position: start });
+      i = end + 2;
+      continue;
+    }
+
+    if (/[0-9]/.test(char)) {
+      const match = /^[0-9]+(\.[0-9]+)?([eE][+-]?[0-9]+)?/.exec(source.slice(i))!;
+      tokens.push({ type: 'number', value: match[0], position: start });
+      i += match[0].length;
+      continue;
+    }
+
+    if (char === '"' || char === "'") {
+      let value = '';
+      i++;
+      while (i < source.length && source[i] !== char) {
+        if (source[i] === '\\') {
+          const next = source[i + 1];
+          const escapes: Record<string, string> = { n: '\n', t: '\t', r: '\r', '\\': '\\', '"': '"', "'": "'" };
+          if (next === 'u') {
+            value += String.fromCharCode(parseInt(source.slice(i + 2, i + 6), 16));
+            i += 6;
+            continue;
+          }
+          value += escapes[next] ?? next;
+          i += 2;
+          continue;
+        }
+        value += source[i++];
+      }
+      if (source[i] !== char) {
+        throw new Error(`Unterminated string at position ${start}`);
+      }
+      i++;
+      tokens.push({ type: 'string', value, position: start });
+      continue;
+    }
+
+    if (char === '`') {
+      const end = source.indexOf('`', i + 1);
+      if (end === -1) {
+        throw new Error(`Unterminated quoted name at position ${i}`);
+      }
+      tokens.push({ type: 'name', value: source.slice(i + 1, end), position: start });
+      i = end + 1;
+      continue;
+    }
+
+    if (char === '$') {
+      const match = /^\$(\$|[A-Za-z_][A-Za-z0-9_]*)?/.exec(source.slice(i))!;
+      tokens.push({ type: 'variable', value: match[0].slice(1), position: start });
+      i += match[0].length;
+      continue;
+    }
+
+    if (/[A-Za-z_]/.test(char)) {
+      const match = /^[A-Za-z_][A-Za-z0-9_]*/.exec(source.slice(i))!;
+      tokens.push({ type: 'name', value: match[0], position: start });
+      i += match[0].length;
+      continue;
+    }
+
+    const operator = OPERATORS.find(op => source.startsWith(op, i));
+    if (!operator) {
+      throw new Error(`Unexpected character "${char}" at position ${i}`);
+    }
+    tokens.push({ type: 'operator', value: operator, position: start });
+    i += operator.length;
+  }
+
+  tokens.push({ type: 'eof', value: '', position: source.length });
+  return tokens;
+}
+
+// Parser (recursive descent, lowest precedence first)
+
+const COMPARISON_OPERATORS = new Set(['=', '==', '!=', '<', '<=', '>', '>=']);
+
+export function parseExpression(source: string): ExpressionNode {
+  const tokens = tokenize(source);
+  let pos = 0;
+
+  const peek = () => tokens[pos];
+  const next = () => tokens[pos++];
+  const isOperator = (value: string) => peek().type === 'operator' && peek().value === value;
+  const isKeyword = (value: string) => peek().type === 'name' && peek().value === value;
+
+  const expect = (value: string) => {
+    const token = next();
+    if (token.type !== 'operator' || token.value !== value) {
+      throw new Error(`Expected "${value}" at position ${token.position}`);
+    }
+  };
+
+  const parseTernary = (): ExpressionNode => {
+    const test = parseOr();
+    if (isOperator('?')) {
+      next();
+      const consequent = parseTernary();
+      expect(':');
+      const alternate = parseTernary();
+      return { type: 'conditional', test, consequent, alternate };
+    }
+    return test;
+  };
+
+  const parseOr = (): ExpressionNode => {
+    let left = parseAnd();
+    while (isKeyword('or') || isOperator('||')) {
+      next();
+      left = { type: 'binary', op: 'or', left, right: parseAnd() };
+    }
+    return left;
+  };
+
+  const parseAnd = (): ExpressionNode => {
+    let left = parseComparison();
+    while (isKeyword('and') || isOperator('&&')) {
+      next();
+      left = { type: 'binary', op: 'and', left, right: parseComparison() };
+    }
+    return left;
+  };
+
+  const parseComparison = (): ExpressionNode => {
+    const left = parseConcat();
+    if (peek().type === 'operator' && COMPARISON_OPERATORS.has(peek().value)) {
+      const op = next().value;
+      return { type: 'binary', op: op === '==' ? '=' : op, left, right: parseConcat() };
+    }
+    if (isKeyword('in')) {
+      next();
+      return { type: 'binary', op: 'in', left, right: parseConcat() };
+    }
+    return left;
+  };
+
+  const parseConcat = (): ExpressionNode => {
+    let left = parseAdditive();
+    while (isOperator('&')) {
+      next();
+      left = { type: 'binary', op: '&', left, right: parseAdditive() };
+    }
+    return left;
+  };
+
+  const parseAdditive = (): ExpressionNode => {
+    let left = parseMultiplicative();
+    while (isOperator('+') || isOperator('-')) {
+      const op = next().value;
+      left = { type: 'binary', op, left, right: parseMultiplicative() };
+    }
+    return left;
+  };
+
+  const parseMultiplicative = (): ExpressionNode => {
+    let left = parseUnary();
+    while (isOperator('*') || isOperator('/') || isOperator('%')) {
+      const op = next().value;
+      left = { type: 'binary', op, left, right: parseUnary() };
+    }
+    return left;
+  };
+
+  const parseUnary = (): ExpressionNode => {
+    if (isOperator('-')) {
+      next();
+      return { type: 'unary', op: '-', operand: parseUnary() };
+    }
+    if (isOperator('!') || isKeyword('not')) {
+      next();
+      return { type: 'unary', op: 'not', operand: parseUnary() };
+    }
+    return parsePostfix();
+  };
+
+  const parsePostfix = (): ExpressionNode => {
+    let node = parsePrimary();
+    for (;;) {
+      if (isOperator('.')) {
+        next();
+        const token = next();
+        if (token.type !== 'name' && token.type !== 'number') {
+          throw new Error(`Expected field name at position ${token.position}`);
+        }
+        node = { type: 'member', object: node, property: token.value };
+      } else if (isOperator('[')) {
+        next();
+        const index = parseTernary();
+        expect(']');
+        node = { type: 'index', object: node, index };
+      } else if (isOperator('(')) {
+        next();
+        node = { type: 'call', callee: node, args: parseList(')') };
+      } else {
+        return node;
+      }
+    }
+  };
+
+  const parseList = (close: string): ExpressionNode[] => {
+    const items: ExpressionNode[] = [];
+    if (isOperator(close)) {
+      next();
+      return items;
+    }
+    for (;;) {
+      items.push(parseTernary());
+      if (isOperator(close)) {
+        next();
+        return items;
+      }
+      expect(',');
+    }
+  };
+
+  const parsePrimary = (): ExpressionNode => {
+    const token = next();
+
+    switch (token.type) {
+      case 'number':
+        return { type: 'literal', value: Number(token.value) };
+      case 'string':
+        return { type: 'literal', value: token.value };
+      case 'variable':
+        return { type: 'variable', name: token.value };
+      case 'template': {
+        // {{a.b.c}} always reads from the root context, like step templates
+        let node: ExpressionNode = { type: 'variable', name: '$' };
+        for (const key of token.value.split('.')) {
+          node = { type: 'member', object: node, property: key };
+        }
+        return node;
+      }
+      case 'name':
+        if (token.value === 'true') return { type: 'literal', value: true };
+        if (token.value === 'false') return { type: 'literal', value: false };
+        if (token.value === 'null') return { type: 'literal', value: null };
+        if (token.value === 'function') return parseLambda();
+        return { type: 'name', name: token.value };
+      case 'operator':
+        if (token.value === '(') {
+          const node = parseTernary();
+          expect(')');
+          return node;
+        }
+        if (token.value === '[') {
+          return { type: 'array', items: parseList(']') };
+        }
+        if (token.value === '{') {
+          return parseObject();
+        }
+        break;
+    }
+
+    if (token.type === 'eof') {
+      throw new Error('Unexpected end of expression');
+    }
+    throw new Error(`Unexpected token "${token.value}" at position ${token.position}`);
+  };
+
+  const parseLambda = (): ExpressionNode => {
+    expect('(');
+    const params: string[] = [];
+    while (!isOperator(')')) {
+      const token = next();
+      if (token.type !== 'variable' || !token.value) {
+        throw new Error(`Expected parameter name at position ${token.position}`);
+      }
+      params.push(token.value);
+      if (!isOperator(')')) expect(',');
+    }
+    next();
+    expect('{');
+    const body = parseTernary();
+    expect('}');
+    return { type: 'lambda', params, body };
+  };
+
+  const parseObject = (): ExpressionNode => {
+    const entries: [string, ExpressionNode][] = [];
+    while (!isOperator('}')) {
+      const key = next();
+      if (key.type !== 'string' && key.type !== 'name') {
+        throw new Error(`Expected object key at position ${key.position}`);
+      }
+      expect(':');
+      entries.push([key.value, parseTernary()]);
+      if (!isOperator('}')) expect(',');
+    }
+    next();
+    return { type: 'object', entries };
+  };
+
+  const ast = parseTernary();
+  if (peek().type !== 'eof') {
+    throw new Error(`Unexpected token "${peek().value}" at position ${peek().position}`);
+  }
+  return ast;
+}
+
+// Evaluator
+
+// Function values are instances of this class, so plain data that happens
+// to have params/body/scope fields is never taken for one
+class Lambda {
+  params: string[];
+  body: ExpressionNode;
+  scope: Scope;
+
+  constructor(params: string[], body: ExpressionNode, scope: Scope) {
+    this.params = params;
+    this.body = body;
+    this.scope = scope;
+  }
+}
+
+interface Scope {
+  root: any;
+  focus: any;
+  variables: Record<string, any>;
+}
+
+const FORBIDDEN_KEYS = new Set(['__proto__', 'prototype', 'constructor']);
+
+function getField(value: any, key: string): any {
+  if (value === null || value === undefined || typeof value !== 'object' || FORBIDDEN_KEYS.has(key)) {
+    return undefined;
+  }
+  if (Array.isArray(value)) {
+    // Numeric keys index (template-style items.0); others map over elements
+    if (/^[0-9]+$/.test(key)) {
+      return value[Number(key)];
+    }
+    const mapped: any[] = [];
+    for (const item of value) {
+      const field = getField(item, key);
+      if (Array.isArray(field)) {
+        mapped.push(...field);
+      } else if (field !== undefined) {
+        mapped.push(field);
+      }
+    }
+    return mapped;
+  }
+  return Object.prototype.hasOwnProperty.call(value, key) ? value[key] : undefined;
+}
+
+export function isTruthy(value: any): boolean {
+  if (Array.isArray(value)) {
+    return value.length > 0;
+  }
+  return !!value;
+}
+
+function looseEquals(left: any, right: any): boolean {
+  if (typeof left === 'number' && typeof right === 'string' && right.trim() !== '') {
+    return left === Number(right);
+  }
+  if (typeof left === 'string' && typeof right === 'number' && left.trim() !== '') {
+    return Number(left) === right;
+  }
+  if (typeof left === 'object' && left !== null && typeof right === 'object' && right !== null) {
+    return JSON.stringify(left) === JSON.stringify(right);
+  }
+  return left === right;
+}
+
+function toNumber(value: any, op: string): number {
+  const number = typeof value === 'number' ? value : Number(value);
+  if (Number.isNaN(number)) {
+    throw new Error(`Operator "${op}" expects numbers, got ${JSON.stringify(value)}`);
+  }
+  return number;
+}
+
+function asArray(value: any): any[] {
+  if (value === undefined || value === null) return [];
+  return Array.isArray(value) ? value : [value];
+}
+
+function stringify(value: any): string {
+  if (value === undefined || value === null) return '';
+  return typeof value === 'object' ? JSON.stringify(value) : String(value);
+}
+
+function callLambda(fn: any, args: any[]): any {
+  if (!(fn instanceof Lambda)) {
+    throw new Error('Expected a function argument');
+  }
+  const variables = { ...fn.scope.variables };
+  fn.params.forEach((param, i) => {
+    variables[param] = args[i];
+  });
+  return evaluateNode(fn.body, { ...fn.scope, variables });
+}
+
+const BUILTINS: Record<string, (...args: any[]) => any> = {
+  count: (a) => asArray(a).length,
+  sum: (a) => asArray(a).reduce((total, n) => total + toNumber(n, '$sum'), 0),
+  avg: (a) => {
+    const items = asArray(a);
+    return items.length ? BUILTINS.sum(items) / items.length : undefined;
+  },
+  min: (a) => {
+    const items = asArray(a).map(n => toNumber(n, '$min'));
+    return items.length ? Math.min(...items) : undefined;
+  },
+  max: (a) => {
+    const items = asArray(a).map(n => toNumber(n, '$max'));
+    return items.length ? Math.max(...items) : undefined;
+  },
+  map: (a, fn) => asArray(a).map((item, i) => callLambda(fn, [item, i])),
+  filter: (a, fn) => asArray(a).filter((item, i) => isTruthy(callLambda(fn, [item, i]))),
+  reduce: (a, fn, init) => {
+    const items = asArray(a);
+    let acc = init === undefined ? items[0] : init;
+    for (let i = init === undefined ? 1 : 0; i < items.length; i++) {
+      acc = callLambda(fn, [acc, items[i], i]);
+    }
+    return acc;
+  },
+  sort: (a, fn) => {
+    const items = [...asArray(a)];
+    const key = (item: any) => (fn ? callLambda(fn, [item]) : item);
+    return items
+      .map(item => ({ item, key: key(item) }))
+      .sort((x, y) => (x.key < y.key ? -1 : x.key > y.key ? 1 : 0))
+      .map(entry => entry.item);
+  },
+  reverse: (a) => [...asArray(a)].reverse(),
+  distinct: (a) => {
+    const seen = new Set<string>();
+    return asArray(a).filter(item => {
+      const key = JSON.stringify(item);
+      if (seen.has(key)) return false;
+      seen.add(key);
+      return true;
+    });
+  },
+  flatten: (a) => asArray(a).flat(Infinity),
+  slice: (a, start, end) => (typeof a === 'string' ? a : asArray(a)).slice(start, end),
+  first: (a) => asArray(a)[0],
+  last: (a) => {
+    const items = asArray(a);
+    return items[items.length - 1];
+  },
+  groupBy: (a, fn) => {
+    const groups: Record<string, any[]> = {};
+    for (const item of asArray(a)) {
+      const key = stringify(callLambda(fn, [item]));
+      if (FORBIDDEN_KEYS.has(key)) continue;
+      (groups[key] ||= []).push(item);
+    }
+    return groups;
+  },
+  join: (a, separator = '') => asArray(a).map(stringify).join(separator),
+  split: (s, separator) => stringify(s).split(separator),
+  keys: (o) => (typeof o === 'object' && o !== null ? Object.keys(o) : []),
+  values: (o) => (typeof o === 'object' && o !== null ? Object.values(o) : []),
+  merge: (a) => Object.assign({}, ...asArray(a).filter(o => typeof o === 'object' && o !== null && !Array.isArray(o))),
+  string: (v) => stringify(v),
+  number: (v) => toNumber(v, '$number'),
+  boolean: (v) => isTruthy(v),
+  exists: (v) => v !== undefined && v !== null,
+  length: (v) => (typeof v === 'string' ? v.length : asArray(v).length),
+  contains: (haystack, needle) => Array.isArray(haystack)
+    ? haystack.some(item => looseEquals(item, needle))
+    : stringify(haystack).includes(stringify(needle)),
+  lowercase: (s) => stringify(s).toLowerCase(),
+  uppercase: (s) => stringify(s).toUpperCase(),
+  trim: (s) => stringify(s).trim(),
+  round: (n, digits = 0) => {
+    const factor = 10 ** digits;
+    return Math.round(toNumber(n, '$round') * factor) / factor;
+  },
+  floor: (n) => Math.floor(toNumber(n, '$floor')),
+  ceil: (n) => Math.ceil(toNumber(n, '$ceil')),
+  abs: (n) => Math.abs(toNumber(n, '$abs')),
+  now: () => new Date().toISOString(),
+};
+
+function evaluateNode(node: ExpressionNode, scope: Scope): any {
+  switch (node.type) {
+    case 'literal':
+      return node.value;
+
+    case 'name':
+      return getField(scope.focus, node.name);
+
+    case 'variable':
+      if (node.name === '') return scope.focus;
+      if (node.name === '$') return scope.root;
+      if (Object.prototype.hasOwnProperty.call(scope.variables, node.name)) {
+        return scope.variables[node.name];
+      }
+      return undefined;
+
+    case 'member':
+      return getField(evaluateNode(node.object, scope), node.property);
+
+    case 'index': {
+      const target = evaluateNode(node.object, scope);
+      if (node.index.type === 'literal' || (node.index.type === 'unary' && node.index.op === '-')) {
+        const index = evaluateNode(node.index, scope);
+        if (typeof index === 'string') {
+          return getField(target, index);
+        }
+        const items = asArray(target);
+        return items[index < 0 ? items.length + index : index];
+      }
+      // Predicate: keep the elements for which it holds, evaluated per element
+      return asArray(target).filter(item => isTruthy(evaluateNode(node.index, { ...scope, focus: item })));
+    }
+
+    case 'call': {
+      const args = node.args.map(arg => evaluateNode(arg, scope));
+      if (node.callee.type === 'variable' && Object.prototype.hasOwnProperty.call(BUILTINS, node.callee.name)
+        && !Object.prototype.hasOwnProperty.call(scope.variables, node.callee.name)) {
+        return BUILTINS[node.callee.name](...args);
+      }
+      return callLambda(evaluateNode(node.callee, scope), args);
+    }
+
+    case 'lambda':
+      return new Lambda(node.params, node.body, scope);
+
+    case 'unary': {
+      const value = evaluateNode(node.operand, scope);
+      return node.op === 'not' ? !isTruthy(value) : -toNumber(value, '-');
+    }
+
+    case 'binary': {
+      if (node.op === 'and') {
+        return isTruthy(evaluateNode(node.left, scope)) && isTruthy(evaluateNode(node.right, scope));
+      }
+      if (node.op === 'or') {
+        return isTruthy(evaluateNode(node.left, scope)) || isTruthy(evaluateNode(node.right, scope));
+      }
+
+      const left = evaluateNode(node.left, scope);
+      const right = evaluateNode(node.right, scope);
+
+      switch (node.op) {
+        case '=': return looseEquals(left, right);
+        case '!=': return !looseEquals(left, right);
+        case '<': return left < right;
+        case '<=': return left <= right;
+        case '>': return left > right;
+        case '>=': return left >= right;
+        case 'in': return asArray(right).some(item => looseEquals(item, left));
+        case '&': return stringify(left) + stringify(right);
+        case '+':
+          return typeof left === 'string' || typeof right === 'string'
+            ? stringify(left) + stringify(right)
+            : toNumber(left, '+') + toNumber(right, '+');
+        case '-': return toNumber(left, '-') - toNumber(right, '-');
+        case '*': return toNumber(left, '*') * toNumber(right, '*');
+        case '/': return toNumber(left, '/') / toNumber(right, '/');
+        case '%': return toNumber(left, '%') % toNumber(right, '%');
+      }
+      throw new Error(`Unknown operator: ${node.op}`);
+    }
+
+    case 'conditional':
+      return isTruthy(evaluateNode(node.test, scope))
+        ? evaluateNode(node.consequent, scope)
+        : evaluateNode(node.alternate, scope);
+
+    case 'array': {
+      const items: any[] = [];
+      for (const item of node.items) {
+        const value = evaluateNode(item, scope);
+        if (value !== undefined) items.push(value);
+      }
+      return items;
+    }
+
+    case 'object': {
+      const result: Record<string, any> = {};
+      for (const [key, value] of node.entries) {
+        if (!FORBIDDEN_KEYS.has(key)) {
+          result[key] = evaluateNode(value, scope);
+        }
+      }
+      return result;
+    }
+  }
+}
+
+export function evaluateExpression(ast: ExpressionNode, context: Record<string, any>): any {
+  const result = evaluateNode(ast, { root: context, focus: context, variables: {} });
+  if (result instanceof Lambda) {
+    throw new Error('Expression evaluated to a function');
+  }
+  return result;
+}
+
+// Root context entries an expression reads (names outside predicates and
+// template roots), so callers can pass only those to the evaluator
+export function collectExpressionRefs(ast: ExpressionNode): string[] {
+  const refs = new Set<string>();
+
+  const visit = (node: ExpressionNode, atRoot: boolean): void => {
+    switch (node.type) {
+      case 'name':
+        if (atRoot) refs.add(node.name);
+        return;
+      case 'member':
+        if (node.object.type === 'variable' && node.object.name === '$') {
+          refs.add(node.property);
+          return;
+        }
+        visit(node.object, atRoot);
+        return;
+      case 'index':
+        visit(node.object, atRoot);
+        visit(node.index, false);
+        return;
+      case 'call':
+        visit(node.callee, atRoot);
+        node.args.forEach(arg => visit(arg, atRoot));
+        return;
+      case 'lambda':
+        visit(node.body, atRoot);
+        return;
+      case 'unary':
+        visit(node.operand, atRoot);
+        return;
+      case 'binary':
+        visit(node.left, atRoot);
+        visit(node.right, atRoot);
+        return;
+      case 'conditional':
+        visit(node.test, atRoot);
+        visit(node.consequent, atRoot);
+        visit(node.alternate, atRoot);
+        return;
+      case 'array':
+        node.items.forEach(item => visit(item, atRoot));
+        return;
+      case 'object':
+        node.entries.forEach(([, value]) => visit(value, atRoot));
+        return;
+    }
+  };
+
+  visit(ast, true);
+  return [...refs];
+}
+
+// True when evaluation is linear in the size of the data it reads: no
+// function calls, lambdas or filter predicates. Such expressions are cheap
+// enough to evaluate in place; others can loop, sort or build large
+// intermediate values and belong on the transform pool.
+export function isSimpleExpression(ast: ExpressionNode): boolean {
+  switch (ast.type) {
+    case 'call':
+    case 'lambda':
+      return false;
+    case 'literal':
+    case 'name':
+    case 'variable':
+      return true;
+    case 'member':
+      return isSimpleExpression(ast.object);
+    case 'index':
+      return (ast.index.type === 'literal' || (ast.index.type === 'unary' && ast.index.operand.type === 'literal'))
+        && isSimpleExpression(ast.object);
+    case 'unary':
+      return isSimpleExpression(ast.operand);
+    case 'binary':
+      return isSimpleExpression(ast.left) && isSimpleExpression(ast.right);
+    case 'conditional':
+      return isSimpleExpression(ast.test) && isSimpleExpression(ast.consequent) && isSimpleExpression(ast.alternate);
+    case 'array':
+      return ast.items.every(isSimpleExpression);
+    case 'object':
+      return ast.entries.every(([, value]) => isSimpleExpression(value));
+  }
+}
+
+export interface CompiledExpression {
+  ast: ExpressionNode;
+  refs: string[];
+  simple: boolean;
+}
+
+const compiledCache = new LRUCache<string, CompiledExpression>(EXPRESSION_CACHE_SIZE);
+
+// Parse once per distinct source; parse errors are thrown to the caller
+export function compileExpression(source: string): CompiledExpression {
+  let compiled = compiledCache.get(source);
+  if (!compiled) {
+    const ast = parseExpression(source);
+    compiled = { ast, refs: collectExpressionRefs(ast), simple: isSimpleExpression(ast) };
+    compiledCache.set(source, compiled);
+  }
+  return compiled;
+}
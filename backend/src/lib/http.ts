@@ -0,0 +1,177 @@
+import dns from 'node:dns';
+import { Agent, Pool } from 'undici';
+import dotenv from 'dotenv';
+import { registerMetricsSource } from './metrics.js';
+import { saveBlob, type BlobHandle } from './blobStore.js';
+
+dotenv.config();
+
+// Shared keep-alive dispatcher for outbound HTTP from workflow steps. One
+// connection pool per origin, so repeated calls to the same API reuse
+// established (TLS) connections instead of handshaking every time.
+
+const CONNECTIONS_PER_ORIGIN = parseInt(process.env.HTTP_CONNECTIONS_PER_ORIGIN || '16');
+const PIPELINING = parseInt(process.env.HTTP_PIPELINING || '1');
+const KEEP_ALIVE_TIMEOUT_MS = parseInt(process.env.HTTP_KEEP_ALIVE_TIMEOUT_MS || '30000');
+const CONNECT_TIMEOUT_MS = parseInt(process.env.HTTP_CONNECT_TIMEOUT_MS || '10000');
+const HEADERS_TIMEOUT_MS = parseInt(process.env.HTTP_HEADERS_TIMEOUT_MS || '30000');
+const BODY_TIMEOUT_MS = parseInt(process.env.HTTP_BODY_TIMEOUT_MS || '30000');
+const DNS_CACHE_TTL_MS = parseInt(process.env.HTTP_DNS_CACHE_TTL_MS || '60000');
+export const MAX_RESPONSE_BYTES = parseInt(process.env.HTTP_MAX_RESPONSE_BYTES || String(5 * 1024 * 1024));
+
+// DNS cache
+
+interface CachedLookup {
+  addresses: dns.LookupAddress[];
+  expiresAt: number;
+}
+
+const dnsCache = new Map<string, CachedLookup>();
+const dnsInFlight = new Map<string, Promise<dns.LookupAddress[]>>();
+
+function resolveHost(hostname: string): Promise<dns.LookupAddress[]> {
+  const cached = dnsCache.get(hostname);
+  if (cached && cached.expiresAt > Date.now()) {
+    return Promise.resolve(cached.addresses);
+  }
+
+  let inFlight = dnsInFlight.get(hostname);
+  if (!inFlight) {
+    inFlight = dns.promises.lookup(hostname, { all: true })
+      .then((addresses) => {
+        dnsCache.set(hostname, { addresses, expiresAt: Date.now() + DNS_CACHE_TTL_MS });
+        return addresses;
+      })
+      .finally(() => dnsInFlight.delete(hostname));
+    dnsInFlight.set(hostname, inFlight);
+  }
+  return inFlight;
+}
+
+// Drop-in for dns.lookup as used by net/tls connect (with or without `all`)
+function cachedLookup(
+  hostname: string,
+  options: dns.LookupOptions,
+  callback: (error: NodeJS.ErrnoException | null, address: any, family?: number) => void
+): void {
+  resolveHost(hostname).then(
+    (addresses) => {
+      const family = typeof options.family === 'number' ? options.family : 0;
+      const matching = family ? addresses.filter(address => address.family === family) : addresses;
+
+      if (matching.length === 0) {
+        const error: NodeJS.ErrnoException = new Error(`getaddrinfo ENOTFOUND ${hostname}`);
+        error.code = 'ENOTFOUND';
+        callback(error, undefined);
+        return;
+      }
+
+      if (options.all) {
+        callback(null, matching);
+      } else {
+        callback(null, matching[0].address, matching[0].family);
+      }
+    },
+    (error) => callback(error, undefined)
+  );
+}
+
+// Agent and per-origin pools
+
+const pools = new Map<string, Pool>();
+
+export const httpAgent = new Agent({
+  connections: CONNECTIONS_PER_ORIGIN,
+  pipelining: PIPELINING,
+  keepAliveTimeout: KEEP_ALIVE_TIMEOUT_MS,
+  headersTimeout: HEADERS_TIMEOUT_MS,
+  bodyTimeout: BODY_TIMEOUT_MS,
+  connect: {
+    timeout: CONNECT_TIMEOUT_MS,
+    lookup: cachedLookup,
+  },
+  factory: (origin, opts) => {
+    const pool = new Pool(origin, opts);
+    pools.set(String(origin), pool);
+    return pool;
+  },
+});
+
+export function getHttpPoolStats(): Record<string, any> {
+  const origins: Record<string, any> = {};
+  for (const [origin, pool] of pools) {
+    const { connected, free, pending, queued, running, size } = pool.stats;
+    origins[origin] = { connected, free, pending, queued, running, size };
+  }
+  return {
+    origins,
+    dnsCacheEntries: dnsCache.size,
+  };
+}
+
+registerMetricsSource('httpPools', getHttpPoolStats);
+
+// Response bodies
+
+export interface ReadBodyOptions {
+  maxBytes: number;
+  spillToBlob: boolean;
+  contentType?: string;
+  // Hard cap on the whole body, also when spilling
+  limitBytes?: number;
+}
+
+export class BodyTooLargeError extends Error {
+  limitBytes: number;
+
+  constructor(limitBytes: number) {
+    super(`Body exceeds ${limitBytes} bytes`);
+    this.limitBytes = limitBytes;
+  }
+}
+
+export type ReadBodyResult = { buffer: Buffer } | { blob: BlobHandle };
+
+// Buffers a body up to maxBytes. Past the budget the body is either
+// rejected or streamed (buffered prefix first) into the blob store, so a
+// large download or upload never has to fit in memory.
+export async function readBodyWithLimit(
+  body: AsyncIterable<Buffer>,
+  options: ReadBodyOptions
+): Promise<ReadBodyResult> {
+  const iterator = body[Symbol.asyncIterator]();
+  const chunks: Buffer[] = [];
+  let size = 0;
+
+  for (;;) {
+    const next = await iterator.next();
+    if (next.done) {
+      return { buffer: Buffer.concat(chunks, size) };
+    }
+
+    chunks.push(next.value);
+    size += next.value.length;
+
+    if (size > options.maxBytes) {
+      if (!options.spillToBlob || (options.limitBytes !== undefined && size > options.limitBytes)) {
+        await iterator.return?.();
+        throw new BodyTooLargeError(options.spillToBlob ? options.limitBytes! : options.maxBytes);
+      }
+
+      const remaining = async function* () {
+        yield* chunks.splice(0);
+        for (;;) {
+          const chunk = await iterator.next();
+          if (chunk.done) return;
+          size += chunk.value.length;
+          if (options.limitBytes !== undefined && size > options.limitBytes) {
+            await iterator.return?.();
+            throw new BodyTooLargeError(options.limitBytes);
+          }
+          yield chunk.value;
+        }
+      };
+      return { blob: await saveBlob(remaining(), options.contentType) };
+    }
+  }
+}
@@ -0,0 +1,142 @@
+import crypto from 'node:crypto';
+import { redis } from './redis.js';
+import { LRUCache } from './lru.js';
+import { registerMetricsSource } from './metrics.js';
+
+// Shared cache for idempotent GET responses from http_request steps: a small
+// in-process LRU in front of Redis, so identical requests across workflows
+// and workers within the freshness window are served without a round trip.
+
+const KEY_PREFIX = 'http-cache:';
+const LOCAL_CACHE_SIZE = parseInt(process.env.HTTP_CACHE_LOCAL_SIZE || '500');
+// How long entries with validators are kept past freshness for revalidation
+const STALE_RETENTION_MS = parseInt(process.env.HTTP_CACHE_STALE_RETENTION_MS || String(60 * 60 * 1000));
+// Responses larger than this are not cached
+const MAX_ENTRY_BYTES = parseInt(process.env.HTTP_CACHE_MAX_ENTRY_BYTES || String(256 * 1024));
+
+export interface CachedResponse {
+  status: number;
+  statusText: string;
+  headers: Record<string, string>;
+  body: any;
+  expiresAt: number;
+  etag?: string;
+  lastModified?: string;
+}
+
+const localCache = new LRUCache<string, CachedResponse>(LOCAL_CACHE_SIZE);
+
+const stats = {
+  hits: 0,
+  misses: 0,
+  revalidated: 0,
+  stores: 0,
+  uncacheable: 0,
+  errors: 0,
+};
+
+// Requests with different credentials or headers never share an entry. The
+// key covers every request header, so a response that varies on some of
+// them (Vary) is only ever served to requests sending the same values.
+export function httpCacheKey(url: string, headers: Record<string, string>): string {
+  const normalized = Object.keys(headers)
+    .sort()
+    .map(name => `${name.toLowerCase()}:${headers[name]}`)
+    .join('\n');
+  return crypto.createHash('sha256').update(`GET ${url}\n${normalized}`).digest('hex');
+}
+
+export function isFresh(entry: CachedResponse): boolean {
+  return entry.expiresAt > Date.now();
+}
+
+export function hasValidators(entry: CachedResponse): boolean {
+  return !!(entry.etag || entry.lastModified);
+}
+
+export async function getCachedResponse(key: string): Promise<CachedResponse | null> {
+  const local = localCache.get(key);
+  if (local) {
+    return local;
+  }
+
+  try {
+    const raw = await redis.get(KEY_PREFIX + key);
+    if (!raw) {
+      return null;
+    }
+    const entry = JSON.parse(raw) as CachedResponse;
+    localCache.set(key, entry);
+    return entry;
+  } catch (error) {
+    stats.errors++;
+    console.error('HTTP cache read failed:', error);
+    return null;
+  }
+}
+
+// Freshness lifetime in ms: the step's cacheTtl (seconds) when positive,
+// otherwise the response's Cache-Control max-age. null means do not store:
+// no-store and private responses (this is a shared cache, and cacheTtl does
+// not override either) and Vary: * (varies on more than the request).
+export function freshnessLifetime(
+  headers: Record<string, string>,
+  cacheTtl: number
+): number | null {
+  const cacheControl = (headers['cache-control'] || '').toLowerCase();
+  if (/(?:^|[\s,])(?:no-store|private)\b/.test(cacheControl)) {
+    stats.uncacheable++;
+    return null;
+  }
+  if ((headers['vary'] || '').split(',').some((name) => name.trim() === '*')) {
+    stats.uncacheable++;
+    return null;
+  }
+  if (cacheTtl > 0) {
+    return cacheTtl * 1000;
+  }
+  if (cacheControl.includes('no-cache')) {
+    return 0;
+  }
+  const maxAge = /(?:s-maxage|max-age)=(\d+)/.exec(cacheControl);
+  return maxAge ? parseInt(maxAge[1]) * 1000 : 0;
+}
+
+export async function storeCachedResponse(key: string, entry: CachedResponse): Promise<void> {
+  const retainMs = Math.max(entry.expiresAt - Date.now(), 0) + (hasValidators(entry) ? STALE_RETENTION_MS : 0);
+  if (retainMs <= 0) {
+    return;
+  }
+
+  const raw = JSON.stringify(entry);
+  if (raw.length > MAX_ENTRY_BYTES) {
+    return;
+  }
+
+  localCache.set(key, entry);
+  stats.stores++;
+  try {
+    await redis.set(KEY_PREFIX + key, raw, 'PX', retainMs);
+  } catch (error) {
+    stats.errors++;
+    console.error('HTTP cache write failed:', error);
+  }
+}
+
+export function recordCacheHit(): void {
+  stats.hits++;
+}
+
+export function recordCacheMiss(): void {
+  stats.misses++;
+}
+
+export function recordCacheRevalidation(): void {
+  stats.revalidated++;
+}
+
+export function getHttpCacheStats(): Record<string, number> {
+  return { ...stats, localEntries: localCache.size };
+}
+
+registerMetricsSource('httpCache', getHttpCacheStats);
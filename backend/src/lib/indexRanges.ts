@@ -0,0 +1,28 @@
+// Sets of array indexes stored as sorted [start, end) ranges, so a
+// checkpoint of thousands of completed items stays a handful of numbers.
+
+export type IndexRange = [number, number];
+
+export function toIndexRanges(indexes: Iterable<number>): IndexRange[] {
+  const sorted = [...indexes].sort((a, b) => a - b);
+  const ranges: IndexRange[] = [];
+  for (const index of sorted) {
+    const last = ranges[ranges.length - 1];
+    if (last && index <= last[1]) {
+      last[1] = Math.max(last[1], index + 1);
+    } else {
+      ranges.push([index, index + 1]);
+    }
+  }
+  return ranges;
+}
+
+export function fromIndexRanges(ranges: IndexRange[]): Set<number> {
+  const indexes = new Set<number>();
+  for (const [start, end] of ranges) {
+    for (let index = start; index < end; index++) {
+      indexes.add(index);
+    }
+  }
+  return indexes;
+}
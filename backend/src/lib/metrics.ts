@@ -0,0 +1,46 @@
+import http from 'node:http';
+
+// Process-local registry of runtime stats (connection pools, caches, queues).
+// Each subsystem registers a snapshot function; collectMetrics() gathers them.
+
+type MetricsSource = () => Record<string, any>;
+
+const sources = new Map<string, MetricsSource>();
+
+export function registerMetricsSource(name: string, source: MetricsSource): void {
+  sources.set(name, source);
+}
+
+export function collectMetrics(): Record<string, any> {
+  const metrics: Record<string, any> = {
+    pid: process.pid,
+    uptime: process.uptime(),
+    memory: process.memoryUsage(),
+  };
+  for (const [name, source] of sources) {
+    try {
+      metrics[name] = source();
+    } catch (error) {
+      metrics[name] = { error: error instanceof Error ? error.message : String(error) };
+    }
+  }
+  return metrics;
+}
+
+// Serves collectMetrics() as JSON for processes without an Express app
+export function startMetricsServer(port: number): http.Server {
+  const server = http.createServer((req, res) => {
+    if (req.url !== '/metrics') {
+      res.writeHead(404).end();
+      return;
+    }
+    res.writeHead(200, { 'Content-Type': 'application/json' });
+    res.end(JSON.stringify(collectMetrics()));
+  });
+
+  server.listen(port, () => {
+    console.log(`📈 Metrics available on http://localhost:${port}/metrics`);
+  });
+
+  return server;
+}
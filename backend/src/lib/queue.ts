@@ -1,6 +1,15 @@
-import { Queue, Worker, Job } from 'bullmq';
+import { Queue, Worker, Job, DelayedError } from 'bullmq';
+import { v5 as uuidv5 } from 'uuid';
 import { createRedisConnection } from './redis.js';
 import { executeWorkflow } from '../services/executor.js';
+import { registerMetricsSource } from './metrics.js';
+import { pool } from '../db/index.js';
+import {
+  startAdaptiveConcurrency,
+  createTenantScheduler,
+  INITIAL_CONCURRENCY,
+  TENANT_DEFER_MS,
+} from './workerScheduling.js';
 
 const connection = createRedisConnection();
 
@@ -18,20 +27,43 @@ export const workflowQueue = new Queue('workflow-execution', {
   },
 });
 
-// Scheduled jobs queue
+// Scheduled jobs queue; ticks are enqueued by the scheduler service. Their
+// handoff is idempotent, so failed ticks are retried
 export const scheduledQueue = new Queue('scheduled-workflows', {
   connection,
   defaultJobOptions: {
     removeOnComplete: 100,
     removeOnFail: 50,
+    attempts: 3,
+    backoff: {
+      type: 'exponential',
+      delay: 1000,
+    },
   },
 });
 
+// Admission control for scheduled ticks: a cap on handoffs per second and
+// in flight, and a pause while DB queries already queue for a connection
+const SCHEDULED_RATE_PER_SEC = parseInt(process.env.SCHEDULED_DISPATCH_RATE_PER_SEC || '200');
+// Ticks mostly wait for their batch, so the cap is the batch size
+const SCHEDULED_CONCURRENCY = parseInt(process.env.SCHEDULED_WORKER_CONCURRENCY || '100');
+const SCHEDULED_MAX_POOL_WAITING = parseInt(process.env.SCHEDULED_MAX_POOL_WAITING || '5');
+const SCHEDULED_BACKOFF_MS = 250;
+// Ticks arriving within this window become one INSERT and one addBulk
+const SCHEDULED_BATCH_WINDOW_MS = parseInt(process.env.SCHEDULED_BATCH_WINDOW_MS || '10');
+// Execution ids of scheduled ticks derive from the tick's job id, so a
+// retried tick maps to the same row and workflow job
+const SCHEDULE_TICK_NAMESPACE = '6f1b8f9e-3c55-4a8e-9a51-2f0c7d4e8b13';
+
 export interface WorkflowJobData {
   workflowId: string;
   executionId: string;
   triggerType: 'schedule' | 'webhook' | 'manual';
   triggerData?: Record<string, any>;
+  // Owner of the workflow, used for fair scheduling between tenants
+  userId?: string;
+  // The execution row does not exist yet; the worker writes it on start
+  deferredInsert?: boolean;
 }
 
 export async function addWorkflowJob(data: WorkflowJobData): Promise<Job<WorkflowJobData>> {
@@ -40,51 +72,73 @@ export async function addWorkflowJob(data: WorkflowJobData): Promise<Job<Workflo
   });
 }
 
-export async function addScheduledJob(
-  workflowId: string,
-  cronExpression: string,
-  jobId: string
-): Promise<Job> {
-  return scheduledQueue.add(
-    'scheduled',
-    { workflowId },
-    {
-      jobId,
-      repeat: {
-        pattern: cronExpression,
-      },
-    }
-  );
-}
-
-export async function removeScheduledJob(jobId: string): Promise<void> {
-  await scheduledQueue.removeRepeatableByKey(jobId);
-}
-
 export function createWorkflowWorker() {
+  const tenants = createTenantScheduler(() => worker.concurrency);
+
   const worker = new Worker<WorkflowJobData>(
     'workflow-execution',
-    async (job) => {
+    async (job, token) => {
+      // Park the job briefly if its tenant already holds its fair share
+      const tenant = job.data.userId || job.data.workflowId;
+      const waitMs = Math.max(0, Date.now() - job.timestamp - (job.opts.delay || 0));
+      if (!tenants.tryAcquire(tenant, job.id!, waitMs)) {
+        await job.moveToDelayed(Date.now() + TENANT_DEFER_MS, token);
+        throw new DelayedError();
+      }
+
       console.log(`Processing workflow job: ${job.id}`);
+      controller.jobStarted();
       try {
         const result = await executeWorkflow(
           job.data.workflowId,
           job.data.executionId,
           job.data.triggerType,
-          job.data.triggerData
+          job.data.triggerData,
+          {
+            acceptedAt: job.data.deferredInsert ? new Date(job.timestamp) : undefined,
+            finalAttempt: job.attemptsMade + 1 >= (job.opts.attempts ?? 1),
+          }
         );
+
+        // Suspended (e.g. a long delay step): park the job until it is due
+        // and release the worker slot in the meantime
+        if (result.resumeAt !== undefined) {
+          await job.moveToDelayed(result.resumeAt, token);
+          throw new DelayedError();
+        }
+
+        // Fail the job so the queue's retry policy applies; the retry
+        // resumes from the execution's step checkpoints
+        if (!result.success) {
+          throw new Error(`Workflow execution ${job.data.executionId} failed`);
+        }
+
         return result;
       } catch (error) {
+        if (error instanceof DelayedError) {
+          throw error;
+        }
         console.error(`Workflow execution failed for job ${job.id}:`, error);
         throw error;
+      } finally {
+        controller.jobFinished();
+        tenants.release(tenant);
       }
     },
     {
       connection: createRedisConnection(),
-      concurrency: 5,
+      concurrency: INITIAL_CONCURRENCY,
     }
   );
 
+  const controller = startAdaptiveConcurrency(worker);
+  worker.on('closed', () => controller.stop());
+
+  registerMetricsSource('workflowWorker', () => ({
+    ...controller.stats(),
+    tenants: tenants.stats(),
+  }));
+
   worker.on('completed', (job) => {
     console.log(`Job ${job.id} completed`);
   });
@@ -96,27 +150,100 @@ export function createWorkflowWorker() {
   return worker;
 }
 
+interface PendingTick {
+  tickId: string;
+  workflowId: string;
+  scheduledAt: string;
+  resolve: () => void;
+  reject: (error: unknown) => void;
+}
+
+async function dispatchTicks(ticks: PendingTick[]): Promise<void> {
+  const { createExecutions } = await import('../services/workflows.js');
+  const executions = ticks.map((tick) => ({
+    id: uuidv5(tick.tickId, SCHEDULE_TICK_NAMESPACE),
+    workflowId: tick.workflowId,
+    triggerType: 'schedule' as const,
+    triggerData: { scheduledAt: tick.scheduledAt },
+  }));
+
+  // Owner of each created execution, so ticks get their tenant's fair share
+  const owners = new Map((await createExecutions(executions)).map((row) => [row.id, row.user_id]));
+  await workflowQueue.addBulk(
+    executions
+      .filter((execution) => owners.has(execution.id))
+      .map((execution) => ({
+        name: 'execute',
+        data: {
+          workflowId: execution.workflowId,
+          executionId: execution.id,
+          triggerType: execution.triggerType,
+          triggerData: execution.triggerData,
+          userId: owners.get(execution.id),
+        },
+        opts: { jobId: execution.id },
+      }))
+  );
+}
+
 export function createScheduledWorker() {
+  const admission = { deferred: 0, batches: 0, ticks: 0 };
+
+  // Concurrent ticks gather for a few milliseconds and are handed off
+  // together; each job settles with its batch
+  let pending: PendingTick[] = [];
+  let flushTimer: NodeJS.Timeout | null = null;
+
+  const flush = () => {
+    if (flushTimer) clearTimeout(flushTimer);
+    flushTimer = null;
+    const batch = pending;
+    pending = [];
+    admission.batches++;
+    admission.ticks += batch.length;
+    dispatchTicks(batch).then(
+      () => batch.forEach((tick) => tick.resolve()),
+      (error) => batch.forEach((tick) => tick.reject(error))
+    );
+  };
+
+  const enqueueTick = (tick: Omit<PendingTick, 'resolve' | 'reject'>) =>
+    new Promise<void>((resolve, reject) => {
+      pending.push({ ...tick, resolve, reject });
+      if (pending.length >= SCHEDULED_CONCURRENCY) {
+        flush();
+      } else if (!flushTimer) {
+        flushTimer = setTimeout(flush, SCHEDULED_BATCH_WINDOW_MS);
+      }
+    });
+
   const worker = new Worker(
     'scheduled-workflows',
     async (job) => {
-      console.log(`Processing scheduled workflow: ${job.data.workflowId}`);
-      // Create an execution and add to workflow queue
-      const { createExecution } = await import('../services/workflows.js');
-      const execution = await createExecution(job.data.workflowId, 'schedule', {
-        scheduledAt: new Date().toISOString(),
-      });
-      
-      await addWorkflowJob({
+      if (pool.waitingCount > SCHEDULED_MAX_POOL_WAITING) {
+        admission.deferred++;
+        await worker.rateLimit(SCHEDULED_BACKOFF_MS);
+        throw Worker.RateLimitError();
+      }
+
+      // Create an execution and add to workflow queue, batched with others
+      await enqueueTick({
+        tickId: job.id!,
         workflowId: job.data.workflowId,
-        executionId: execution.id,
-        triggerType: 'schedule',
+        scheduledAt: job.data.scheduledAt || new Date(job.timestamp).toISOString(),
       });
     },
     {
       connection: createRedisConnection(),
+      concurrency: SCHEDULED_CONCURRENCY,
+      limiter: {
+        max: SCHEDULED_RATE_PER_SEC,
+        duration: 1000,
+      },
     }
   );
 
+  registerMetricsSource('scheduledWorker', () => ({ ...admission }));
+
   return worker;
 }
@@ -5,9 +5,12 @@ dotenv.config();
 
 const redisUrl = process.env.REDIS_URL || 'redis://localhost:6379';
 
+// Connects on the first command, so importing a module that uses it (e.g.
+// in unit tests) does not open a connection
 export const redis = new Redis(redisUrl, {
   maxRetriesPerRequest: null,
   enableReadyCheck: false,
+  lazyConnect: true,
 });
 
 redis.on('error', (err) => {
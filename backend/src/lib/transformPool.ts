@@ -0,0 +1,170 @@
+import { Worker } from 'node:worker_threads';
+import os from 'node:os';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+import { registerMetricsSource } from './metrics.js';
+
+// Pool of worker threads that evaluate transform_data expressions, so heavy
+// map/filter/aggregate work over large responses never blocks the event
+// loop that drives I/O-bound steps. Each thread has a V8 heap limit, and a
+// task that runs past its time limit has its thread terminated and replaced.
+
+const POOL_SIZE = parseInt(process.env.TRANSFORM_POOL_SIZE || String(Math.max(1, os.availableParallelism() - 1)));
+const TIMEOUT_MS = parseInt(process.env.TRANSFORM_TIMEOUT_MS || '1000');
+const MAX_MEMORY_MB = parseInt(process.env.TRANSFORM_MAX_MEMORY_MB || '64');
+
+// Resolves to the .ts source under tsx and to the built .js file in dist/
+const WORKER_URL = new URL(
+  `./transformWorker${path.extname(fileURLToPath(import.meta.url))}`,
+  import.meta.url
+);
+
+interface TransformTask {
+  id: number;
+  expression: string;
+  input: Record<string, any>;
+  resolve: (result: any) => void;
+  reject: (error: Error) => void;
+}
+
+interface PoolThread {
+  worker: Worker;
+  task: TransformTask | null;
+  timer: NodeJS.Timeout | null;
+}
+
+const threads: PoolThread[] = [];
+const queue: TransformTask[] = [];
+let nextTaskId = 0;
+
+const stats = {
+  completed: 0,
+  failed: 0,
+  timedOut: 0,
+  restarts: 0,
+};
+
+function finishTask(thread: PoolThread): TransformTask | null {
+  const task = thread.task;
+  if (thread.timer) {
+    clearTimeout(thread.timer);
+  }
+  thread.task = null;
+  thread.timer = null;
+  // Idle threads must not keep the process alive
+  thread.worker.unref();
+  return task;
+}
+
+function replaceThread(thread: PoolThread, error: Error): void {
+  const index = threads.indexOf(thread);
+  if (index === -1) {
+    return;
+  }
+
+  const task = finishTask(thread);
+  if (task) {
+    stats.failed++;
+    task.reject(error);
+  }
+
+  thread.worker.removeAllListeners();
+  thread.worker.terminate().catch(() => {});
+  threads[index] = spawnThread();
+  stats.restarts++;
+  dispatch();
+}
+
+function spawnThread(): PoolThread {
+  const worker = new Worker(WORKER_URL, {
+    resourceLimits: {
+      maxOldGenerationSizeMb: MAX_MEMORY_MB,
+      maxYoungGenerationSizeMb: Math.max(4, Math.floor(MAX_MEMORY_MB / 8)),
+    },
+  });
+  worker.unref();
+
+  const thread: PoolThread = { worker, task: null, timer: null };
+
+  worker.on('message', ({ result, error }: { id: number; result?: any; error?: string }) => {
+    const task = finishTask(thread);
+    if (task) {
+      if (error !== undefined) {
+        stats.failed++;
+        task.reject(new Error(`Transform failed: ${error}`));
+      } else {
+        stats.completed++;
+        task.resolve(result);
+      }
+    }
+    dispatch();
+  });
+
+  // Raised for heap exhaustion (ERR_WORKER_OUT_OF_MEMORY) and uncaught errors
+  worker.on('error', (error) => {
+    const message = (error as NodeJS.ErrnoException).code === 'ERR_WORKER_OUT_OF_MEMORY'
+      ? `Transform exceeded memory limit of ${MAX_MEMORY_MB}MB`
+      : `Transform worker crashed: ${error.message}`;
+    replaceThread(thread, new Error(message));
+  });
+
+  worker.on('exit', (code) => {
+    replaceThread(thread, new Error(`Transform worker exited with code ${code}`));
+  });
+
+  return thread;
+}
+
+function dispatch(): void {
+  if (threads.length === 0) {
+    for (let i = 0; i < POOL_SIZE; i++) {
+      threads.push(spawnThread());
+    }
+  }
+
+  for (const thread of threads) {
+    if (queue.length === 0) {
+      return;
+    }
+    if (thread.task) {
+      continue;
+    }
+
+    const task = queue.shift()!;
+    thread.task = task;
+    thread.worker.ref();
+    thread.timer = setTimeout(() => {
+      stats.timedOut++;
+      replaceThread(thread, new Error(`Transform exceeded time limit of ${TIMEOUT_MS}ms`));
+    }, TIMEOUT_MS);
+
+    // The input is structured-cloned into the thread; the caller keeps its copy
+    try {
+      thread.worker.postMessage({ id: task.id, expression: task.expression, input: task.input });
+    } catch (error) {
+      finishTask(thread);
+      stats.failed++;
+      task.reject(error instanceof Error ? error : new Error(String(error)));
+    }
+  }
+}
+
+// Evaluate an expression against `input` on a pool thread. Tasks queue when
+// every thread is busy; the time limit applies from dispatch.
+export function runTransform(expression: string, input: Record<string, any>): Promise<any> {
+  return new Promise((resolve, reject) => {
+    queue.push({ id: nextTaskId++, expression, input, resolve, reject });
+    dispatch();
+  });
+}
+
+export function getTransformPoolStats(): Record<string, number> {
+  return {
+    ...stats,
+    threads: threads.length,
+    busy: threads.filter(thread => thread.task).length,
+    queued: queue.length,
+  };
+}
+
+registerMetricsSource('transformPool', getTransformPoolStats);
@@ -0,0 +1,20 @@
+import { parentPort } from 'node:worker_threads';
+import { compileExpression, evaluateExpression } from './expression.js';
+
+// Thread entry point for the transform pool: evaluates one expression per
+// message against the context entries it was sent.
+
+interface TransformTask {
+  id: number;
+  expression: string;
+  input: Record<string, any>;
+}
+
+parentPort!.on('message', ({ id, expression, input }: TransformTask) => {
+  try {
+    const result = evaluateExpression(compileExpression(expression).ast, input);
+    parentPort!.postMessage({ id, result });
+  } catch (error) {
+    parentPort!.postMessage({ id, error: error instanceof Error ? error.message : String(error) });
+  }
+});
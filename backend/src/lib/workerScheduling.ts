@@ -0,0 +1,175 @@
+import { monitorEventLoopDelay } from 'node:perf_hooks';
+import type { Worker } from 'bullmq';
+import dotenv from 'dotenv';
+
+dotenv.config();
+
+// Adaptive concurrency and per-tenant fairness for the workflow worker.
+// Executions mostly wait on I/O, so slots grow while the event loop stays
+// responsive and shrink when it lags; within those slots, no tenant may
+// hold more than its fair share while other tenants have work.
+
+const MIN_CONCURRENCY = parseInt(process.env.WORKER_MIN_CONCURRENCY || '2');
+const MAX_CONCURRENCY = parseInt(process.env.WORKER_MAX_CONCURRENCY || '50');
+const TARGET_LAG_MS = parseInt(process.env.WORKER_TARGET_LAG_MS || '50');
+const ADJUST_INTERVAL_MS = parseInt(process.env.WORKER_CONCURRENCY_INTERVAL_MS || '2000');
+// A tenant counts as active for this long after its last job or deferral
+const TENANT_ACTIVE_WINDOW_MS = parseInt(process.env.TENANT_ACTIVE_WINDOW_MS || '10000');
+export const TENANT_DEFER_MS = parseInt(process.env.TENANT_DEFER_MS || '1000');
+
+export const INITIAL_CONCURRENCY = Math.min(
+  Math.max(parseInt(process.env.WORKER_CONCURRENCY || '5'), MIN_CONCURRENCY),
+  MAX_CONCURRENCY
+);
+
+// Adaptive concurrency (AIMD on event-loop lag)
+
+export interface ConcurrencyController {
+  jobStarted: () => void;
+  jobFinished: () => void;
+  stats: () => Record<string, any>;
+  stop: () => void;
+}
+
+export function startAdaptiveConcurrency(worker: Worker): ConcurrencyController {
+  const histogram = monitorEventLoopDelay({ resolution: 20 });
+  histogram.enable();
+
+  let inFlight = 0;
+  let peakInFlight = 0;
+  let lastLagMs = 0;
+
+  const adjust = () => {
+    lastLagMs = histogram.percentile(99) / 1e6;
+    histogram.reset();
+
+    const current = worker.concurrency;
+    let next = current;
+
+    if (lastLagMs > TARGET_LAG_MS) {
+      // The loop is saturated (CPU-bound work): back off quickly
+      next = Math.max(MIN_CONCURRENCY, Math.floor(current * 0.75));
+    } else if (peakInFlight >= current && lastLagMs < TARGET_LAG_MS / 2) {
+      // Every slot was busy and the loop is idle-ish: there is I/O to overlap
+      next = Math.min(MAX_CONCURRENCY, current + 1);
+    }
+
+    if (next !== current) {
+      worker.concurrency = next;
+      console.log(`⚖️ Worker concurrency ${current} → ${next} (event loop p99 ${lastLagMs.toFixed(1)}ms)`);
+    }
+    peakInFlight = inFlight;
+  };
+
+  const timer = setInterval(adjust, ADJUST_INTERVAL_MS);
+  timer.unref();
+
+  return {
+    jobStarted() {
+      inFlight++;
+      peakInFlight = Math.max(peakInFlight, inFlight);
+    },
+    jobFinished() {
+      inFlight--;
+    },
+    stats() {
+      return {
+        concurrency: worker.concurrency,
+        inFlight,
+        eventLoopLagP99Ms: lastLagMs,
+      };
+    },
+    stop() {
+      clearInterval(timer);
+      histogram.disable();
+    },
+  };
+}
+
+// Per-tenant fair share
+
+interface TenantState {
+  inFlight: number;
+  // Jobs currently parked because the tenant was over its share, with the
+  // time they were parked (a job may come back on another worker process)
+  deferred: Map<string, number>;
+  lastSeen: number;
+  started: number;
+  totalWaitMs: number;
+}
+
+export interface TenantScheduler {
+  // Returns false when the tenant is over its share and the job should wait
+  tryAcquire: (tenant: string, jobId: string, waitMs: number) => boolean;
+  release: (tenant: string) => void;
+  stats: () => Record<string, any>;
+}
+
+export function createTenantScheduler(getConcurrency: () => number): TenantScheduler {
+  const tenants = new Map<string, TenantState>();
+
+  const stateFor = (tenant: string) => {
+    let state = tenants.get(tenant);
+    if (!state) {
+      state = { inFlight: 0, deferred: new Map(), lastSeen: 0, started: 0, totalWaitMs: 0 };
+      tenants.set(tenant, state);
+    }
+    return state;
+  };
+
+  const activeTenantCount = (now: number) => {
+    let count = 0;
+    for (const [tenant, state] of tenants) {
+      for (const [jobId, parkedAt] of state.deferred) {
+        if (now - parkedAt > TENANT_ACTIVE_WINDOW_MS) {
+          state.deferred.delete(jobId);
+        }
+      }
+      if (state.inFlight > 0 || state.deferred.size > 0 || now - state.lastSeen < TENANT_ACTIVE_WINDOW_MS) {
+        count++;
+      } else {
+        tenants.delete(tenant);
+      }
+    }
+    return count;
+  };
+
+  return {
+    tryAcquire(tenant, jobId, waitMs) {
+      const now = Date.now();
+      const state = stateFor(tenant);
+      state.lastSeen = now;
+
+      const share = Math.max(1, Math.ceil(getConcurrency() / Math.max(1, activeTenantCount(now))));
+      if (state.inFlight >= share) {
+        state.deferred.set(jobId, now);
+        return false;
+      }
+
+      state.deferred.delete(jobId);
+      state.inFlight++;
+      state.started++;
+      state.totalWaitMs += waitMs;
+      return true;
+    },
+
+    release(tenant) {
+      const state = stateFor(tenant);
+      state.inFlight = Math.max(0, state.inFlight - 1);
+      state.lastSeen = Date.now();
+    },
+
+    stats() {
+      const result: Record<string, any> = {};
+      for (const [tenant, state] of tenants) {
+        result[tenant] = {
+          inFlight: state.inFlight,
+          queued: state.deferred.size,
+          started: state.started,
+          avgWaitMs: state.started > 0 ? Math.round(state.totalWaitMs / state.started) : 0,
+        };
+      }
+      return result;
+    },
+  };
+}
@@ -1,17 +1,56 @@
 import { Router, Request, Response } from 'express';
-import { getWorkflowByWebhookId, createExecution } from '../services/workflows.js';
+import { v4 as uuidv4 } from 'uuid';
+import { createExecution } from '../services/workflows.js';
+import { resolveWebhook } from '../services/webhookCache.js';
+import { captureWebhookBody, pickHeaders } from '../services/webhookIngest.js';
+import {
+  headerIdempotencyKey,
+  claimIdempotencyKey,
+  releaseIdempotencyKey,
+} from '../services/webhookIdempotency.js';
+import { BodyTooLargeError } from '../lib/http.js';
+import { isBlobHandle, deleteBlob } from '../lib/blobStore.js';
+import { enqueueCoalescedTrigger } from '../services/webhookCoalesce.js';
 import { addWorkflowJob } from '../lib/queue.js';
 
 const router = Router();
 
+// 'async' accepts a webhook with a single Redis write and answers 202; the
+// worker creates the execution row when it starts the job. 'sync' writes
+// the row first and answers once both are stored.
+const INGEST_MODE = process.env.WEBHOOK_INGEST_MODE === 'async' ? 'async' : 'sync';
+
+// Idempotency value for requests folded into a coalesced run, which have
+// no execution id of their own
+const COALESCED = 'coalesced';
+
+// A repeated delivery gets the original execution id and starts nothing
+function sendDuplicate(res: Response, executionId: string): void {
+  res.json({
+    success: true,
+    data: {
+      ...(executionId === COALESCED ? { coalesced: true } : { executionId }),
+      duplicate: true,
+      message: 'Duplicate webhook ignored',
+    },
+  });
+}
+
+async function releaseKey(workflowId: string, key: string | null): Promise<void> {
+  if (key) {
+    await releaseIdempotencyKey(workflowId, key);
+  }
+}
+
 // Receive webhook trigger
 router.all('/:webhookId', async (req: Request, res: Response) => {
   try {
     const { webhookId } = req.params;
 
-    const workflow = await getWorkflowByWebhookId(webhookId);
+    // Served from the routing cache; no DB read on the hot path
+    const route = await resolveWebhook(webhookId);
 
-    if (!workflow) {
+    if (!route || !route.isActive) {
       res.status(404).json({
         success: false,
         error: 'Webhook not found or workflow is inactive',
@@ -19,33 +58,129 @@ router.all('/:webhookId', async (req: Request, res: Response) => {
       return;
     }
 
-    // Collect trigger data from request
-    const triggerData = {
-      method: req.method,
-      headers: req.headers,
-      query: req.query,
-      body: req.body,
-      receivedAt: new Date().toISOString(),
-    };
-
-    // Create execution record
-    const execution = await createExecution(workflow.id, 'webhook', triggerData);
-
-    // Add to job queue
-    await addWorkflowJob({
-      workflowId: workflow.id,
-      executionId: execution.id,
-      triggerType: 'webhook',
-      triggerData,
-    });
+    // The execution id is fixed up front so an idempotency key can point at
+    // it; it is also the BullMQ job id
+    const executionId = uuidv4();
+    const idempotency = route.idempotency;
+    const claimValue = route.coalesce ? COALESCED : executionId;
 
-    res.json({
-      success: true,
-      data: {
-        executionId: execution.id,
-        message: 'Webhook received, workflow execution started',
-      },
-    });
+    // Header keys are checked before the body is read, so a retried
+    // delivery costs one Redis command
+    let idempotencyKey = headerIdempotencyKey(req, idempotency);
+    if (idempotencyKey && idempotency) {
+      const existing = await claimIdempotencyKey(route.workflowId, idempotencyKey, claimValue, idempotency);
+      if (existing) {
+        sendDuplicate(res, existing);
+        return;
+      }
+    }
+
+    try {
+      // Collect trigger data from request; the body is read here, after the
+      // route is known, so its limits can apply
+      let captured;
+      try {
+        captured = await captureWebhookBody(req, route.ingestion, {
+          hash: !idempotencyKey && !!idempotency?.bodyHash,
+        });
+      } catch (error) {
+        if (error instanceof BodyTooLargeError) {
+          await releaseKey(route.workflowId, idempotencyKey);
+          res.status(413).json({
+            success: false,
+            error: `Payload too large (limit ${error.limitBytes} bytes)`,
+          });
+          return;
+        }
+        if (error instanceof SyntaxError) {
+          await releaseKey(route.workflowId, idempotencyKey);
+          res.status(400).json({
+            success: false,
+            error: 'Invalid JSON body',
+          });
+          return;
+        }
+        throw error;
+      }
+      const { body, sha256 } = captured;
+
+      if (sha256 && idempotency) {
+        idempotencyKey = `body:${sha256}`;
+        const existing = await claimIdempotencyKey(route.workflowId, idempotencyKey, claimValue, idempotency);
+        if (existing) {
+          if (isBlobHandle(body)) {
+            await deleteBlob(body);
+          }
+          sendDuplicate(res, existing);
+          return;
+        }
+      }
+
+      const triggerData = {
+        method: req.method,
+        headers: pickHeaders(req.headers, route.ingestion?.headers),
+        query: req.query,
+        body,
+        receivedAt: new Date().toISOString(),
+      };
+
+      // Folded into a later run by the workflow's coalescing policy
+      if (route.coalesce) {
+        await enqueueCoalescedTrigger(route.workflowId, route.userId, route.coalesce, triggerData);
+        res.status(202).json({
+          success: true,
+          data: {
+            coalesced: true,
+            message: 'Webhook accepted, coalesced into the next execution',
+          },
+        });
+        return;
+      }
+
+      if (INGEST_MODE === 'async') {
+        await addWorkflowJob({
+          workflowId: route.workflowId,
+          executionId,
+          triggerType: 'webhook',
+          triggerData,
+          userId: route.userId,
+          deferredInsert: true,
+        });
+
+        res.status(202).json({
+          success: true,
+          data: {
+            executionId,
+            message: 'Webhook accepted, workflow execution queued',
+          },
+        });
+        return;
+      }
+
+      // Create execution record
+      await createExecution(route.workflowId, 'webhook', triggerData, executionId);
+
+      // Add to job queue
+      await addWorkflowJob({
+        workflowId: route.workflowId,
+        executionId,
+        triggerType: 'webhook',
+        triggerData,
+        userId: route.userId,
+      });
+
+      res.json({
+        success: true,
+        data: {
+          executionId,
+          message: 'Webhook received, workflow execution started',
+        },
+      });
+    } catch (error) {
+      // Not accepted: let the sender's retry through
+      await releaseKey(route.workflowId, idempotencyKey).catch(() => {});
+      throw error;
+    }
   } catch (error) {
     console.error('Webhook error:', error);
     res.status(500).json({
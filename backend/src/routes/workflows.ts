@@ -12,6 +12,7 @@ import {
   createExecution,
   getExecutionsByWorkflowId,
   getStepExecutionsByExecutionId,
+  hydrateStepInputs,
 } from '../services/workflows.js';
 import { testWorkflow } from '../services/executor.js';
 import { addWorkflowJob } from '../lib/queue.js';
@@ -321,6 +322,7 @@ router.post('/:id/run', authMiddleware, async (req: Request, res: Response) => {
       executionId: execution.id,
       triggerType: 'manual',
       triggerData,
+      userId: workflow.user_id,
     });
 
     res.json({
@@ -407,7 +409,11 @@ router.get('/:id/executions/:executionId', authMiddleware, async (req: Request,
       return;
     }
 
-    const steps = await getStepExecutionsByExecutionId(req.params.executionId);
+    // Step inputs are stored as references; expand them for display
+    const steps = hydrateStepInputs(
+      execution,
+      await getStepExecutionsByExecutionId(req.params.executionId)
+    );
 
     res.json({
       success: true,
@@ -1,6 +1,6 @@
 import bcrypt from 'bcryptjs';
 import jwt from 'jsonwebtoken';
-import { query } from '../db/index.js';
+import { query, prepared } from '../db/index.js';
 import { User, UserPublic } from '../types/index.js';
 import dotenv from 'dotenv';
 
@@ -49,7 +49,7 @@ export async function createUser(
 
 export async function getUserByEmail(email: string): Promise<User | null> {
   const result = await query<User>(
-    'SELECT * FROM users WHERE email = $1',
+    prepared('users.by-email', 'SELECT * FROM users WHERE email = $1'),
     [email]
   );
   return result.rows[0] || null;
@@ -57,7 +57,7 @@ export async function getUserByEmail(email: string): Promise<User | null> {
 
 export async function getUserById(id: string): Promise<UserPublic | null> {
   const result = await query<UserPublic>(
-    'SELECT id, email, name, created_at FROM users WHERE id = $1',
+    prepared('users.by-id', 'SELECT id, email, name, created_at FROM users WHERE id = $1'),
     [id]
   );
   return result.rows[0] || null;
@@ -0,0 +1,60 @@
+import type { StepExecution, WorkflowStep } from '../types/index.js';
+import { stepsToSkip } from './dag.js';
+import { fromIndexRanges } from '../lib/indexRanges.js';
+
+// Steps persisted by an earlier run of an execution (a suspended delay, a
+// retried job or a stalled worker) act as checkpoints: completed steps are
+// restored into the context and not run again, and unfinished ones reuse
+// their rows instead of inserting duplicates.
+
+export type StepCheckpoint = Pick<StepExecution, 'id' | 'step_id' | 'status' | 'output_data'>;
+
+export interface RestoredCheckpoints {
+  // Output of each completed step, by step id
+  outputs: Record<string, any>;
+  completed: Set<string>;
+  // Steps on the branches completed conditionals did not take
+  skipped: Set<string>;
+  // Row ids of unfinished steps, by step id
+  existingRows: Map<string, string>;
+  // Resume times of suspended delays, by step id
+  waitingUntil: Map<string, number>;
+  // Indexes of foreach items that already succeeded, by step id
+  foreachDone: Map<string, Set<number>>;
+}
+
+export function restoreCheckpoints(steps: WorkflowStep[], checkpoints: StepCheckpoint[]): RestoredCheckpoints {
+  const restored: RestoredCheckpoints = {
+    outputs: {},
+    completed: new Set(),
+    skipped: new Set(),
+    existingRows: new Map(),
+    waitingUntil: new Map(),
+    foreachDone: new Map(),
+  };
+
+  for (const checkpoint of checkpoints) {
+    if (checkpoint.status === 'completed') {
+      restored.outputs[checkpoint.step_id] = checkpoint.output_data;
+      restored.completed.add(checkpoint.step_id);
+      const step = steps.find(s => s.id === checkpoint.step_id);
+      if (step) {
+        stepsToSkip(step, checkpoint.output_data).forEach(id => restored.skipped.add(id));
+      }
+      continue;
+    }
+
+    restored.existingRows.set(checkpoint.step_id, checkpoint.id);
+    if (checkpoint.output_data?.completedItems) {
+      restored.foreachDone.set(checkpoint.step_id, fromIndexRanges(checkpoint.output_data.completedItems));
+    }
+    if (checkpoint.status === 'waiting') {
+      restored.waitingUntil.set(
+        checkpoint.step_id,
+        new Date(checkpoint.output_data?.resumeAt).getTime()
+      );
+    }
+  }
+
+  return restored;
+}
@@ -1,4 +1,4 @@
-import { query } from '../db/index.js';
+import { query, prepared } from '../db/index.js';
 import { ConversationSession,  WorkflowDefinition } from '../types/index.js';
 
 interface ConversationMessage {
@@ -24,7 +24,7 @@ export async function createSession(userId: string): Promise<ConversationSession
 
 export async function getSessionById(id: string): Promise<ConversationSession | null> {
   const result = await query<ConversationSession>(
-    'SELECT * FROM conversation_sessions WHERE id = $1',
+    prepared('sessions.by-id', 'SELECT * FROM conversation_sessions WHERE id = $1'),
     [id]
   );
   return result.rows[0] || null;
@@ -39,13 +39,16 @@ export async function getSessionsByUserId(
   
   const [sessionsResult, countResult] = await Promise.all([
     query<ConversationSession>(
-      `SELECT * FROM conversation_sessions WHERE user_id = $1 
-       ORDER BY updated_at DESC 
-       LIMIT $2 OFFSET $3`,
+      prepared(
+        'sessions.by-user',
+        `SELECT * FROM conversation_sessions WHERE user_id = $1
+         ORDER BY updated_at DESC
+         LIMIT $2 OFFSET $3`
+      ),
       [userId, limit, offset]
     ),
     query<{ count: string }>(
-      'SELECT COUNT(*) as count FROM conversation_sessions WHERE user_id = $1',
+      prepared('sessions.count-by-user', 'SELECT COUNT(*) as count FROM conversation_sessions WHERE user_id = $1'),
       [userId]
     ),
   ]);
@@ -61,10 +64,13 @@ export async function addMessageToSession(
   message: ConversationMessage
 ): Promise<ConversationSession | null> {
   const result = await query<ConversationSession>(
-    `UPDATE conversation_sessions 
-     SET messages = messages || $1::jsonb, updated_at = NOW()
-     WHERE id = $2
-     RETURNING *`,
+    prepared(
+      'sessions.add-message',
+      `UPDATE conversation_sessions
+       SET messages = messages || $1::jsonb, updated_at = NOW()
+       WHERE id = $2
+       RETURNING *`
+    ),
     [JSON.stringify([message]), sessionId]
   );
   
@@ -76,10 +82,13 @@ export async function updateSessionContext(
   context: ConversationSession['context']
 ): Promise<ConversationSession | null> {
   const result = await query<ConversationSession>(
-    `UPDATE conversation_sessions 
-     SET context = context || $1::jsonb, updated_at = NOW()
-     WHERE id = $2
-     RETURNING *`,
+    prepared(
+      'sessions.update-context',
+      `UPDATE conversation_sessions
+       SET context = context || $1::jsonb, updated_at = NOW()
+       WHERE id = $2
+       RETURNING *`
+    ),
     [JSON.stringify(context), sessionId]
   );
   
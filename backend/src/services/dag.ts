@@ -0,0 +1,347 @@
+import type {
+  WorkflowStep,
+  TransformDataConfig,
+  ConditionalConfig,
+  ForEachConfig,
+  HttpRequestConfig,
+} from '../types/index.js';
+import { compileExpression } from '../lib/expression.js';
+
+// Dependency graph over workflow steps. Data edges come from explicit
+// `dependsOn` entries, from `{{step_id...}}` template references in step
+// configs, from the context entries read by expression-language steps and
+// from each conditional step to the steps of its branches.
+//
+// Ordering edges keep the workflow's observable order on top of that:
+//   - a workflow that sets no `dependsOn` anywhere runs its steps one after
+//     another in definition order, as workflows always have
+//   - a workflow that opts into `dependsOn` runs independent steps
+//     concurrently, except that a delay waits for every step before it and
+//     holds back every step after it, and steps with side effects (emails,
+//     non-GET requests) still run in definition order among themselves
+export interface StepGraph {
+  steps: Map<string, WorkflowStep>;
+  // Every edge: a step runs once all of these have finished
+  dependencies: Map<string, Set<string>>;
+  // Data and branch edges only; a step is skipped when all of these were
+  dataDependencies: Map<string, Set<string>>;
+  dependents: Map<string, Set<string>>;
+  order: string[];
+}
+
+const TEMPLATE_REF_PATTERN = /\{\{\s*([^.}\s]+)/g;
+
+function collectTemplateRefs(value: any, refs: Set<string>): void {
+  if (typeof value === 'string') {
+    for (const match of value.matchAll(TEMPLATE_REF_PATTERN)) {
+      refs.add(match[1]);
+    }
+    return;
+  }
+
+  if (Array.isArray(value)) {
+    for (const item of value) {
+      collectTemplateRefs(item, refs);
+    }
+    return;
+  }
+
+  if (typeof value === 'object' && value !== null) {
+    for (const item of Object.values(value)) {
+      collectTemplateRefs(item, refs);
+    }
+  }
+}
+
+// Source of a step evaluated with the expression language, if any
+export function getStepExpression(step: WorkflowStep): string | null {
+  if (step.type === 'transform_data') {
+    const config = step.config as TransformDataConfig;
+    return config.language === 'expression' ? config.expression : null;
+  }
+  if (step.type === 'conditional') {
+    return (step.config as ConditionalConfig).condition;
+  }
+  if (step.type === 'foreach') {
+    return (step.config as ForEachConfig).items;
+  }
+  return null;
+}
+
+// Steps whose effect is visible outside the execution; a retry must not
+// repeat them and they keep their definition order
+export function hasSideEffects(step: WorkflowStep): boolean {
+  if (step.type === 'foreach') {
+    const inner = (step.config as ForEachConfig).step;
+    return hasSideEffects({ ...step, type: inner.type, config: inner.config } as WorkflowStep);
+  }
+  if (step.type === 'send_email') {
+    return true;
+  }
+  if (step.type === 'http_request') {
+    return (step.config as HttpRequestConfig).method !== 'GET';
+  }
+  return false;
+}
+
+// Steps of the branch a conditional did not take. A step listed in both
+// branches always runs.
+export function getUntakenBranch(config: ConditionalConfig, result: boolean): string[] {
+  const taken = new Set(result ? config.trueBranch : config.falseBranch || []);
+  const untaken = result ? config.falseBranch || [] : config.trueBranch;
+  return untaken.filter(id => !taken.has(id));
+}
+
+// Steps a finished step rules out: the untaken branch of a conditional
+export function stepsToSkip(step: WorkflowStep, result: any): string[] {
+  if (step.type !== 'conditional' || !result) {
+    return [];
+  }
+  return getUntakenBranch(step.config as ConditionalConfig, !!result.result);
+}
+
+export function buildStepGraph(steps: WorkflowStep[]): StepGraph {
+  const stepMap = new Map<string, WorkflowStep>();
+  const position = new Map<string, number>();
+  const dataDependencies = new Map<string, Set<string>>();
+
+  for (const [index, step] of steps.entries()) {
+    if (stepMap.has(step.id)) {
+      throw new Error(`Duplicate step id: ${step.id}`);
+    }
+    stepMap.set(step.id, step);
+    position.set(step.id, index);
+    dataDependencies.set(step.id, new Set());
+  }
+
+  const sequential = !steps.some(step => step.dependsOn !== undefined);
+
+  for (const step of steps) {
+    const deps = dataDependencies.get(step.id)!;
+
+    for (const dep of step.dependsOn || []) {
+      if (!stepMap.has(dep)) {
+        throw new Error(`Step ${step.id} depends on unknown step: ${dep}`);
+      }
+      deps.add(dep);
+    }
+
+    // Implicit edges: any template or expression that reads another step's
+    // output. In definition order a later step has not run yet, so a
+    // reference to it reads nothing and adds no edge.
+    const refs = new Set<string>();
+    collectTemplateRefs(step.config, refs);
+    const expression = getStepExpression(step);
+    if (expression) {
+      for (const ref of compileExpression(expression).refs) {
+        refs.add(ref);
+      }
+    }
+    for (const ref of refs) {
+      if (ref === step.id || !stepMap.has(ref)) continue;
+      if (sequential && position.get(ref)! > position.get(step.id)!) continue;
+      deps.add(ref);
+    }
+  }
+
+  // Branch steps wait for their conditional, which decides whether they run
+  for (const step of steps) {
+    if (step.type !== 'conditional') continue;
+    const config = step.config as ConditionalConfig;
+    for (const branchStep of [...config.trueBranch, ...(config.falseBranch || [])]) {
+      if (!stepMap.has(branchStep)) {
+        throw new Error(`Conditional ${step.id} branches to unknown step: ${branchStep}`);
+      }
+      if (branchStep === step.id) {
+        throw new Error(`Conditional ${step.id} cannot branch to itself`);
+      }
+      dataDependencies.get(branchStep)!.add(step.id);
+    }
+  }
+
+  const order = topologicalOrder(steps, position, dataDependencies);
+
+  // Ordering edges follow `order`, so they can never close a cycle
+  const dependencies = new Map<string, Set<string>>();
+  for (const [id, deps] of dataDependencies) {
+    dependencies.set(id, new Set(deps));
+  }
+  if (sequential) {
+    for (let i = 1; i < order.length; i++) {
+      dependencies.get(order[i])!.add(order[i - 1]);
+    }
+  } else {
+    let lastSideEffect: string | null = null;
+    for (const [index, id] of order.entries()) {
+      const step = stepMap.get(id)!;
+      if (step.type === 'delay') {
+        for (const before of order.slice(0, index)) dependencies.get(id)!.add(before);
+        for (const after of order.slice(index + 1)) dependencies.get(after)!.add(id);
+      }
+      if (hasSideEffects(step)) {
+        if (lastSideEffect) dependencies.get(id)!.add(lastSideEffect);
+        lastSideEffect = id;
+      }
+    }
+  }
+
+  const dependents = new Map<string, Set<string>>();
+  for (const id of order) {
+    dependents.set(id, new Set());
+  }
+  for (const [id, deps] of dependencies) {
+    for (const dep of deps) {
+      dependents.get(dep)!.add(id);
+    }
+  }
+
+  return { steps: stepMap, dependencies, dataDependencies, dependents, order };
+}
+
+// Kahn's algorithm, always taking the earliest-defined ready step, so steps
+// whose dependencies all come earlier keep exactly their definition order
+function topologicalOrder(
+  steps: WorkflowStep[],
+  position: Map<string, number>,
+  dependencies: Map<string, Set<string>>
+): string[] {
+  const remaining = new Map<string, number>();
+  const dependents = new Map<string, string[]>();
+  for (const step of steps) {
+    remaining.set(step.id, dependencies.get(step.id)!.size);
+    dependents.set(step.id, []);
+  }
+  for (const [id, deps] of dependencies) {
+    for (const dep of deps) {
+      dependents.get(dep)!.push(id);
+    }
+  }
+
+  const order: string[] = [];
+  const ready = steps.filter(step => remaining.get(step.id) === 0).map(step => step.id);
+
+  while (ready.length > 0) {
+    let next = 0;
+    for (let i = 1; i < ready.length; i++) {
+      if (position.get(ready[i])! < position.get(ready[next])!) next = i;
+    }
+    const [id] = ready.splice(next, 1);
+    order.push(id);
+    for (const dependent of dependents.get(id)!) {
+      const count = remaining.get(dependent)! - 1;
+      remaining.set(dependent, count);
+      if (count === 0) {
+        ready.push(dependent);
+      }
+    }
+  }
+
+  if (order.length !== steps.length) {
+    const cyclic = steps.filter(step => remaining.get(step.id)! > 0).map(step => step.id);
+    throw new Error(`Workflow steps contain a dependency cycle: ${cyclic.join(', ')}`);
+  }
+
+  return order;
+}
+
+export interface RunStepGraphOptions {
+  concurrency: number;
+  // May resolve with ids of steps to skip (the untaken branch of a conditional)
+  runStep: (step: WorkflowStep) => Promise<string[] | void>;
+  // Steps finished by an earlier run of the same execution; not run again
+  completed?: Set<string>;
+  // Steps already known to be skipped, e.g. from a resumed conditional
+  skipped?: Set<string>;
+}
+
+// Runs every step once all of its dependencies have completed, with at most
+// `concurrency` steps in flight. A step is skipped, without running, when it
+// was marked skipped or every one of its data dependencies was skipped. The first
+// failure stops new steps from being scheduled; in-flight steps are awaited
+// and the failure is rethrown.
+export function runStepGraph(graph: StepGraph, options: RunStepGraphOptions): Promise<void> {
+  const concurrency = Math.max(1, options.concurrency);
+  const completed = options.completed || new Set<string>();
+  const skipped = options.skipped || new Set<string>();
+  const remaining = new Map<string, number>();
+  for (const [id, deps] of graph.dependencies) {
+    let count = 0;
+    for (const dep of deps) {
+      if (!completed.has(dep)) count++;
+    }
+    remaining.set(id, count);
+  }
+
+  const ready = graph.order.filter(id => remaining.get(id) === 0 && !completed.has(id));
+  let running = 0;
+  let failed = false;
+  let failure: unknown;
+
+  return new Promise((resolve, reject) => {
+    const settle = () => {
+      if (failed) {
+        reject(failure);
+      } else {
+        resolve();
+      }
+    };
+
+    const release = (id: string) => {
+      for (const dependent of graph.dependents.get(id)!) {
+        const count = remaining.get(dependent)! - 1;
+        remaining.set(dependent, count);
+        if (count === 0) {
+          ready.push(dependent);
+        }
+      }
+    };
+
+    const shouldSkip = (id: string) => {
+      if (skipped.has(id)) {
+        return true;
+      }
+      const deps = graph.dataDependencies.get(id)!;
+      return deps.size > 0 && [...deps].every(dep => skipped.has(dep));
+    };
+
+    const launch = () => {
+      while (!failed && running < concurrency && ready.length > 0) {
+        const id = ready.shift()!;
+
+        if (shouldSkip(id)) {
+          skipped.add(id);
+          release(id);
+          continue;
+        }
+
+        running++;
+
+        options.runStep(graph.steps.get(id)!)
+          .then(
+            (skip) => {
+              for (const skippedId of skip || []) {
+                skipped.add(skippedId);
+              }
+              release(id);
+            },
+            (error) => {
+              if (!failed) {
+                failed = true;
+                failure = error;
+              }
+            }
+          )
+          .finally(() => {
+            running--;
+            launch();
+          });
+      }
+
+      if (running === 0 && (failed || ready.length === 0)) {
+        settle();
+      }
+    };
+
+    launch();
+  });
+}
@@ -0,0 +1,47 @@
+import type { DelayConfig } from '../types/index.js';
+
+// Delay steps. Steps after a delay depend on it (see dag.ts), so a delay
+// that suspends the execution holds them back until it is continued.
+
+// Delays up to this long run inline; longer ones suspend the execution
+const DELAY_INLINE_MAX_MS = parseInt(process.env.DELAY_INLINE_MAX_MS || '5000');
+
+// Thrown by a step that cannot finish in this run; the execution is
+// persisted and continued by a delayed job at `resumeAt`
+export class ExecutionSuspended extends Error {
+  resumeAt: number;
+
+  constructor(resumeAt: number) {
+    super(`Execution suspended until ${new Date(resumeAt).toISOString()}`);
+    this.resumeAt = resumeAt;
+  }
+}
+
+export function delayToMs(config: DelayConfig): number {
+  const multipliers: Record<string, number> = {
+    seconds: 1000,
+    minutes: 60 * 1000,
+    hours: 60 * 60 * 1000,
+    days: 24 * 60 * 60 * 1000,
+  };
+  return config.duration * multipliers[config.unit];
+}
+
+// Short delays are waited out in place; longer ones suspend the execution
+// so the worker slot is released. `resumeAt` is set when continuing a delay
+// started by an earlier run.
+export async function executeDelay(config: DelayConfig, resumeAt?: number): Promise<any> {
+  const delayMs = delayToMs(config);
+  const until = resumeAt ?? Date.now() + delayMs;
+  const remainingMs = until - Date.now();
+
+  if (remainingMs > DELAY_INLINE_MAX_MS) {
+    throw new ExecutionSuspended(until);
+  }
+
+  if (remainingMs > 0) {
+    await new Promise(resolve => setTimeout(resolve, remainingMs));
+  }
+
+  return { delayed: delayMs };
+}
@@ -0,0 +1,337 @@
+import { Queue, Worker, Job, UnrecoverableError } from 'bullmq';
+import sgMail from '@sendgrid/mail';
+import dotenv from 'dotenv';
+import { query } from '../db/index.js';
+import { redis, createRedisConnection } from '../lib/redis.js';
+import { registerMetricsSource } from '../lib/metrics.js';
+
+dotenv.config();
+
+sgMail.setApiKey(process.env.SENDGRID_API_KEY || '');
+
+// Point at a local stand-in (benchmarks, development) instead of SendGrid
+if (process.env.SENDGRID_API_BASE_URL) {
+  const { client } = sgMail as unknown as { client: { setDefaultRequest(key: string, value: string): void } };
+  client.setDefaultRequest('baseUrl', process.env.SENDGRID_API_BASE_URL);
+}
+
+// Email delivery for send_email steps. Steps enqueue a durable email job and
+// move on; the email worker coalesces concurrent jobs with the same sender
+// and content into one SendGrid request with a personalization per email,
+// behind a rate limit shared through Redis by every worker process. Failed batches fail their jobs, which BullMQ
+// retries with backoff (where they coalesce again); an email SendGrid
+// rejects outright (4xx other than 429) fails without retries.
+//
+// A send_email step therefore completes once its email is queued. The
+// delivery outcome is written to the step's output afterwards, as
+// `delivery: { status: 'sent' | 'failed', ... }`; foreach items that fail
+// to deliver are appended to the foreach step's `failedDeliveries`.
+
+// SendGrid accepts at most 1000 personalizations and 1000 recipients per request
+const MAX_PERSONALIZATIONS = 1000;
+const MAX_RECIPIENTS = 1000;
+const BATCH_WINDOW_MS = parseInt(process.env.EMAIL_BATCH_WINDOW_MS || '100');
+// SendGrid requests per second across all workers together
+const RATE_LIMIT_PER_SEC = parseInt(process.env.EMAIL_RATE_LIMIT_PER_SEC || '10');
+const RATE_KEY_PREFIX = 'email-rate:';
+// Epoch ms until which nobody sends, after SendGrid answered 429
+const PAUSE_KEY = 'email-rate:paused-until';
+const WORKER_CONCURRENCY = parseInt(process.env.EMAIL_WORKER_CONCURRENCY || '500');
+const MAX_ATTEMPTS = parseInt(process.env.EMAIL_MAX_ATTEMPTS || '5');
+
+export interface EmailMessage {
+  from: string;
+  to: string[];
+  cc?: string[];
+  bcc?: string[];
+  subject: string;
+  text?: string;
+  html?: string;
+}
+
+// The step a queued email was sent from, for recording its delivery
+export interface EmailSource {
+  executionId: string;
+  stepId: string;
+  // Set for foreach items
+  index?: number;
+}
+
+export interface EmailJobData extends EmailMessage {
+  source?: EmailSource;
+}
+
+export interface EmailResult {
+  messageId?: string;
+  batchSize: number;
+}
+
+const stats = {
+  queued: 0,
+  requests: 0,
+  sent: 0,
+  failed: 0,
+  rejected: 0,
+  rateLimited: 0,
+  throttledMs: 0,
+};
+
+// Rate limit shared by every process sending to SendGrid: requests are
+// counted in one-second windows in Redis, so WORKER_PROCESSES children and
+// worker replicas together stay within EMAIL_RATE_LIMIT_PER_SEC
+
+async function takeToken(): Promise<void> {
+  for (;;) {
+    const now = Date.now();
+    const second = Math.floor(now / 1000);
+    const key = `${RATE_KEY_PREFIX}${second}`;
+    const results = await redis.multi().get(PAUSE_KEY).incr(key).pexpire(key, 2000).exec();
+    const pausedUntil = parseInt((results?.[0]?.[1] as string | null) || '0');
+    const count = (results?.[1]?.[1] as number) || 0;
+
+    if (now >= pausedUntil && count <= RATE_LIMIT_PER_SEC) {
+      return;
+    }
+
+    const waitMs = Math.max(pausedUntil - now, (second + 1) * 1000 - now);
+    stats.throttledMs += waitMs;
+    await new Promise(resolve => setTimeout(resolve, waitMs));
+  }
+}
+
+async function pauseSending(until: number): Promise<void> {
+  try {
+    const current = parseInt((await redis.get(PAUSE_KEY)) || '0');
+    if (until > current) {
+      await redis.set(PAUSE_KEY, String(until), 'PX', until - Date.now());
+    }
+  } catch (error) {
+    console.error('Failed to pause email sending:', error);
+  }
+}
+
+// Coalescing
+
+interface PendingEmail {
+  message: EmailMessage;
+  resolve: (result: EmailResult) => void;
+  reject: (error: Error) => void;
+}
+
+interface PendingBatch {
+  emails: PendingEmail[];
+  recipients: number;
+  timer: NodeJS.Timeout;
+}
+
+const batches = new Map<string, PendingBatch>();
+
+function recipientCount(message: EmailMessage): number {
+  return message.to.length + (message.cc?.length || 0) + (message.bcc?.length || 0);
+}
+
+// Emails can share a request when everything outside the personalization matches
+function batchKey(message: EmailMessage): string {
+  return JSON.stringify([message.from, message.text ?? null, message.html ?? null]);
+}
+
+function toPersonalization(message: EmailMessage): Record<string, any> {
+  const personalization: Record<string, any> = {
+    to: message.to,
+    subject: message.subject,
+  };
+  if (message.cc?.length) personalization.cc = message.cc;
+  if (message.bcc?.length) personalization.bcc = message.bcc;
+  return personalization;
+}
+
+function describeSendGridError(error: any): string {
+  return error.response?.body?.errors?.[0]?.message || error.message;
+}
+
+async function sendRequest(emails: PendingEmail[]): Promise<void> {
+  const { from, text, html } = emails[0].message;
+
+  await takeToken();
+  stats.requests++;
+
+  try {
+    const [response] = await sgMail.send({
+      from,
+      // Each personalization is delivered as its own message
+      personalizations: emails.map(email => toPersonalization(email.message)),
+      subject: emails[0].message.subject,
+      ...(html !== undefined ? { html } : { text: text || '' }),
+    } as any);
+
+    stats.sent += emails.length;
+    const messageId = response?.headers['x-message-id'];
+    for (const email of emails) {
+      email.resolve({ messageId, batchSize: emails.length });
+    }
+  } catch (error: any) {
+    const status = error.code || error.response?.statusCode;
+
+    if (status === 429) {
+      // Stop every batch until SendGrid's window resets
+      stats.rateLimited++;
+      const reset = parseInt(error.response?.headers?.['x-ratelimit-reset'] || '0') * 1000;
+      await pauseSending(reset > Date.now() ? reset : Date.now() + 1000);
+    }
+
+    // A 400 rejects the whole request; resend one by one so only the
+    // invalid email fails
+    if (status === 400 && emails.length > 1) {
+      await Promise.all(emails.map(email => sendRequest([email])));
+      return;
+    }
+
+    console.error('SendGrid API Error:', {
+      message: error.message,
+      code: error.code,
+      response: error.response?.body,
+      batchSize: emails.length,
+    });
+    stats.failed += emails.length;
+    const message = `Email sending failed: ${describeSendGridError(error)}`;
+    // SendGrid rejected the email itself; sending it again cannot succeed
+    const rejected = typeof status === 'number' && status >= 400 && status < 500 && status !== 429;
+    if (rejected) stats.rejected += emails.length;
+    const failure = rejected ? new UnrecoverableError(message) : new Error(message);
+    for (const email of emails) {
+      email.reject(failure);
+    }
+  }
+}
+
+function flushBatch(key: string): void {
+  const batch = batches.get(key);
+  if (!batch) return;
+  batches.delete(key);
+  clearTimeout(batch.timer);
+  void sendRequest(batch.emails);
+}
+
+// Send through the coalescing dispatcher; resolves once SendGrid accepts
+// the request the email ended up in
+export function dispatchEmail(message: EmailMessage): Promise<EmailResult> {
+  return new Promise((resolve, reject) => {
+    const key = batchKey(message);
+    const recipients = recipientCount(message);
+
+    let batch = batches.get(key);
+    if (batch && (batch.emails.length >= MAX_PERSONALIZATIONS || batch.recipients + recipients > MAX_RECIPIENTS)) {
+      flushBatch(key);
+      batch = undefined;
+    }
+    if (!batch) {
+      batch = {
+        emails: [],
+        recipients: 0,
+        timer: setTimeout(() => flushBatch(key), BATCH_WINDOW_MS),
+      };
+      batches.set(key, batch);
+    }
+
+    batch.emails.push({ message, resolve, reject });
+    batch.recipients += recipients;
+  });
+}
+
+// Durable queue in front of the dispatcher
+
+const connection = createRedisConnection();
+
+export const emailQueue = new Queue<EmailJobData>('email-delivery', {
+  connection,
+  defaultJobOptions: {
+    removeOnComplete: 1000,
+    removeOnFail: 500,
+    attempts: MAX_ATTEMPTS,
+    backoff: {
+      type: 'exponential',
+      delay: 5000,
+    },
+  },
+});
+
+// `deliveryKey` makes the enqueue idempotent, so a retried step that
+// already queued its email does not queue it again
+export async function addEmailJob(
+  message: EmailMessage,
+  deliveryKey?: string,
+  source?: EmailSource
+): Promise<Job<EmailJobData>> {
+  stats.queued++;
+  return emailQueue.add('send', { ...message, source }, deliveryKey ? { jobId: deliveryKey } : {});
+}
+
+// Merged into the step's row, which the executor persists before queueing
+// the email; the journal keeps these keys when it rewrites the row's output
+async function recordDelivery(source: EmailSource, delivery: Record<string, any>): Promise<void> {
+  let result;
+  if (source.index === undefined) {
+    result = await query(
+      `UPDATE step_executions
+       SET output_data = COALESCE(output_data, '{}'::jsonb) || jsonb_build_object('delivery', $3::jsonb)
+       WHERE execution_id = $1 AND step_id = $2`,
+      [source.executionId, source.stepId, JSON.stringify(delivery)]
+    );
+  } else if (delivery.status === 'failed') {
+    result = await query(
+      `UPDATE step_executions
+       SET output_data = jsonb_set(
+         COALESCE(output_data, '{}'::jsonb),
+         '{failedDeliveries}',
+         COALESCE(output_data->'failedDeliveries', '[]'::jsonb) || jsonb_build_array($3::jsonb)
+       )
+       WHERE execution_id = $1 AND step_id = $2`,
+      [source.executionId, source.stepId, JSON.stringify({ index: source.index, error: delivery.error })]
+    );
+  }
+  if (result && result.rowCount === 0) {
+    console.warn(
+      `⚠️ No step row for ${source.executionId}/${source.stepId}; email delivery ${delivery.status} not recorded`
+    );
+  }
+}
+
+export function createEmailWorker() {
+  // Jobs mostly wait for their batch, so many run at once to coalesce
+  const worker = new Worker<EmailJobData, EmailResult>(
+    'email-delivery',
+    async (job) => {
+      const { source, ...message } = job.data;
+      return dispatchEmail(message);
+    },
+    {
+      connection: createRedisConnection(),
+      concurrency: WORKER_CONCURRENCY,
+    }
+  );
+
+  worker.on('completed', (job, result) => {
+    if (!job.data.source) return;
+    recordDelivery(job.data.source, { status: 'sent', messageId: result.messageId ?? null }).catch((error) => {
+      console.error(`Failed to record delivery of email job ${job.id}:`, error);
+    });
+  });
+
+  worker.on('failed', (job, err) => {
+    console.error(`❌ Email job ${job?.id} failed (attempt ${job?.attemptsMade}):`, err.message);
+    const final = err instanceof UnrecoverableError || (job && job.attemptsMade >= (job.opts.attempts ?? 1));
+    if (job?.data.source && final) {
+      recordDelivery(job.data.source, { status: 'failed', error: err.message }).catch((error) => {
+        console.error(`Failed to record delivery of email job ${job.id}:`, error);
+      });
+    }
+  });
+
+  return worker;
+}
+
+export function getEmailStats(): Record<string, number> {
+  return { ...stats, pendingBatches: batches.size };
+}
+
+registerMetricsSource('email', getEmailStats);
@@ -5,70 +5,121 @@ import type {
   SendEmailConfig,
   TransformDataConfig,
   DelayConfig,
+  ForEachConfig,
   TriggerType,
+  StepInputReference,
 } from '../types/index.js';
 import {
   getWorkflowById,
   updateExecution,
-  createStepExecution,
-  updateStepExecution,
+  getStepCheckpoints,
+  startAcceptedExecution,
+  upsertStepExecutions,
 } from './workflows.js';
-import sgMail from '@sendgrid/mail';
+import { createExecutionJournal } from './journal.js';
+import { restoreCheckpoints } from './checkpoints.js';
+import { executeDelay, ExecutionSuspended } from './delay.js';
+import {
+  buildStepGraph,
+  runStepGraph,
+  getStepExpression,
+  stepsToSkip,
+  hasSideEffects,
+  type StepGraph,
+} from './dag.js';
+import {
+  compileConfig,
+  getCompiledConfig,
+  getCompiledExpression,
+  getWorkflowVersionKey,
+  type CompiledConfig,
+} from './templates.js';
+import { httpAgent, readBodyWithLimit, MAX_RESPONSE_BYTES } from '../lib/http.js';
+import {
+  compileExpression,
+  evaluateExpression,
+  isTruthy,
+  type CompiledExpression,
+} from '../lib/expression.js';
+import { runTransform } from '../lib/transformPool.js';
+import { redis } from '../lib/redis.js';
+import { toIndexRanges } from '../lib/indexRanges.js';
+import { isBlobHandle, readBlobBody } from '../lib/blobStore.js';
+import {
+  httpCacheKey,
+  getCachedResponse,
+  storeCachedResponse,
+  freshnessLifetime,
+  isFresh,
+  recordCacheHit,
+  recordCacheMiss,
+  recordCacheRevalidation,
+  type CachedResponse,
+} from '../lib/httpCache.js';
+import { STATUS_CODES } from 'node:http';
+import { request } from 'undici';
+import { addEmailJob, type EmailMessage, type EmailSource } from './email.js';
 import dotenv from 'dotenv';
 
 dotenv.config();
 
-sgMail.setApiKey(process.env.SENDGRID_API_KEY || '');
-
-// Template engine for variable substitution
-function resolveTemplate(template: string, context: Record<string, any>): string {
-  return template.replace(/\{\{([^}]+)\}\}/g, (match, path) => {
-    const keys = path.trim().split('.');
-    let value: any = context;
-    
-    for (const key of keys) {
-      if (value === undefined || value === null) {
-        console.log(`❌ Template resolution failed at key "${key}". Available keys:`, Object.keys(value || {}));
-        return match; // Keep original if path not found
+// Max number of independent steps run concurrently within one execution
+const STEP_CONCURRENCY = parseInt(process.env.STEP_CONCURRENCY || '4');
+// Upper bound on the array a single foreach step may iterate
+const FOREACH_MAX_ITEMS = parseInt(process.env.FOREACH_MAX_ITEMS || '10000');
+const FOREACH_RESULTS_PREFIX = 'foreach-results:';
+// How long checkpointed item results are kept for a retry to pick up
+const FOREACH_RESULTS_TTL_MS = 24 * 60 * 60 * 1000;
+
+// Copy only the given dotted paths out of a parsed JSON value
+function pickPaths(value: any, paths: string[]): any {
+  if (typeof value !== 'object' || value === null) {
+    return value;
+  }
+
+  const picked: any = Array.isArray(value) ? [] : {};
+  for (const path of paths) {
+    const keys = path.split('.');
+    let source = value;
+    let target = picked;
+
+    for (let i = 0; i < keys.length; i++) {
+      const key = keys[i];
+      if (typeof source !== 'object' || source === null || !(key in source)) {
+        break;
       }
-      value = value[key];
-    }
-    
-    if (typeof value === 'object') {
-      return JSON.stringify(value);
+      const next = source[key];
+      if (i === keys.length - 1 || typeof next !== 'object' || next === null) {
+        target[key] = next;
+        break;
+      }
+      if (typeof target[key] !== 'object' || target[key] === null) {
+        target[key] = Array.isArray(next) ? [] : {};
+      }
+      source = next;
+      target = target[key];
     }
-    
-    return value !== undefined ? String(value) : match;
-  });
+  }
+  return picked;
 }
 
-function resolveConfigTemplates(config: any, context: Record<string, any>): any {
-  if (typeof config === 'string') {
-    return resolveTemplate(config, context);
-  }
-  
-  if (Array.isArray(config)) {
-    return config.map(item => resolveConfigTemplates(item, context));
-  }
-  
-  if (typeof config === 'object' && config !== null) {
-    const resolved: Record<string, any> = {};
-    for (const [key, value] of Object.entries(config)) {
-      resolved[key] = resolveConfigTemplates(value, context);
-    }
-    return resolved;
-  }
-  
-  return config;
+function toStepResponse(
+  response: Pick<CachedResponse, 'status' | 'statusText' | 'headers' | 'body'>,
+  select?: string[]
+): any {
+  return {
+    status: response.status,
+    statusText: response.statusText,
+    headers: response.headers,
+    body: select ? pickPaths(response.body, select) : response.body,
+  };
 }
 
 // Step executors
 async function executeHttpRequest(
-  config: HttpRequestConfig,
-  context: Record<string, any>
+  resolvedConfig: HttpRequestConfig,
+  select?: string[]
 ): Promise<any> {
-  const resolvedConfig = resolveConfigTemplates(config, context) as HttpRequestConfig;
-  
   const headers: Record<string, string> = {
     'Content-Type': 'application/json',
     ...resolvedConfig.headers,
@@ -93,22 +144,44 @@ async function executeHttpRequest(
     }
   }
 
-  const fetchOptions: RequestInit = {
-    method: resolvedConfig.method,
-    headers,
-  };
-
+  let body: string | undefined;
   if (['POST', 'PUT', 'PATCH'].includes(resolvedConfig.method) && resolvedConfig.body) {
-    fetchOptions.body = typeof resolvedConfig.body === 'string' 
+    body = typeof resolvedConfig.body === 'string' 
       ? resolvedConfig.body 
       : JSON.stringify(resolvedConfig.body);
   }
 
+  // Opt-in shared cache for GET requests
+  const cacheKey = resolvedConfig.method === 'GET' && resolvedConfig.cacheTtl !== undefined
+    ? httpCacheKey(resolvedConfig.url, headers)
+    : null;
+  const cached = cacheKey ? await getCachedResponse(cacheKey) : null;
+
+  if (cached) {
+    if (isFresh(cached)) {
+      recordCacheHit();
+      console.log(`♻️ Serving ${resolvedConfig.url} from cache`);
+      return toStepResponse(cached, select);
+    }
+    if (cached.etag) {
+      headers['If-None-Match'] = cached.etag;
+    }
+    if (cached.lastModified) {
+      headers['If-Modified-Since'] = cached.lastModified;
+    }
+  }
+
   console.log(`🌐 Making ${resolvedConfig.method} request to: ${resolvedConfig.url}`);
   
   let response;
   try {
-    response = await fetch(resolvedConfig.url, fetchOptions);
+    response = await request(resolvedConfig.url, {
+      method: resolvedConfig.method,
+      headers,
+      body,
+      dispatcher: httpAgent,
+      maxRedirections: 5,
+    });
   } catch (error: any) {
     console.error(`❌ HTTP Request failed:`, {
       url: resolvedConfig.url,
@@ -119,31 +192,84 @@ async function executeHttpRequest(
     throw error;
   }
   
-  let responseBody: any;
-  const contentType = response.headers.get('content-type');
-  
-  if (contentType?.includes('application/json')) {
-    responseBody = await response.json();
-  } else {
-    responseBody = await response.text();
+  const responseHeaders: Record<string, string> = {};
+  for (const [name, value] of Object.entries(response.headers)) {
+    if (value !== undefined) {
+      responseHeaders[name] = Array.isArray(value) ? value.join(', ') : value;
+    }
+  }
+
+  // Conditional revalidation succeeded: reuse the cached body
+  if (cacheKey && cached && response.statusCode === 304) {
+    await response.body.dump();
+    recordCacheRevalidation();
+    const lifetime = freshnessLifetime(responseHeaders, resolvedConfig.cacheTtl!);
+    const refreshed = { ...cached, expiresAt: Date.now() + (lifetime ?? 0) };
+    // The origin may have made the resource uncacheable since it was stored
+    if (lifetime !== null) {
+      await storeCachedResponse(cacheKey, refreshed);
+    }
+    console.log(`♻️ Revalidated cached response for ${resolvedConfig.url}`);
+    return toStepResponse(refreshed, select);
   }
 
-  console.log(`✅ Response received: ${response.status} ${response.statusText}`);
+  if (cacheKey) {
+    recordCacheMiss();
+  }
 
-  return {
-    status: response.status,
-    statusText: response.statusText,
-    headers: Object.fromEntries(response.headers.entries()),
-    body: responseBody,
-  };
+  const contentType = responseHeaders['content-type'];
+  const read = await readBodyWithLimit(response.body, {
+    // A step can only lower the process-wide budget
+    maxBytes: Math.min(resolvedConfig.response?.maxBytes ?? MAX_RESPONSE_BYTES, MAX_RESPONSE_BYTES),
+    // Opt-in: the handle is kept in place of the body, and steps that read
+    // the body load it from the blob store
+    spillToBlob: resolvedConfig.response?.spillToBlob ?? false,
+    contentType,
+  });
+
+  const statusText = STATUS_CODES[response.statusCode] || '';
+  console.log(`✅ Response received: ${response.statusCode} ${statusText}`);
+
+  if ('blob' in read) {
+    // Oversized bodies are kept out of the context and output_data
+    console.log(`📦 Response body (${read.blob.size} bytes) stored as blob ${read.blob.$blob}`);
+    return {
+      status: response.statusCode,
+      statusText,
+      headers: responseHeaders,
+      body: read.blob,
+    };
+  }
+
+  const text = read.buffer.toString('utf8');
+  const responseBody = contentType?.includes('application/json') ? JSON.parse(text) : text;
+
+  if (cacheKey && response.statusCode === 200) {
+    const lifetime = freshnessLifetime(responseHeaders, resolvedConfig.cacheTtl!);
+    if (lifetime !== null) {
+      await storeCachedResponse(cacheKey, {
+        status: response.statusCode,
+        statusText,
+        headers: responseHeaders,
+        body: responseBody,
+        expiresAt: Date.now() + lifetime,
+        etag: responseHeaders['etag'],
+        lastModified: responseHeaders['last-modified'],
+      });
+    }
+  }
+
+  return toStepResponse(
+    { status: response.statusCode, statusText, headers: responseHeaders, body: responseBody },
+    select
+  );
 }
 
 async function executeSendEmail(
-  config: SendEmailConfig,
-  context: Record<string, any>
+  resolvedConfig: SendEmailConfig,
+  deliveryKey?: string,
+  source?: EmailSource
 ): Promise<any> {
-  const resolvedConfig = resolveConfigTemplates(config, context) as SendEmailConfig;
-
   // Prepare recipients
   const to = Array.isArray(resolvedConfig.to) ? resolvedConfig.to : [resolvedConfig.to];
   const cc = resolvedConfig.cc 
@@ -156,104 +282,473 @@ async function executeSendEmail(
   // Ensure subject exists
   const subject = resolvedConfig.subject?.trim() || 'No Subject';
 
-  // Send email using SendGrid
-  const emailOptions: any = {
+  const message: EmailMessage = {
     from: process.env.EMAIL_FROM || 'noreply@yourdomain.com',
     to,
     subject,
   };
 
   if (cc && cc.length > 0) {
-    emailOptions.cc = cc;
+    message.cc = cc;
   }
 
   if (bcc && bcc.length > 0) {
-    emailOptions.bcc = bcc;
+    message.bcc = bcc;
   }
 
   if (resolvedConfig.isHtml) {
-    emailOptions.html = resolvedConfig.body;
+    message.html = resolvedConfig.body;
   } else {
-    emailOptions.text = resolvedConfig.body;
+    message.text = resolvedConfig.body;
   }
 
-  try {
-    const result = await sgMail.send(emailOptions);
-    return {
-      messageId: result[0]?.headers['x-message-id'],
-      success: true,
-    };
-  } catch (error: any) {
-    console.error('SendGrid API Error:', {
-      message: error.message,
-      code: error.code,
-      response: error.response?.body,
-    });
-    throw new Error(`Email sending failed: ${error.response?.body?.errors?.[0]?.message || error.message}`);
-  }
+  // Delivery (batching, rate limiting, retries) happens on the email queue,
+  // so the step does not hold a worker slot while SendGrid is slow. The step
+  // succeeds once the email is queued; the outcome is added to its output
+  // as `delivery` later (see services/email.ts)
+  const job = await addEmailJob(message, deliveryKey, source);
+  return {
+    emailJobId: job.id,
+    queued: true,
+  };
 }
 
-async function executeTransformData(
-  config: TransformDataConfig,
-  context: Record<string, any>
-): Promise<any> {
-  const resolvedConfig = resolveConfigTemplates(config, context) as TransformDataConfig;
-  
-  // Simple expression evaluation using template resolution
+async function executeTransformData(resolvedConfig: TransformDataConfig): Promise<any> {
+  // The expression has already been through template resolution
   // For more complex transformations, you could use a proper expression library
-  const result = resolveTemplate(resolvedConfig.expression, context);
-  
   try {
     // Try to parse as JSON if it looks like JSON
-    return JSON.parse(result);
+    return JSON.parse(resolvedConfig.expression);
   } catch {
-    return result;
+    return resolvedConfig.expression;
   }
 }
 
-async function executeDelay(config: DelayConfig): Promise<any> {
-  const multipliers: Record<string, number> = {
-    seconds: 1000,
-    minutes: 60 * 1000,
-    hours: 60 * 60 * 1000,
-    days: 24 * 60 * 60 * 1000,
+// Expressions run on the transform pool so large map/filter/aggregate work
+// does not stall other executions; only the context entries the expression
+// reads are copied to the thread.
+async function executeTransformExpression(
+  expression: string,
+  { refs }: CompiledExpression,
+  context: Record<string, any>
+): Promise<any> {
+  const input: Record<string, any> = {};
+  for (const ref of refs) {
+    if (ref in context) {
+      input[ref] = context[ref];
+    }
+  }
+  return runTransform(expression, input);
+}
+
+// Simple expressions (paths, comparisons, arithmetic) are evaluated in
+// place; anything with calls, lambdas or filters goes to the transform pool
+// and its time and memory limits, like transform_data
+function evaluateStepExpression(
+  expression: string,
+  compiled: CompiledExpression,
+  context: Record<string, any>
+): Promise<any> {
+  if (compiled.simple) {
+    return Promise.resolve().then(() => evaluateExpression(compiled.ast, context));
+  }
+  return executeTransformExpression(expression, compiled, context);
+}
+
+async function executeConditional(
+  expression: string,
+  compiled: CompiledExpression,
+  context: Record<string, any>
+): Promise<any> {
+  const result = isTruthy(await evaluateStepExpression(expression, compiled, context));
+  return { result, branch: result ? 'true' : 'false' };
+}
+
+// Per-item outputs are kept small: HTTP results drop their headers
+function compactItemResult(type: string, result: any): any {
+  if (type === 'http_request' && typeof result === 'object' && result !== null && 'status' in result) {
+    return { status: result.status, body: result.body };
+  }
+  return result;
+}
+
+// Results of foreach items finished before a checkpoint, appended chunk by
+// chunk to a Redis hash (index → JSON) so a resumed step can return them;
+// the step row itself only records which indexes are done
+function foreachResultsKey(executionId: string, stepId: string): string {
+  return `${FOREACH_RESULTS_PREFIX}${executionId}:${stepId}`;
+}
+
+async function saveForeachResults(key: string, entries: [number, any][]): Promise<void> {
+  if (entries.length === 0) return;
+  const fields: Record<string, string> = {};
+  for (const [index, result] of entries) {
+    fields[index] = JSON.stringify(result ?? null);
+  }
+  await redis.multi().hset(key, fields).pexpire(key, FOREACH_RESULTS_TTL_MS).exec();
+}
+
+async function loadForeachResults(key: string): Promise<Map<number, any>> {
+  const fields = await redis.hgetall(key);
+  return new Map(Object.entries(fields).map(([index, raw]) => [Number(index), JSON.parse(raw)]));
+}
+
+// Runs the inner step once per item, `parallelism` at a time, scheduling
+// `chunkSize` items at a time so large arrays never queue thousands of
+// pending calls. Failed items are retried with exponential backoff. When
+// items have side effects, the indexes done so far are checkpointed after
+// each chunk and on failure, and a retried job skips them.
+async function executeForEach(
+  step: WorkflowStep,
+  context: Record<string, any>,
+  scope: StepScope
+): Promise<any> {
+  const config = step.config as ForEachConfig;
+  const items = await evaluateStepExpression(getStepExpression(step)!, compiledStepExpression(step, scope)!, context);
+
+  if (!Array.isArray(items)) {
+    throw new Error(`foreach items must evaluate to an array, got ${items === undefined ? 'nothing' : typeof items}`);
+  }
+  if (items.length > FOREACH_MAX_ITEMS) {
+    throw new Error(`foreach has ${items.length} items, more than the limit of ${FOREACH_MAX_ITEMS}`);
+  }
+
+  const parallelism = config.parallelism ?? 5;
+  const chunkSize = config.chunkSize ?? 100;
+  const itemRetries = config.itemRetries ?? 0;
+  const itemRetryDelay = config.itemRetryDelay ?? 1000;
+
+  // Separate id so the item step's compiled config is cached on its own
+  const itemStep = {
+    id: `${step.id}[]`,
+    type: config.step.type,
+    config: config.step.config,
+  } as WorkflowStep;
+
+  const results: any[] = new Array(items.length);
+  let failed = 0;
+  let failure: Error | null = null;
+
+  // Indexes of items that succeeded, including in earlier runs, and those
+  // not yet checkpointed. Each checkpoint writes the new results once and
+  // the done indexes as ranges, so its size does not grow with the step.
+  const done = new Set(scope.foreachDone?.get(step.id));
+  let unsaved: number[] = [];
+  const checkpointed = hasSideEffects(step) && scope.saveProgress && scope.executionId;
+  const resultsKey = checkpointed ? foreachResultsKey(scope.executionId!, step.id) : null;
+
+  if (resultsKey && done.size > 0) {
+    // Items from earlier runs whose results expired report null
+    const earlier = await loadForeachResults(resultsKey);
+    for (const index of done) {
+      results[index] = earlier.get(index) ?? null;
+    }
+  }
+
+  const saveProgress = resultsKey
+    ? async () => {
+      const fresh = unsaved;
+      unsaved = [];
+      try {
+        await saveForeachResults(resultsKey, fresh.map((index) => [index, results[index]]));
+        await scope.saveProgress!({ completedItems: toIndexRanges(done) });
+      } catch (error) {
+        unsaved = fresh.concat(unsaved);
+        throw error;
+      }
+    }
+    : null;
+
+  const runItem = async (index: number) => {
+    if (done.has(index)) {
+      return;
+    }
+    const itemContext = { ...context, item: items[index], index };
+
+    for (let attempt = 0; ; attempt++) {
+      try {
+        results[index] = compactItemResult(itemStep.type, await executeStep(itemStep, itemContext, scope));
+        done.add(index);
+        unsaved.push(index);
+        return;
+      } catch (error) {
+        if (attempt < itemRetries) {
+          await new Promise(resolve => setTimeout(resolve, itemRetryDelay * 2 ** attempt));
+          continue;
+        }
+
+        const message = error instanceof Error ? error.message : String(error);
+        if (!config.continueOnError) {
+          throw new Error(`Item ${index} failed: ${message}`);
+        }
+        failed++;
+        results[index] = { error: message };
+        return;
+      }
+    }
   };
 
-  const delayMs = config.duration * multipliers[config.unit];
-  
-  // Cap delay at 5 minutes for safety
-  const cappedDelay = Math.min(delayMs, 5 * 60 * 1000);
-  
-  await new Promise(resolve => setTimeout(resolve, cappedDelay));
-  
-  return { delayed: cappedDelay };
+  for (let start = 0; start < items.length && !failure; start += chunkSize) {
+    const end = Math.min(start + chunkSize, items.length);
+    let next = start;
+
+    const lanes = Array.from({ length: Math.min(parallelism, end - start) }, async () => {
+      while (!failure && next < end) {
+        try {
+          await runItem(next++);
+        } catch (error) {
+          failure = failure || (error as Error);
+        }
+      }
+    });
+    await Promise.all(lanes);
+    if (!failure) {
+      await saveProgress?.();
+    }
+  }
+
+  if (failure) {
+    // Best effort; the step error is what the caller needs to see
+    await saveProgress?.().catch((error) => console.error('foreach checkpoint failed:', error));
+    throw failure;
+  }
+
+  if (resultsKey) {
+    // The step's output now carries every result
+    redis.unlink(resultsKey).catch(() => {});
+  }
+
+  return {
+    count: items.length,
+    succeeded: items.length - failed,
+    failed,
+    results,
+  };
+}
+
+// What a step can see of the workflow it runs in
+interface StepScope {
+  steps: WorkflowStep[];
+  // Workflow version used to cache compiled templates; absent for dry runs
+  versionKey?: string;
+  // Resume times of delays suspended by an earlier run, by step id
+  waitingUntil?: Map<string, number>;
+  // Execution the steps belong to; absent for dry runs
+  executionId?: string;
+  // Indexes of foreach items that succeeded in an earlier run, by step id
+  foreachDone?: Map<string, Set<number>>;
+  // Durably records partial output of the running step
+  saveProgress?: (outputData: any) => Promise<void>;
+}
+
+function compiledStepConfig(step: WorkflowStep, scope: StepScope): CompiledConfig {
+  return scope.versionKey
+    ? getCompiledConfig(scope.versionKey, step.id, step.config)
+    : compileConfig(step.config);
+}
+
+function compiledStepExpression(step: WorkflowStep, scope: StepScope): CompiledExpression | null {
+  const expression = getStepExpression(step);
+  if (!expression) {
+    return null;
+  }
+  return scope.versionKey
+    ? getCompiledExpression(scope.versionKey, step.id, expression)
+    : compileExpression(expression);
+}
+
+function renderStepConfig(step: WorkflowStep, context: Record<string, any>, scope: StepScope): any {
+  return compiledStepConfig(step, scope).render(context);
+}
+
+// Context paths a step reads: its template placeholders, plus the context
+// entries used by an expression-language step
+function stepReadPaths(step: WorkflowStep, scope: StepScope): string[] {
+  const { paths } = compiledStepConfig(step, scope);
+  const expression = compiledStepExpression(step, scope);
+  return expression ? [...paths, ...expression.refs] : paths;
+}
+
+// Describe what a step reads from the context instead of copying it
+function describeStepInput(
+  step: WorkflowStep,
+  context: Record<string, any>,
+  scope: StepScope
+): StepInputReference {
+  const paths = stepReadPaths(step, scope);
+  const refs = new Set<string>();
+  for (const path of paths) {
+    const root = path.split('.')[0];
+    if (root in context) {
+      refs.add(root);
+    }
+  }
+  return { refs: [...refs], paths };
+}
+
+// Copy of a trigger payload or step response whose spilled body is loaded
+// from the blob store; each blob is read once per execution
+async function withBodyLoaded(holder: any, loaded: Map<string, Promise<any>>): Promise<any> {
+  if (!isBlobHandle(holder?.body)) {
+    return holder;
+  }
+  const handle = holder.body;
+  if (!loaded.has(handle.$blob)) {
+    loaded.set(handle.$blob, readBlobBody(handle));
+  }
+  return { ...holder, body: await loaded.get(handle.$blob) };
+}
+
+// Context for a step with the spilled bodies it reads loaded. The shared
+// context keeps the handles, so other steps and output_data are unaffected.
+async function withBlobBodies(
+  refs: string[],
+  context: Record<string, any>,
+  loaded: Map<string, Promise<any>>
+): Promise<Record<string, any>> {
+  let stepContext = context;
+  for (const ref of refs) {
+    const entry = context[ref];
+    let resolved = entry;
+    if (ref === 'trigger') {
+      // Batched webhook triggers carry an array of payloads
+      const data = Array.isArray(entry.data)
+        ? await Promise.all(entry.data.map((item: any) => withBodyLoaded(item, loaded)))
+        : await withBodyLoaded(entry.data, loaded);
+      const changed = Array.isArray(data)
+        ? data.some((item, i) => item !== entry.data[i])
+        : data !== entry.data;
+      if (changed) {
+        resolved = { ...entry, data };
+      }
+    } else {
+      const response = await withBodyLoaded(entry?.response, loaded);
+      if (response !== entry?.response) {
+        resolved = { ...entry, response };
+      }
+    }
+    if (resolved !== entry) {
+      if (stepContext === context) {
+        stepContext = { ...context };
+      }
+      stepContext[ref] = resolved;
+    }
+  }
+  return stepContext;
+}
+
+// Body paths of a step's response read by the other steps' templates, or
+// null when some template uses the whole body
+function getReferencedBodyPaths(stepId: string, scope: StepScope): string[] | null {
+  // Per-item steps of a foreach are not in the graph; keep their whole body
+  if (!scope.steps.some(step => step.id === stepId)) {
+    return null;
+  }
+
+  const bodyPrefix = `${stepId}.response.body`;
+  const paths = new Set<string>();
+
+  for (const step of scope.steps) {
+    if (step.id === stepId) continue;
+    for (const path of stepReadPaths(step, scope)) {
+      if (path === stepId || path === `${stepId}.response` || path === bodyPrefix) {
+        return null;
+      }
+      if (path.startsWith(`${bodyPrefix}.`)) {
+        paths.add(path.slice(bodyPrefix.length + 1));
+      }
+    }
+  }
+
+  return [...paths];
+}
+
+// Identifies one email of one execution (per item inside a foreach) so a
+// re-run step does not queue it twice
+function emailDeliveryKey(step: WorkflowStep, context: Record<string, any>, scope: StepScope): string | undefined {
+  if (!scope.executionId) {
+    return undefined;
+  }
+  const parts = [scope.executionId, step.id];
+  if (step.id.endsWith('[]')) {
+    parts.push(String(context.index));
+  }
+  // BullMQ job ids cannot contain ':'
+  return parts.join('.').replace(/:/g, '_');
+}
+
+function emailSource(step: WorkflowStep, context: Record<string, any>, scope: StepScope): EmailSource | undefined {
+  if (!scope.executionId) {
+    return undefined;
+  }
+  // foreach items record against the foreach step's row
+  return step.id.endsWith('[]')
+    ? { executionId: scope.executionId, stepId: step.id.slice(0, -2), index: context.index }
+    : { executionId: scope.executionId, stepId: step.id };
 }
 
 async function executeStep(
   step: WorkflowStep,
-  context: Record<string, any>
+  context: Record<string, any>,
+  scope: StepScope
 ): Promise<any> {
   switch (step.type) {
-    case 'http_request':
-      return executeHttpRequest(step.config as HttpRequestConfig, context);
+    case 'http_request': {
+      const config = renderStepConfig(step, context, scope) as HttpRequestConfig;
+      const select = config.response?.select === 'referenced'
+        ? getReferencedBodyPaths(step.id, scope)
+        : config.response?.select;
+      return executeHttpRequest(config, select || undefined);
+    }
     case 'send_email':
-      return executeSendEmail(step.config as SendEmailConfig, context);
-    case 'transform_data':
-      return executeTransformData(step.config as TransformDataConfig, context);
+      return executeSendEmail(
+        renderStepConfig(step, context, scope) as SendEmailConfig,
+        emailDeliveryKey(step, context, scope),
+        emailSource(step, context, scope)
+      );
+    case 'transform_data': {
+      const expression = compiledStepExpression(step, scope);
+      if (expression) {
+        return executeTransformExpression(getStepExpression(step)!, expression, context);
+      }
+      return executeTransformData(renderStepConfig(step, context, scope) as TransformDataConfig);
+    }
+    case 'conditional':
+      return executeConditional(getStepExpression(step)!, compiledStepExpression(step, scope)!, context);
+    case 'foreach':
+      return executeForEach(step, context, scope);
     case 'delay':
-      return executeDelay(step.config as DelayConfig);
+      return executeDelay(step.config as DelayConfig, scope.waitingUntil?.get(step.id));
     default:
       throw new Error(`Unknown step type: ${step.type}`);
   }
 }
 
+export interface ExecuteWorkflowResult {
+  success: boolean;
+  results: Record<string, any>;
+  // Set when the execution suspended itself; the caller runs it again at
+  // this time (epoch ms) and it continues from its checkpoints
+  resumeAt?: number;
+}
+
+export interface ExecuteWorkflowOptions {
+  // Set when the execution was accepted without a row (async webhook
+  // ingest); the row is created as the execution starts
+  acceptedAt?: Date;
+  // False when the queue will retry a failed run: the row then goes back to
+  // pending with the error, and only the last attempt marks it failed
+  finalAttempt?: boolean;
+}
+
 // Main workflow executor
 export async function executeWorkflow(
   workflowId: string,
   executionId: string,
   triggerType: TriggerType,
-  triggerData?: Record<string, any>
-): Promise<{ success: boolean; results: Record<string, any> }> {
+  triggerData?: Record<string, any>,
+  options: ExecuteWorkflowOptions = {}
+): Promise<ExecuteWorkflowResult> {
   const workflow = await getWorkflowById(workflowId);
   
   if (!workflow) {
@@ -261,13 +756,20 @@ export async function executeWorkflow(
   }
 
   const definition = workflow.workflow_definition as WorkflowDefinition;
-  
-  // Mark execution as running
-  await updateExecution(executionId, {
-    status: 'running',
-    started_at: new Date(),
-  });
 
+  // Earlier runs of this execution leave checkpoints to continue from
+  const checkpoints = await getStepCheckpoints(executionId);
+  const { outputs, completed, skipped, existingRows, waitingUntil, foreachDone } =
+    restoreCheckpoints(definition.steps, checkpoints);
+
+  const scope: StepScope = {
+    steps: definition.steps,
+    versionKey: getWorkflowVersionKey(workflow),
+    waitingUntil,
+    executionId,
+    foreachDone,
+  };
+  
   // Execution context with trigger data and step results
   const context: Record<string, any> = {
     trigger: {
@@ -275,59 +777,131 @@ export async function executeWorkflow(
       data: triggerData || {},
     },
   };
-
   const results: Record<string, any> = {};
+  for (const [stepId, output] of Object.entries(outputs)) {
+    context[stepId] = { response: output };
+    results[stepId] = output;
+  }
+
+  if (checkpoints.length > 0) {
+    console.log(`↩️ Resuming execution ${executionId} with ${completed.size} completed step(s)`);
+  }
+
+  // Mark execution as running
+  if (options.acceptedAt) {
+    await startAcceptedExecution(executionId, workflowId, triggerType, triggerData, options.acceptedAt);
+  } else {
+    await updateExecution(executionId, checkpoints.length > 0
+      ? { status: 'running', completed_at: null, error: null }
+      : { status: 'running', started_at: new Date() });
+  }
+
+  const journal = createExecutionJournal(executionId, upsertStepExecutions);
+  // Spilled bodies read by this run's steps, by blob id
+  const loadedBlobs = new Map<string, Promise<any>>();
   let hasError = false;
   let errorMessage = '';
+  let resumeAt: number | undefined;
 
-  // Execute steps in order
-  for (const step of definition.steps) {
-    const stepExecution = await createStepExecution(
-      executionId,
-      step.id,
-      step.type,
-      { context: { ...context } }
-    );
-
-    await updateStepExecution(stepExecution.id, {
-      status: 'running',
-      started_at: new Date(),
+  // Execute steps as their dependencies complete
+  try {
+    const graph = buildStepGraph(definition.steps);
+
+    await runStepGraph(graph, {
+      concurrency: STEP_CONCURRENCY,
+      completed,
+      // Untaken branches get no step_executions rows and make no calls
+      skipped,
+      runStep: async (step) => {
+        const input = describeStepInput(step, context, scope);
+        const stepExecutionId = journal.stepStarted(step, input, existingRows.get(step.id));
+        // stepStarted clears the row's output; keep items done by earlier runs
+        if (scope.foreachDone!.has(step.id)) {
+          journal.stepProgress(stepExecutionId, { completedItems: toIndexRanges(scope.foreachDone!.get(step.id)!) });
+        }
+
+        // The email worker records delivery on this row, and a retry looks
+        // for it: make it durable before the step has any effect
+        if (hasSideEffects(step)) {
+          await journal.flush();
+        }
+
+        let result: any;
+        try {
+          const stepContext = await withBlobBodies(input.refs, context, loadedBlobs);
+          result = await executeStep(step, stepContext, {
+            ...scope,
+            saveProgress: async (outputData) => {
+              journal.stepProgress(stepExecutionId, outputData);
+              await journal.flush();
+            },
+          });
+
+          // Store result in context for dependent steps
+          context[step.id] = { response: result };
+          results[step.id] = result;
+
+          journal.stepCompleted(stepExecutionId, result);
+        } catch (error) {
+          if (error instanceof ExecutionSuspended) {
+            journal.stepWaiting(stepExecutionId, {
+              resumeAt: new Date(error.resumeAt).toISOString(),
+            });
+            resumeAt = Math.min(resumeAt ?? Infinity, error.resumeAt);
+            // Stop scheduling; in-flight steps finish and are persisted
+            throw error;
+          }
+
+          const errorMsg = error instanceof Error ? error.message : String(error);
+          const errorStack = error instanceof Error ? error.stack : '';
+
+          console.error(`❌ Step execution error:`, {
+            stepId: step.id,
+            stepType: step.type,
+            error: errorMsg,
+            stack: errorStack,
+          });
+
+          journal.stepFailed(stepExecutionId, errorMsg);
+
+          hasError = true;
+          errorMessage = errorMessage || `Step ${step.id} failed: ${errorMsg}`;
+
+          // Stop scheduling further steps on error (could be configurable)
+          throw new Error(`Step ${step.id} failed: ${errorMsg}`);
+        }
+
+        // Make side effects durable before anything depends on them, so a
+        // retry never repeats an email or a non-idempotent request. This
+        // stays outside the step's try: a failed write leaves the record
+        // completed in the journal (close() retries it) and fails the job,
+        // rather than marking a step whose effect already happened as failed.
+        if (hasSideEffects(step)) {
+          await journal.flush();
+        }
+
+        return stepsToSkip(step, result);
+      },
     });
-
-    try {
-      const result = await executeStep(step, context);
-      
-      // Store result in context for subsequent steps
-      context[step.id] = { response: result };
-      results[step.id] = result;
-
-      await updateStepExecution(stepExecution.id, {
-        status: 'completed',
-        output_data: result,
-        completed_at: new Date(),
-      });
-    } catch (error) {
-      const errorMsg = error instanceof Error ? error.message : String(error);
-      const errorStack = error instanceof Error ? error.stack : '';
+  } catch (error) {
+    if (!(error instanceof ExecutionSuspended) && !hasError) {
       hasError = true;
-      errorMessage = `Step ${step.id} failed: ${errorMsg}`;
+      errorMessage = error instanceof Error ? error.message : String(error);
+    }
+  }
 
-      console.error(`❌ Step execution error:`, {
-        stepId: step.id,
-        stepType: step.type,
-        error: errorMsg,
-        stack: errorStack,
-      });
+  // Step state must be durable before the job is acknowledged
+  await journal.close();
 
-      await updateStepExecution(stepExecution.id, {
-        status: 'failed',
-        error: errorMsg,
-        completed_at: new Date(),
-      });
+  if (!hasError && resumeAt !== undefined) {
+    await updateExecution(executionId, { status: 'waiting' });
+    console.log(`⏸️ Execution ${executionId} suspended until ${new Date(resumeAt).toISOString()}`);
+    return { success: true, results, resumeAt };
+  }
 
-      // Stop execution on error (could be configurable)
-      break;
-    }
+  if (hasError && options.finalAttempt === false) {
+    await updateExecution(executionId, { status: 'pending', error: errorMessage });
+    return { success: false, results };
   }
 
   // Update final execution status
@@ -358,32 +932,53 @@ export async function testWorkflow(
   const results: Record<string, any> = {};
   const errors: string[] = [];
 
-  for (const step of definition.steps) {
-    try {
-      // For testing, we simulate some steps instead of actually executing
-      if (step.type === 'send_email') {
-        results[step.id] = {
-          simulated: true,
-          message: 'Email would be sent',
-          config: resolveConfigTemplates(step.config, context),
-        };
-      } else if (step.type === 'delay') {
-        results[step.id] = {
-          simulated: true,
-          message: 'Delay would occur',
-          config: step.config,
-        };
-      } else {
-        const result = await executeStep(step, context);
-        context[step.id] = { response: result };
-        results[step.id] = result;
-      }
-    } catch (error) {
-      const errorMsg = error instanceof Error ? error.message : String(error);
-      errors.push(`Step ${step.id}: ${errorMsg}`);
-    }
+  const scope: StepScope = { steps: definition.steps };
+
+  let graph: StepGraph;
+  try {
+    graph = buildStepGraph(definition.steps);
+  } catch (error) {
+    const errorMsg = error instanceof Error ? error.message : String(error);
+    return { success: false, results, errors: [errorMsg] };
   }
 
+  await runStepGraph(graph, {
+    concurrency: STEP_CONCURRENCY,
+    runStep: async (step) => {
+      try {
+        // For testing, we simulate some steps instead of actually executing
+        if (step.type === 'send_email') {
+          results[step.id] = {
+            simulated: true,
+            message: 'Email would be sent',
+            config: renderStepConfig(step, context, scope),
+          };
+        } else if (step.type === 'foreach' && (step.config as ForEachConfig).step.type === 'send_email') {
+          const items = await evaluateStepExpression(getStepExpression(step)!, compiledStepExpression(step, scope)!, context);
+          results[step.id] = {
+            simulated: true,
+            message: `${Array.isArray(items) ? items.length : 0} emails would be sent`,
+            config: step.config,
+          };
+        } else if (step.type === 'delay') {
+          results[step.id] = {
+            simulated: true,
+            message: 'Delay would occur',
+            config: step.config,
+          };
+        } else {
+          const result = await executeStep(step, context, scope);
+          context[step.id] = { response: result };
+          results[step.id] = result;
+          return stepsToSkip(step, result);
+        }
+      } catch (error) {
+        const errorMsg = error instanceof Error ? error.message : String(error);
+        errors.push(`Step ${step.id}: ${errorMsg}`);
+      }
+    },
+  });
+
   return {
     success: errors.length === 0,
     results,
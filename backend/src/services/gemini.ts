@@ -21,7 +21,7 @@ const SYSTEM_PROMPT = `You are an AI assistant that helps users create workflow
 WORKFLOW STRUCTURE:
 Workflows consist of:
 1. A TRIGGER (what starts the workflow):
-   - "schedule": Run on a cron schedule (e.g., "0 9 * * MON" for every Monday at 9am)
+   - "schedule": Run on a cron schedule (e.g., "0 9 * * MON" for every Monday at 9am). For round times, set "jitterSeconds" (e.g. 60) unless the exact minute matters
    - "webhook": Run when a webhook is received
    - "manual": Run manually by the user
 
@@ -29,6 +29,8 @@ Workflows consist of:
    - "http_request": Make an HTTP API call
    - "send_email": Send an email
    - "transform_data": Transform/manipulate data
+   - "foreach": Run one http_request/send_email/transform_data step per item of an array ({ "items": "step_id.response.body.users", "step": { "type", "config" }, "parallelism": 5 }); the inner config can use {{item.field}} and {{index}}
+   - "conditional": Branch on a condition ({ "condition", "trueBranch": [step ids], "falseBranch": [step ids] }); only the taken branch runs
    - "delay": Wait for a specified time
 
 CONVERSATION GUIDELINES:
@@ -69,6 +71,14 @@ IMPORTANT: HTTP responses are stored as:
 For plain text responses, {{step_id.body}} returns the text directly.
 For JSON responses, body is already parsed - use {{step_id.body.fieldName}}.
 
+TRANSFORM EXPRESSIONS:
+A "transform_data" step with "language": "expression" evaluates its "expression" instead of templating it, and a "conditional" step's "condition" uses the same language:
+- Paths: step_id.response.body.items (a field of an array maps over its elements)
+- Filters: step_id.response.body.items[price > 10]
+- Functions: $sum, $count, $avg, $min, $max, $map, $filter, $sort, $join, $keys, $distinct, $groupBy
+- Lambdas: $map(items, function($i) { $i.qty * $i.price })
+- Operators: + - * / % & (string concat), = != < <= > >=, and, or, not, cond ? a : b
+
 EXAMPLE WORKFLOW:
 For "Send me an email every Monday with weather data":
 \`\`\`workflow
@@ -76,7 +86,8 @@ For "Send me an email every Monday with weather data":
   "trigger": {
     "type": "schedule",
     "cron": "0 9 * * MON",
-    "timezone": "UTC"
+    "timezone": "UTC",
+    "jitterSeconds": 60
   },
   "steps": [
     {
@@ -0,0 +1,145 @@
+import { v4 as uuidv4 } from 'uuid';
+import type { WorkflowStep, StepInputReference } from '../types/index.js';
+import type { StepExecutionRecord } from './workflows.js';
+
+// Write-behind journal for step execution state. Transitions are buffered in
+// memory and written as one multi-row upsert per flush, either on a timer
+// after step boundaries or explicitly via flush()/close(). Each flush hands
+// its batch to `write` (upsertStepExecutions in the executor).
+
+const FLUSH_INTERVAL_MS = parseInt(process.env.JOURNAL_FLUSH_INTERVAL_MS || '250');
+const FLUSH_BATCH_SIZE = parseInt(process.env.JOURNAL_FLUSH_BATCH_SIZE || '50');
+
+export interface ExecutionJournal {
+  // Pass an existing id to continue a step row from an earlier run
+  stepStarted: (
+    step: WorkflowStep,
+    inputData: StepInputReference | null,
+    stepExecutionId?: string
+  ) => string;
+  stepCompleted: (stepExecutionId: string, outputData: any) => void;
+  stepFailed: (stepExecutionId: string, error: string) => void;
+  // Step is suspended (e.g. a delay) and will be continued by a later run
+  stepWaiting: (stepExecutionId: string, outputData: any) => void;
+  // Partial output of a running step (e.g. foreach items done so far)
+  stepProgress: (stepExecutionId: string, outputData: any) => void;
+  flush: () => Promise<void>;
+  // Stops the timer and makes every buffered transition durable
+  close: () => Promise<void>;
+}
+
+export function createExecutionJournal(
+  executionId: string,
+  write: (records: StepExecutionRecord[]) => Promise<void>
+): ExecutionJournal {
+  const records = new Map<string, StepExecutionRecord>();
+  const dirty = new Set<string>();
+  let timer: NodeJS.Timeout | null = null;
+  let pending: Promise<void> = Promise.resolve();
+
+  const writeDirty = async () => {
+    if (dirty.size === 0) {
+      return;
+    }
+
+    const ids = [...dirty];
+    dirty.clear();
+    try {
+      await write(ids.map(id => ({ ...records.get(id)! })));
+    } catch (error) {
+      // Keep the records dirty so the next flush retries them
+      for (const id of ids) {
+        dirty.add(id);
+      }
+      throw error;
+    }
+  };
+
+  const flush = () => {
+    if (timer) {
+      clearTimeout(timer);
+      timer = null;
+    }
+    pending = pending.catch(() => undefined).then(writeDirty);
+    return pending;
+  };
+
+  const scheduleFlush = () => {
+    if (dirty.size >= FLUSH_BATCH_SIZE) {
+      flush().catch(error => console.error('Step journal flush failed:', error));
+      return;
+    }
+    if (!timer) {
+      timer = setTimeout(() => {
+        timer = null;
+        flush().catch(error => console.error('Step journal flush failed:', error));
+      }, FLUSH_INTERVAL_MS);
+    }
+  };
+
+  const update = (stepExecutionId: string, changes: Partial<StepExecutionRecord>) => {
+    const record = records.get(stepExecutionId);
+    if (!record) {
+      throw new Error(`Unknown step execution: ${stepExecutionId}`);
+    }
+    Object.assign(record, changes);
+    dirty.add(stepExecutionId);
+    scheduleFlush();
+  };
+
+  return {
+    stepStarted(step, inputData, stepExecutionId) {
+      const id = stepExecutionId || uuidv4();
+      const now = new Date();
+      records.set(id, {
+        id,
+        execution_id: executionId,
+        step_id: step.id,
+        step_type: step.type,
+        status: 'running',
+        input_data: inputData,
+        output_data: null,
+        error: null,
+        started_at: now,
+        completed_at: null,
+        created_at: now,
+      });
+      dirty.add(id);
+      scheduleFlush();
+      return id;
+    },
+
+    stepCompleted(stepExecutionId, outputData) {
+      update(stepExecutionId, {
+        status: 'completed',
+        output_data: outputData,
+        completed_at: new Date(),
+      });
+    },
+
+    stepFailed(stepExecutionId, error) {
+      update(stepExecutionId, {
+        status: 'failed',
+        error,
+        completed_at: new Date(),
+      });
+    },
+
+    stepWaiting(stepExecutionId, outputData) {
+      update(stepExecutionId, {
+        status: 'waiting',
+        output_data: outputData,
+      });
+    },
+
+    stepProgress(stepExecutionId, outputData) {
+      update(stepExecutionId, { output_data: outputData });
+    },
+
+    flush,
+
+    async close() {
+      await flush();
+    },
+  };
+}
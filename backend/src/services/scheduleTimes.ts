@@ -0,0 +1,23 @@
+import crypto from 'node:crypto';
+import cronParser from 'cron-parser';
+
+// Due times of schedule triggers: cron times in the schedule's time zone,
+// shifted by the workflow's fixed jitter offset.
+
+// Throws on an invalid expression or time zone
+export function computeNextRun(cronExpression: string, timezone: string, after: Date = new Date()): Date {
+  return cronParser.parseExpression(cronExpression, { currentDate: after, tz: timezone }).next().toDate();
+}
+
+// Fixed offset in [0, jitterSeconds) for a workflow
+export function scheduleOffsetMs(workflowId: string, jitterSeconds: number): number {
+  if (jitterSeconds <= 0) return 0;
+  const hash = crypto.createHash('sha256').update(workflowId).digest();
+  return hash.readUInt32BE(0) % (jitterSeconds * 1000);
+}
+
+// Next due time: the next cron time whose offset run is still ahead
+export function computeNextDue(cronExpression: string, timezone: string, offsetMs: number, after: Date): Date {
+  const nominal = computeNextRun(cronExpression, timezone, new Date(after.getTime() - offsetMs));
+  return new Date(nominal.getTime() + offsetMs);
+}
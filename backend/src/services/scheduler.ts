@@ -0,0 +1,224 @@
+import { query, getClient } from '../db/index.js';
+import { scheduledQueue } from '../lib/queue.js';
+import { registerMetricsSource } from '../lib/metrics.js';
+import { computeNextDue, scheduleOffsetMs } from './scheduleTimes.js';
+
+// Cron engine for schedule triggers. Each active schedule is a row in
+// scheduled_jobs; scheduler loops claim due rows with FOR UPDATE SKIP LOCKED,
+// move next_run_at forward and hand the ticks to the scheduled-workflows
+// queue in one addBulk. Any number of replicas can poll the same table; a
+// row is only ever claimed by one of them.
+//
+// Schedules on round times (0 9 * * MON) would all fire in the same instant;
+// a schedule with jitter runs at a fixed offset after each cron time instead,
+// derived from the workflow id so it is stable across edits and replicas.
+
+const POLL_INTERVAL_MS = parseInt(process.env.SCHEDULER_POLL_INTERVAL_MS || '1000');
+const BATCH_SIZE = parseInt(process.env.SCHEDULER_BATCH_SIZE || '500');
+// Jitter window for schedules that do not set jitterSeconds (0: none)
+const DEFAULT_JITTER_SECONDS = parseInt(process.env.SCHEDULER_DEFAULT_JITTER_SECONDS || '0');
+
+interface DueSchedule {
+  id: string;
+  workflow_id: string;
+  cron_expression: string;
+  timezone: string;
+  offset_ms: number;
+  next_run_at: Date;
+}
+
+export interface ScheduledTickData {
+  workflowId: string;
+  // The tick's due time (ISO), not when it was picked up
+  scheduledAt: string;
+}
+
+const stats = {
+  polls: 0,
+  ticks: 0,
+  invalidSchedules: 0,
+  errors: 0,
+};
+
+export async function upsertSchedule(
+  workflowId: string,
+  cronExpression: string,
+  timezone = 'UTC',
+  jitterSeconds = DEFAULT_JITTER_SECONDS
+): Promise<void> {
+  const offsetMs = scheduleOffsetMs(workflowId, jitterSeconds);
+  const nextRunAt = computeNextDue(cronExpression, timezone, offsetMs, new Date());
+  await query(
+    `INSERT INTO scheduled_jobs (workflow_id, cron_expression, timezone, offset_ms, next_run_at, is_active)
+     VALUES ($1, $2, $3, $4, $5, true)
+     ON CONFLICT (workflow_id) DO UPDATE
+     SET cron_expression = EXCLUDED.cron_expression,
+         timezone = EXCLUDED.timezone,
+         offset_ms = EXCLUDED.offset_ms,
+         next_run_at = EXCLUDED.next_run_at,
+         is_active = true,
+         updated_at = NOW()`,
+    [workflowId, cronExpression, timezone, offsetMs, nextRunAt]
+  );
+}
+
+export async function deactivateSchedule(workflowId: string): Promise<void> {
+  await query(
+    'UPDATE scheduled_jobs SET is_active = false, updated_at = NOW() WHERE workflow_id = $1',
+    [workflowId]
+  );
+}
+
+// Claims and dispatches one batch of due schedules; returns how many
+async function pollOnce(): Promise<number> {
+  stats.polls++;
+  const client = await getClient();
+  try {
+    await client.query('BEGIN');
+    const due = await client.query<DueSchedule>(
+      `SELECT id, workflow_id, cron_expression, timezone, offset_ms, next_run_at
+       FROM scheduled_jobs
+       WHERE is_active = true AND next_run_at <= NOW()
+       ORDER BY next_run_at
+       LIMIT $1
+       FOR UPDATE SKIP LOCKED`,
+      [BATCH_SIZE]
+    );
+
+    if (due.rows.length === 0) {
+      await client.query('COMMIT');
+      return 0;
+    }
+
+    const now = new Date();
+    const ids: string[] = [];
+    const nextRuns: (Date | null)[] = [];
+    const ticks: ScheduledTickData[] = [];
+
+    for (const row of due.rows) {
+      ids.push(row.id);
+      try {
+        // A schedule that fell behind (e.g. no scheduler was running) fires
+        // once and then continues from now, instead of replaying every miss
+        nextRuns.push(computeNextDue(row.cron_expression, row.timezone, row.offset_ms, now));
+      } catch (error) {
+        stats.invalidSchedules++;
+        console.error(`❌ Invalid schedule for workflow ${row.workflow_id}, deactivating:`, error);
+        nextRuns.push(null);
+        continue;
+      }
+      ticks.push({ workflowId: row.workflow_id, scheduledAt: row.next_run_at.toISOString() });
+    }
+
+    // Enqueue before committing: a crash in between re-claims the rows, and
+    // the per-tick job id drops the repeated ticks
+    await scheduledQueue.addBulk(
+      ticks.map((tick) => ({
+        name: 'scheduled',
+        data: tick,
+        opts: { jobId: `schedule-${tick.workflowId}-${Date.parse(tick.scheduledAt)}` },
+      }))
+    );
+
+    await client.query(
+      `UPDATE scheduled_jobs AS s
+       SET next_run_at = COALESCE(v.next_run_at, s.next_run_at),
+           is_active = v.next_run_at IS NOT NULL,
+           last_run_at = $3,
+           updated_at = NOW()
+       FROM unnest($1::uuid[], $2::timestamptz[]) AS v(id, next_run_at)
+       WHERE s.id = v.id`,
+      [ids, nextRuns, now]
+    );
+    await client.query('COMMIT');
+
+    stats.ticks += ticks.length;
+    return due.rows.length;
+  } catch (error) {
+    await client.query('ROLLBACK').catch(() => {});
+    throw error;
+  } finally {
+    client.release();
+  }
+}
+
+// Schedules used to be BullMQ repeatable jobs and scheduled_jobs was never
+// written: give every active schedule trigger without a row one, so it
+// keeps firing once the repeatable jobs are gone
+async function backfillSchedules(): Promise<void> {
+  const result = await query<{ id: string; trigger: { cron: string; timezone?: string; jitterSeconds?: number } }>(
+    `SELECT w.id, w.workflow_definition->'trigger' AS trigger
+     FROM workflows w
+     WHERE w.is_active = true
+       AND w.workflow_definition->'trigger'->>'type' = 'schedule'
+       AND NOT EXISTS (SELECT 1 FROM scheduled_jobs s WHERE s.workflow_id = w.id)`
+  );
+  for (const row of result.rows) {
+    try {
+      await upsertSchedule(row.id, row.trigger.cron, row.trigger.timezone, row.trigger.jitterSeconds);
+    } catch (error) {
+      stats.invalidSchedules++;
+      console.error(`❌ Could not schedule workflow ${row.id}:`, error);
+    }
+  }
+  if (result.rows.length > 0) {
+    console.log(`📅 Backfilled ${result.rows.length} schedules into scheduled_jobs`);
+  }
+}
+
+// Drop repeatable jobs left from before, so they do not fire alongside the
+// table-driven ticks
+async function removeLegacyRepeatableJobs(): Promise<void> {
+  const repeatable = await scheduledQueue.getRepeatableJobs();
+  for (const job of repeatable) {
+    await scheduledQueue.removeRepeatableByKey(job.key);
+  }
+  if (repeatable.length > 0) {
+    console.log(`🧹 Removed ${repeatable.length} legacy repeatable schedule jobs`);
+  }
+}
+
+export function startScheduler(): { stop: () => Promise<void> } {
+  let stopped = false;
+  let timer: NodeJS.Timeout | null = null;
+  let running: Promise<void> = Promise.resolve();
+
+  const loop = async () => {
+    let claimed = 0;
+    try {
+      claimed = await pollOnce();
+    } catch (error) {
+      stats.errors++;
+      console.error('Scheduler poll failed:', error);
+    }
+    if (!stopped) {
+      // A full batch means more is due; go again right away
+      timer = setTimeout(tick, claimed >= BATCH_SIZE ? 0 : POLL_INTERVAL_MS);
+    }
+  };
+  const tick = () => {
+    running = loop();
+  };
+
+  // The repeatable jobs are only removed once the backfill has succeeded
+  backfillSchedules()
+    .then(removeLegacyRepeatableJobs)
+    .catch((error) => console.error('Failed to migrate legacy schedule jobs:', error))
+    .finally(() => {
+      if (!stopped) tick();
+    });
+
+  return {
+    async stop() {
+      stopped = true;
+      if (timer) clearTimeout(timer);
+      await running;
+    },
+  };
+}
+
+export function getSchedulerStats(): Record<string, number> {
+  return { ...stats };
+}
+
+registerMetricsSource('scheduler', getSchedulerStats);
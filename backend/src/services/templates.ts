@@ -0,0 +1,144 @@
+import { LRUCache } from '../lib/lru.js';
+import { compileExpression, type CompiledExpression } from '../lib/expression.js';
+
+// Compiled template engine. Step configs are parsed once into a tree of
+// render closures; rendering is then a walk over literal and path segments.
+
+export type ContextPath = string[];
+
+export interface CompiledConfig {
+  render: (context: Record<string, any>) => any;
+  // Every context path read by the config's templates, e.g. "fetch.response.body"
+  paths: string[];
+}
+
+const TEMPLATE_PATTERN = /\{\{([^}]+)\}\}/g;
+const MISSING = Symbol('missing');
+
+function lookupPath(context: Record<string, any>, keys: ContextPath): any {
+  let value: any = context;
+  for (let i = 0; i < keys.length; i++) {
+    if (value === undefined || value === null) {
+      return MISSING;
+    }
+    value = value[keys[i]];
+  }
+  return value === undefined ? MISSING : value;
+}
+
+function stringifyValue(value: any): string {
+  return typeof value === 'object' && value !== null ? JSON.stringify(value) : String(value);
+}
+
+export function compileTemplate(
+  template: string,
+  paths?: Set<string>
+): (context: Record<string, any>) => string {
+  const literals: string[] = [];
+  const lookups: ContextPath[] = [];
+  const placeholders: string[] = [];
+  let lastIndex = 0;
+
+  for (const match of template.matchAll(TEMPLATE_PATTERN)) {
+    const path = match[1].trim();
+    literals.push(template.slice(lastIndex, match.index));
+    lookups.push(path.split('.'));
+    placeholders.push(match[0]);
+    paths?.add(path);
+    lastIndex = match.index! + match[0].length;
+  }
+
+  // Plain strings render to themselves
+  if (lookups.length === 0) {
+    return () => template;
+  }
+
+  const tail = template.slice(lastIndex);
+
+  return (context) => {
+    let output = '';
+    for (let i = 0; i < lookups.length; i++) {
+      const value = lookupPath(context, lookups[i]);
+      // Keep the original placeholder if the path is not found
+      output += literals[i] + (value === MISSING ? placeholders[i] : stringifyValue(value));
+    }
+    return output + tail;
+  };
+}
+
+function compileNode(config: any, paths: Set<string>): ((context: Record<string, any>) => any) | null {
+  if (typeof config === 'string') {
+    return config.includes('{{') ? compileTemplate(config, paths) : null;
+  }
+
+  if (Array.isArray(config)) {
+    const items = config.map(item => compileNode(item, paths));
+    if (items.every(item => item === null)) {
+      return null;
+    }
+    return (context) => items.map((item, i) => (item ? item(context) : config[i]));
+  }
+
+  if (typeof config === 'object' && config !== null) {
+    const keys = Object.keys(config);
+    const values = keys.map(key => compileNode(config[key], paths));
+    if (values.every(value => value === null)) {
+      return null;
+    }
+    return (context) => {
+      const resolved: Record<string, any> = {};
+      for (let i = 0; i < keys.length; i++) {
+        const value = values[i];
+        resolved[keys[i]] = value ? value(context) : config[keys[i]];
+      }
+      return resolved;
+    };
+  }
+
+  return null;
+}
+
+export function compileConfig(config: any): CompiledConfig {
+  const paths = new Set<string>();
+  const node = compileNode(config, paths);
+
+  return {
+    // Subtrees without templates are shared rather than copied
+    render: node || (() => config),
+    paths: [...paths],
+  };
+}
+
+// Compiled configs keyed by workflow version (id + updated_at) and step id
+const compiledCache = new LRUCache<string, CompiledConfig>(
+  parseInt(process.env.TEMPLATE_CACHE_SIZE || '2000')
+);
+
+export function getCompiledConfig(versionKey: string, stepId: string, config: any): CompiledConfig {
+  const cacheKey = `${versionKey}:${stepId}`;
+  let compiled = compiledCache.get(cacheKey);
+  if (!compiled) {
+    compiled = compileConfig(config);
+    compiledCache.set(cacheKey, compiled);
+  }
+  return compiled;
+}
+
+// Step expressions (conditions, transform expressions) share the same keying
+const compiledExpressionCache = new LRUCache<string, CompiledExpression>(
+  parseInt(process.env.TEMPLATE_CACHE_SIZE || '2000')
+);
+
+export function getCompiledExpression(versionKey: string, stepId: string, source: string): CompiledExpression {
+  const cacheKey = `${versionKey}:${stepId}`;
+  let compiled = compiledExpressionCache.get(cacheKey);
+  if (!compiled) {
+    compiled = compileExpression(source);
+    compiledExpressionCache.set(cacheKey, compiled);
+  }
+  return compiled;
+}
+
+export function getWorkflowVersionKey(workflow: { id: string; updated_at: Date | string }): string {
+  return `${workflow.id}:${new Date(workflow.updated_at).getTime()}`;
+}
@@ -0,0 +1,167 @@
+import { query, prepared } from '../db/index.js';
+import { redis, createRedisConnection } from '../lib/redis.js';
+import { LRUCache } from '../lib/lru.js';
+import { registerMetricsSource } from '../lib/metrics.js';
+import type { WebhookIngestion, WebhookIdempotency, WebhookCoalesce } from '../types/index.js';
+
+// Routing cache for incoming webhooks: webhook_id → the few workflow fields
+// the ingest path needs. An in-process LRU sits in front of Redis keys
+// shared by every API process; Postgres is only read on a miss in both.
+// Workflow writes invalidate the entry everywhere through Redis pub/sub.
+
+const ROUTE_KEY_PREFIX = 'webhook-route:';
+const INVALIDATE_CHANNEL = 'webhook-routes:invalidate';
+const LOCAL_CACHE_SIZE = parseInt(process.env.WEBHOOK_CACHE_SIZE || '10000');
+// Upper bound on staleness if an invalidation message is ever missed; also
+// the Redis expiry, so entries for unknown ids do not pile up
+const ENTRY_TTL_MS = parseInt(process.env.WEBHOOK_CACHE_TTL_MS || String(5 * 60 * 1000));
+// A reader that loaded the row just before a write can re-cache the old
+// route after the invalidation; a second invalidation this much later
+// clears it
+const REINVALIDATE_AFTER_MS = 1000;
+
+// Webhook ids are generated as UUIDs; anything else is answered without a lookup
+const WEBHOOK_ID_PATTERN = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i;
+
+export interface WebhookRoute {
+  workflowId: string;
+  userId: string;
+  isActive: boolean;
+  ingestion: WebhookIngestion | null;
+  idempotency: WebhookIdempotency | null;
+  coalesce: WebhookCoalesce | null;
+}
+
+interface CachedRoute {
+  // null: no workflow has this webhook id (negative entry)
+  route: WebhookRoute | null;
+  cachedAt: number;
+}
+
+const localCache = new LRUCache<string, CachedRoute>(LOCAL_CACHE_SIZE);
+
+const stats = {
+  localHits: 0,
+  redisHits: 0,
+  dbLoads: 0,
+  invalidations: 0,
+  rejectedIds: 0,
+  errors: 0,
+};
+
+let subscribed = false;
+
+// Each process listens for invalidations once it starts serving webhooks
+function subscribeToInvalidations(): void {
+  if (subscribed) return;
+  subscribed = true;
+
+  const subscriber = createRedisConnection();
+  subscriber.subscribe(INVALIDATE_CHANNEL).catch((error) => {
+    stats.errors++;
+    console.error('Webhook cache subscribe failed:', error);
+  });
+  subscriber.on('message', (_channel, webhookId: string) => {
+    localCache.delete(webhookId);
+  });
+  // Messages sent while disconnected are lost; start from a clean slate
+  subscriber.on('ready', () => localCache.clear());
+}
+
+function isFresh(entry: CachedRoute | undefined): entry is CachedRoute {
+  return !!entry && Date.now() - entry.cachedAt < ENTRY_TTL_MS;
+}
+
+async function loadRoute(webhookId: string): Promise<WebhookRoute | null> {
+  stats.dbLoads++;
+  const result = await query<{
+    id: string;
+    user_id: string;
+    is_active: boolean;
+    ingestion: WebhookIngestion | null;
+    idempotency: WebhookIdempotency | null;
+    coalesce: WebhookCoalesce | null;
+  }>(
+    prepared(
+      'workflows.webhook-route',
+      `SELECT id, user_id, is_active,
+              workflow_definition->'trigger'->'ingestion' AS ingestion,
+              workflow_definition->'trigger'->'idempotency' AS idempotency,
+              workflow_definition->'trigger'->'coalesce' AS coalesce
+       FROM workflows WHERE webhook_id = $1`
+    ),
+    [webhookId]
+  );
+  const row = result.rows[0];
+  return row
+    ? {
+        workflowId: row.id,
+        userId: row.user_id,
+        isActive: row.is_active,
+        ingestion: row.ingestion,
+        idempotency: row.idempotency,
+        coalesce: row.coalesce,
+      }
+    : null;
+}
+
+export async function resolveWebhook(webhookId: string): Promise<WebhookRoute | null> {
+  if (!WEBHOOK_ID_PATTERN.test(webhookId)) {
+    stats.rejectedIds++;
+    return null;
+  }
+  subscribeToInvalidations();
+
+  const local = localCache.get(webhookId);
+  if (isFresh(local)) {
+    stats.localHits++;
+    return local.route;
+  }
+
+  try {
+    const raw = await redis.get(ROUTE_KEY_PREFIX + webhookId);
+    const shared = raw ? (JSON.parse(raw) as CachedRoute) : undefined;
+    if (isFresh(shared)) {
+      stats.redisHits++;
+      localCache.set(webhookId, shared);
+      return shared.route;
+    }
+  } catch (error) {
+    stats.errors++;
+    console.error('Webhook cache read failed:', error);
+  }
+
+  const entry: CachedRoute = { route: await loadRoute(webhookId), cachedAt: Date.now() };
+  localCache.set(webhookId, entry);
+  try {
+    await redis.set(ROUTE_KEY_PREFIX + webhookId, JSON.stringify(entry), 'PX', ENTRY_TTL_MS);
+  } catch (error) {
+    stats.errors++;
+    console.error('Webhook cache write failed:', error);
+  }
+  return entry.route;
+}
+
+async function invalidate(webhookId: string): Promise<void> {
+  localCache.delete(webhookId);
+  try {
+    await redis.del(ROUTE_KEY_PREFIX + webhookId);
+    await redis.publish(INVALIDATE_CHANNEL, webhookId);
+  } catch (error) {
+    stats.errors++;
+    console.error('Webhook cache invalidation failed:', error);
+  }
+}
+
+// Called after any write that may change a webhook's route
+export async function invalidateWebhookRoute(webhookId: string): Promise<void> {
+  stats.invalidations++;
+  await invalidate(webhookId);
+  setTimeout(() => void invalidate(webhookId), REINVALIDATE_AFTER_MS).unref();
+}
+
+export function getWebhookCacheStats(): Record<string, number> {
+  return { ...stats, localEntries: localCache.size };
+}
+
+registerMetricsSource('webhookCache', getWebhookCacheStats);
@@ -0,0 +1,252 @@
+import { Queue, Worker, type Job } from 'bullmq';
+import { v5 as uuidv5 } from 'uuid';
+import { redis, createRedisConnection } from '../lib/redis.js';
+import { addWorkflowJob } from '../lib/queue.js';
+import { registerMetricsSource } from '../lib/metrics.js';
+import { createExecutions } from './workflows.js';
+import type { WebhookCoalesce } from '../types/index.js';
+
+// Trigger coalescing for bursty webhook senders. Instead of one execution
+// per request, a workflow with a `coalesce` policy parks trigger data in a
+// Redis list and arms a single delayed flush job; the flush turns what is
+// pending into one execution:
+//   debounce  runs with the latest payload once no request came for windowMs
+//             (or once the oldest pending request is maxWaitMs old)
+//   throttle  runs with the latest payload at most once per windowMs; the
+//             first request after a quiet window runs immediately
+//   batch     runs windowMs after the first request, or as soon as
+//             maxBatchSize payloads are pending, with trigger data an array
+
+const DEFAULT_MAX_BATCH_SIZE = 100;
+const KEY_PREFIX = 'webhook-coalesce:';
+// Coalescing state outlives its window by this much, then expires
+const STATE_TTL_MS = 60 * 60 * 1000;
+// Execution ids are derived from the flush job id, so a retried flush
+// finds the row and the workflow job of its earlier attempt
+const FLUSH_EXECUTION_NAMESPACE = 'c4a1d0e2-7b3f-4e59-8d16-93a5f0b2e741';
+
+interface FlushJobData {
+  workflowId: string;
+  userId: string;
+  policy: WebhookCoalesce;
+  // Flushes a full batch right away; the armed flush still runs later
+  overflow?: boolean;
+  // Payloads taken by a failed attempt; retries run with exactly these
+  items?: string[];
+}
+
+const stats = {
+  accepted: 0,
+  flushes: 0,
+  executions: 0,
+  requeued: 0,
+};
+
+const connection = createRedisConnection();
+
+export const coalesceQueue = new Queue<FlushJobData>('webhook-coalesce', {
+  connection,
+  defaultJobOptions: {
+    removeOnComplete: 100,
+    removeOnFail: 50,
+    attempts: 3,
+    backoff: {
+      type: 'exponential',
+      delay: 1000,
+    },
+  },
+});
+
+function keys(workflowId: string) {
+  const base = `${KEY_PREFIX}${workflowId}:`;
+  return {
+    pending: `${base}pending`,
+    // Set while a flush job is scheduled, so a burst arms only one
+    armed: `${base}armed`,
+    lastArrival: `${base}last`,
+    firstArrival: `${base}first`,
+    lastRun: `${base}ran`,
+  };
+}
+
+function stateTtl(policy: WebhookCoalesce): number {
+  return Math.max(policy.windowMs, policy.maxWaitMs ?? 0) + STATE_TTL_MS;
+}
+
+async function arm(data: FlushJobData, delay: number): Promise<void> {
+  const k = keys(data.workflowId);
+  const armed = await redis.set(k.armed, '1', 'PX', stateTtl(data.policy), 'NX');
+  if (armed) {
+    await coalesceQueue.add('flush', data, { delay: Math.max(0, delay) });
+  }
+}
+
+async function throttleDelay(workflowId: string, windowMs: number): Promise<number> {
+  const lastRun = parseInt((await redis.get(keys(workflowId).lastRun)) || '0');
+  return lastRun + windowMs - Date.now();
+}
+
+// Called by the webhook route in place of creating an execution
+export async function enqueueCoalescedTrigger(
+  workflowId: string,
+  userId: string,
+  policy: WebhookCoalesce,
+  triggerData: Record<string, any>
+): Promise<void> {
+  stats.accepted++;
+  const k = keys(workflowId);
+  const now = Date.now();
+  const ttl = stateTtl(policy);
+
+  const tx = redis.multi().rpush(k.pending, JSON.stringify(triggerData));
+  if (policy.mode !== 'batch') {
+    // Debounce and throttle run with the latest payload only
+    tx.ltrim(k.pending, -1, -1);
+  }
+  tx.pexpire(k.pending, ttl)
+    .set(k.lastArrival, String(now), 'PX', ttl)
+    .set(k.firstArrival, String(now), 'PX', ttl, 'NX');
+  const results = await tx.exec();
+  const pendingCount = (results?.[0]?.[1] as number) || 0;
+
+  const data: FlushJobData = { workflowId, userId, policy };
+  const maxBatchSize = policy.maxBatchSize ?? DEFAULT_MAX_BATCH_SIZE;
+  if (policy.mode === 'batch' && pendingCount > 0 && pendingCount % maxBatchSize === 0) {
+    await coalesceQueue.add('flush', { ...data, overflow: true });
+  }
+
+  const delay = policy.mode === 'throttle'
+    ? await throttleDelay(workflowId, policy.windowMs)
+    : policy.windowMs;
+  await arm(data, delay);
+}
+
+async function flush(job: Job<FlushJobData>): Promise<void> {
+  const data = job.data;
+  const { workflowId, userId, policy } = data;
+  const k = keys(workflowId);
+  stats.flushes++;
+
+  if (policy.mode === 'debounce' && !data.overflow && !data.items) {
+    const [last, first] = await redis.mget(k.lastArrival, k.firstArrival);
+    const now = Date.now();
+    const quietUntil = parseInt(last || '0') + policy.windowMs;
+    const deadline = policy.maxWaitMs !== undefined && first
+      ? parseInt(first) + policy.maxWaitMs
+      : Infinity;
+    if (now < quietUntil && now < deadline) {
+      // Still busy: push the flush back, keeping the flag armed
+      stats.requeued++;
+      await redis.pexpire(k.armed, stateTtl(policy));
+      await coalesceQueue.add('flush', data, { delay: Math.min(quietUntil, deadline) - now });
+      return;
+    }
+  }
+
+  const take = policy.mode === 'batch' ? policy.maxBatchSize ?? DEFAULT_MAX_BATCH_SIZE : 1;
+  let items = data.items;
+  if (!items) {
+    const tx = redis.multi().lrange(k.pending, 0, take - 1).ltrim(k.pending, take, -1);
+    if (!data.overflow) {
+      tx.del(k.firstArrival);
+    }
+    const results = await tx.exec();
+    items = (results?.[0]?.[1] as string[]) || [];
+  }
+
+  if (items.length > 0) {
+    if (policy.mode === 'throttle') {
+      await redis.set(k.lastRun, String(Date.now()), 'PX', stateTtl(policy));
+    }
+    try {
+      await startExecution(uuidv5(job.id!, FLUSH_EXECUTION_NAMESPACE), workflowId, userId, policy, items);
+    } catch (error) {
+      // Keep the payloads with the job, so the retry reuses the same
+      // execution id for the same trigger data
+      if (!data.items) {
+        await job.updateData({ ...data, items }).catch(async () => {
+          await redis.lpush(k.pending, ...[...items!].reverse());
+        });
+      }
+      throw error;
+    }
+  }
+
+  if (data.overflow) {
+    if ((await redis.llen(k.pending)) >= take) {
+      await coalesceQueue.add('flush', data);
+    }
+    return;
+  }
+
+  await redis.del(k.armed);
+  // Requests that arrived during the flush saw the flag still set
+  if ((await redis.llen(k.pending)) > 0) {
+    await arm({ workflowId, userId, policy }, policy.windowMs);
+  }
+}
+
+// Idempotent for a given id: the row is kept if it exists and the workflow
+// job id is the execution id
+async function startExecution(
+  executionId: string,
+  workflowId: string,
+  userId: string,
+  policy: WebhookCoalesce,
+  items: string[]
+): Promise<void> {
+  const payloads = items.map((item) => JSON.parse(item));
+  const triggerData = policy.mode === 'batch' ? payloads : payloads[0];
+
+  const created = await createExecutions([{ id: executionId, workflowId, triggerType: 'webhook', triggerData }]);
+  if (created.length === 0) {
+    // The workflow was deleted in the meantime
+    return;
+  }
+  await addWorkflowJob({
+    workflowId,
+    executionId,
+    triggerType: 'webhook',
+    triggerData,
+    userId,
+  });
+  stats.executions++;
+}
+
+export function createCoalesceWorker() {
+  const worker = new Worker<FlushJobData>(
+    'webhook-coalesce',
+    async (job) => flush(job),
+    {
+      connection: createRedisConnection(),
+    }
+  );
+
+  worker.on('failed', (job, err) => {
+    console.error(`❌ Webhook flush ${job?.id} failed:`, err.message);
+    // Out of retries: put its payloads back on the pending list and free
+    // the flag so the next request arms a new flush, instead of parking
+    // requests until the flag expires
+    if (job && job.attemptsMade >= (job.opts.attempts ?? 1)) {
+      const k = keys(job.data.workflowId);
+      const tx = redis.multi();
+      if (job.data.items?.length) {
+        tx.lpush(k.pending, ...[...job.data.items].reverse());
+      }
+      if (!job.data.overflow) {
+        tx.del(k.armed);
+      }
+      tx.exec().catch((error) => {
+        console.error('Failed to release webhook flush:', error);
+      });
+    }
+  });
+
+  return worker;
+}
+
+export function getCoalesceStats(): Record<string, number> {
+  return { ...stats };
+}
+
+registerMetricsSource('webhookCoalesce', getCoalesceStats);
@@ -0,0 +1,45 @@
+import type { Request } from 'express';
+import { redis } from '../lib/redis.js';
+import type { WebhookIdempotency } from '../types/index.js';
+
+// Idempotency keys. A key is claimed for an execution id with SET NX, which
+// is also the BullMQ job id; later deliveries with the same key get the
+// original execution id back for the cost of that one Redis command.
+
+const IDEMPOTENCY_TTL_SECONDS = parseInt(process.env.WEBHOOK_IDEMPOTENCY_TTL_SECONDS || String(24 * 60 * 60));
+const IDEMPOTENCY_KEY_PREFIX = 'webhook-idempotency:';
+
+export function headerIdempotencyKey(req: Request, idempotency: WebhookIdempotency | null): string | null {
+  if (!idempotency?.header) {
+    return null;
+  }
+  const value = req.headers[idempotency.header.toLowerCase()];
+  const key = Array.isArray(value) ? value[0] : value;
+  return key ? `header:${key}` : null;
+}
+
+// Returns the execution id already holding the key, or null once claimed
+export async function claimIdempotencyKey(
+  workflowId: string,
+  key: string,
+  executionId: string,
+  idempotency: WebhookIdempotency
+): Promise<string | null> {
+  const redisKey = `${IDEMPOTENCY_KEY_PREFIX}${workflowId}:${key}`;
+  const ttl = idempotency.ttlSeconds ?? IDEMPOTENCY_TTL_SECONDS;
+  const claimed = await redis.set(redisKey, executionId, 'EX', ttl, 'NX');
+  if (claimed) {
+    return null;
+  }
+  // The key may expire between the two commands; then this delivery is new
+  const existing = await redis.get(redisKey);
+  if (existing) {
+    return existing;
+  }
+  return claimIdempotencyKey(workflowId, key, executionId, idempotency);
+}
+
+// Frees a key whose delivery was not accepted, so the sender's retry runs
+export async function releaseIdempotencyKey(workflowId: string, key: string): Promise<void> {
+  await redis.del(`${IDEMPOTENCY_KEY_PREFIX}${workflowId}:${key}`);
+}
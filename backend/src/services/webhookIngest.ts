@@ -0,0 +1,90 @@
+import crypto from 'node:crypto';
+import type { IncomingHttpHeaders } from 'node:http';
+import type { Request } from 'express';
+import { readBodyWithLimit, BodyTooLargeError } from '../lib/http.js';
+import { parseBody } from '../lib/body.js';
+import type { WebhookIngestion } from '../types/index.js';
+
+// Capture of webhook requests into trigger data. Bodies are read from the
+// request stream (no global body parser runs on webhook routes) and parsed
+// inline. A workflow can opt into spilling: bodies above its spillAboveBytes
+// stream into the blob store and only the handle travels through the job
+// and the execution row; steps that read the body load it when they run.
+
+// Hard cap for every webhook; workflows can only lower it
+const MAX_BODY_BYTES = parseInt(process.env.WEBHOOK_MAX_BODY_BYTES || String(10 * 1024 * 1024));
+
+// Dropped unless a workflow allowlists them explicitly
+const SENSITIVE_HEADERS = new Set(['authorization', 'proxy-authorization', 'cookie']);
+const TRANSPORT_HEADERS = new Set([
+  'connection',
+  'keep-alive',
+  'transfer-encoding',
+  'te',
+  'upgrade',
+  'content-length',
+  'accept-encoding',
+]);
+
+export function pickHeaders(
+  headers: IncomingHttpHeaders,
+  allowlist?: string[]
+): Record<string, string | string[]> {
+  const allowed = allowlist ? new Set(allowlist.map(name => name.toLowerCase())) : null;
+  const picked: Record<string, string | string[]> = {};
+
+  for (const [name, value] of Object.entries(headers)) {
+    if (value === undefined) continue;
+    const keep = allowed
+      ? allowed.has(name)
+      : !SENSITIVE_HEADERS.has(name) && !TRANSPORT_HEADERS.has(name);
+    if (keep) {
+      picked[name] = value;
+    }
+  }
+  return picked;
+}
+
+export interface CapturedBody {
+  body: any;
+  // SHA-256 of the raw bytes, when requested
+  sha256?: string;
+}
+
+// Throws BodyTooLargeError past the workflow's limit
+export async function captureWebhookBody(
+  req: Request,
+  ingestion: WebhookIngestion | null,
+  options: { hash?: boolean } = {}
+): Promise<CapturedBody> {
+  const limit = Math.min(ingestion?.maxBodyBytes ?? MAX_BODY_BYTES, MAX_BODY_BYTES);
+  const declaredLength = parseInt(req.headers['content-length'] || '');
+  if (declaredLength > limit) {
+    throw new BodyTooLargeError(limit);
+  }
+
+  // Hash while streaming, so spilled bodies are covered too
+  const hash = options.hash ? crypto.createHash('sha256') : null;
+  const source: AsyncIterable<Buffer> = hash
+    ? (async function* () {
+        for await (const chunk of req) {
+          hash.update(chunk);
+          yield chunk;
+        }
+      })()
+    : req;
+
+  const contentType = req.headers['content-type'];
+  const spill = ingestion?.spillAboveBytes !== undefined;
+  const read = await readBodyWithLimit(source, {
+    maxBytes: spill ? ingestion!.spillAboveBytes! : limit,
+    spillToBlob: spill,
+    contentType,
+    limitBytes: limit,
+  });
+
+  return {
+    body: 'blob' in read ? read.blob : parseBody(read.buffer, contentType),
+    sha256: hash?.digest('hex'),
+  };
+}
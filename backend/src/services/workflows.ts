@@ -1,13 +1,15 @@
-import { query } from '../db/index.js';
+import { query, prepared } from '../db/index.js';
 import { v4 as uuidv4 } from 'uuid';
 import type {
   Workflow,
   WorkflowDefinition,
   WorkflowExecution,
   StepExecution,
+  StepInputReference,
   TriggerType,
 } from '../types/index.js';
-import { addScheduledJob, removeScheduledJob } from '../lib/queue.js';
+import { upsertSchedule, deactivateSchedule } from './scheduler.js';
+import { invalidateWebhookRoute } from './webhookCache.js';
 
 // Workflow CRUD operations
 
@@ -31,20 +33,12 @@ export async function createWorkflow(
 
 export async function getWorkflowById(id: string): Promise<Workflow | null> {
   const result = await query<Workflow>(
-    'SELECT * FROM workflows WHERE id = $1',
+    prepared('workflows.by-id', 'SELECT * FROM workflows WHERE id = $1'),
     [id]
   );
   return result.rows[0] || null;
 }
 
-export async function getWorkflowByWebhookId(webhookId: string): Promise<Workflow | null> {
-  const result = await query<Workflow>(
-    'SELECT * FROM workflows WHERE webhook_id = $1 AND is_active = true',
-    [webhookId]
-  );
-  return result.rows[0] || null;
-}
-
 export async function getWorkflowsByUserId(
   userId: string,
   page = 1,
@@ -54,13 +48,16 @@ export async function getWorkflowsByUserId(
   
   const [workflowsResult, countResult] = await Promise.all([
     query<Workflow>(
-      `SELECT * FROM workflows WHERE user_id = $1 
-       ORDER BY created_at DESC 
-       LIMIT $2 OFFSET $3`,
+      prepared(
+        'workflows.by-user',
+        `SELECT * FROM workflows WHERE user_id = $1
+         ORDER BY created_at DESC
+         LIMIT $2 OFFSET $3`
+      ),
       [userId, limit, offset]
     ),
     query<{ count: string }>(
-      'SELECT COUNT(*) as count FROM workflows WHERE user_id = $1',
+      prepared('workflows.count-by-user', 'SELECT COUNT(*) as count FROM workflows WHERE user_id = $1'),
       [userId]
     ),
   ]);
@@ -112,11 +109,31 @@ export async function updateWorkflow(
     values
   );
 
-  return result.rows[0] || null;
+  const workflow = result.rows[0] || null;
+  if (workflow?.webhook_id) {
+    await invalidateWebhookRoute(workflow.webhook_id);
+  }
+  // Keep an active workflow's schedule in step with its trigger
+  if (workflow?.is_active && updates.workflow_definition !== undefined) {
+    const trigger = updates.workflow_definition.trigger;
+    if (trigger.type === 'schedule') {
+      await upsertSchedule(id, trigger.cron, trigger.timezone, trigger.jitterSeconds);
+    } else {
+      await deactivateSchedule(id);
+    }
+  }
+  return workflow;
 }
 
 export async function deleteWorkflow(id: string): Promise<boolean> {
-  const result = await query('DELETE FROM workflows WHERE id = $1', [id]);
+  const result = await query<{ webhook_id: string | null }>(
+    'DELETE FROM workflows WHERE id = $1 RETURNING webhook_id',
+    [id]
+  );
+  const webhookId = result.rows[0]?.webhook_id;
+  if (webhookId) {
+    await invalidateWebhookRoute(webhookId);
+  }
   return (result.rowCount ?? 0) > 0;
 }
 
@@ -126,9 +143,14 @@ export async function activateWorkflow(id: string): Promise<Workflow | null> {
 
   const definition = workflow.workflow_definition as WorkflowDefinition;
   
-  // If schedule trigger, set up cron job
+  // If schedule trigger, register it with the scheduler
   if (definition.trigger.type === 'schedule') {
-    await addScheduledJob(id, definition.trigger.cron, `schedule-${id}`);
+    await upsertSchedule(
+      id,
+      definition.trigger.cron,
+      definition.trigger.timezone,
+      definition.trigger.jitterSeconds
+    );
   }
 
   return updateWorkflow(id, { is_active: true, status: 'active' });
@@ -140,13 +162,9 @@ export async function deactivateWorkflow(id: string): Promise<Workflow | null> {
 
   const definition = workflow.workflow_definition as WorkflowDefinition;
   
-  // If schedule trigger, remove cron job
+  // If schedule trigger, stop its ticks
   if (definition.trigger.type === 'schedule') {
-    try {
-      await removeScheduledJob(`schedule-${id}`);
-    } catch (e) {
-      console.error('Failed to remove scheduled job:', e);
-    }
+    await deactivateSchedule(id);
   }
 
   return updateWorkflow(id, { is_active: false, status: 'paused' });
@@ -157,21 +175,87 @@ export async function deactivateWorkflow(id: string): Promise<Workflow | null> {
 export async function createExecution(
   workflowId: string,
   triggerType: TriggerType,
-  triggerData?: Record<string, any>
+  triggerData?: Record<string, any>,
+  // Pre-generated id, when the caller needs it before the row exists
+  id?: string
 ): Promise<WorkflowExecution> {
   const result = await query<WorkflowExecution>(
-    `INSERT INTO workflow_executions (workflow_id, trigger_type, trigger_data, status)
-     VALUES ($1, $2, $3, 'pending')
-     RETURNING *`,
-    [workflowId, triggerType, triggerData ? JSON.stringify(triggerData) : null]
+    prepared(
+      'executions.create',
+      `INSERT INTO workflow_executions (id, workflow_id, trigger_type, trigger_data, status)
+       VALUES (COALESCE($4::uuid, gen_random_uuid()), $1, $2, $3, 'pending')
+       RETURNING *`
+    ),
+    [workflowId, triggerType, triggerData ? JSON.stringify(triggerData) : null, id ?? null]
   );
   
   return result.rows[0];
 }
 
+export interface NewExecution {
+  id: string;
+  workflowId: string;
+  triggerType: TriggerType;
+  triggerData?: Record<string, any>;
+}
+
+// One INSERT for many executions (scheduled ticks, coalesced webhooks).
+// Ids are chosen by the caller and existing rows are kept, so a retried
+// batch is safe. Returns the ids whose workflow still exists, with the
+// workflow's owner; executions of deleted workflows are dropped.
+export async function createExecutions(
+  executions: NewExecution[]
+): Promise<{ id: string; user_id: string }[]> {
+  if (executions.length === 0) return [];
+
+  const result = await query<{ id: string; user_id: string }>(
+    prepared(
+      'executions.create-many',
+      `WITH input AS (
+         SELECT t.id, t.workflow_id, t.trigger_type, t.trigger_data, w.user_id
+         FROM unnest($1::uuid[], $2::uuid[], $3::text[], $4::jsonb[])
+           AS t(id, workflow_id, trigger_type, trigger_data)
+         JOIN workflows w ON w.id = t.workflow_id
+       ), inserted AS (
+         INSERT INTO workflow_executions (id, workflow_id, trigger_type, trigger_data, status)
+         SELECT id, workflow_id, trigger_type, trigger_data, 'pending' FROM input
+         ON CONFLICT (id) DO NOTHING
+       )
+       SELECT id, user_id FROM input`
+    ),
+    [
+      executions.map((e) => e.id),
+      executions.map((e) => e.workflowId),
+      executions.map((e) => e.triggerType),
+      executions.map((e) => (e.triggerData ? JSON.stringify(e.triggerData) : null)),
+    ]
+  );
+  return result.rows;
+}
+
+// Rows of executions accepted without one (async webhook ingest) are
+// written when the worker starts them; a re-run just marks them running
+export async function startAcceptedExecution(
+  executionId: string,
+  workflowId: string,
+  triggerType: TriggerType,
+  triggerData: Record<string, any> | undefined,
+  acceptedAt: Date
+): Promise<void> {
+  await query(
+    prepared(
+      'executions.start-accepted',
+      `INSERT INTO workflow_executions (id, workflow_id, trigger_type, trigger_data, status, started_at, created_at)
+       VALUES ($1, $2, $3, $4, 'running', NOW(), $5)
+       ON CONFLICT (id) DO UPDATE SET status = 'running', completed_at = NULL, error = NULL`
+    ),
+    [executionId, workflowId, triggerType, triggerData ? JSON.stringify(triggerData) : null, acceptedAt]
+  );
+}
+
 export async function getExecutionById(id: string): Promise<WorkflowExecution | null> {
   const result = await query<WorkflowExecution>(
-    'SELECT * FROM workflow_executions WHERE id = $1',
+    prepared('executions.by-id', 'SELECT * FROM workflow_executions WHERE id = $1'),
     [id]
   );
   return result.rows[0] || null;
@@ -186,13 +270,16 @@ export async function getExecutionsByWorkflowId(
   
   const [executionsResult, countResult] = await Promise.all([
     query<WorkflowExecution>(
-      `SELECT * FROM workflow_executions WHERE workflow_id = $1 
-       ORDER BY created_at DESC 
-       LIMIT $2 OFFSET $3`,
+      prepared(
+        'executions.by-workflow',
+        `SELECT * FROM workflow_executions WHERE workflow_id = $1
+         ORDER BY created_at DESC
+         LIMIT $2 OFFSET $3`
+      ),
       [workflowId, limit, offset]
     ),
     query<{ count: string }>(
-      'SELECT COUNT(*) as count FROM workflow_executions WHERE workflow_id = $1',
+      prepared('executions.count-by-workflow', 'SELECT COUNT(*) as count FROM workflow_executions WHERE workflow_id = $1'),
       [workflowId]
     ),
   ]);
@@ -207,36 +294,30 @@ export async function updateExecution(
   id: string,
   updates: Partial<Pick<WorkflowExecution, 'status' | 'started_at' | 'completed_at' | 'error'>>
 ): Promise<WorkflowExecution | null> {
-  const setClause: string[] = [];
-  const values: any[] = [];
-  let paramIndex = 1;
-
-  if (updates.status !== undefined) {
-    setClause.push(`status = $${paramIndex++}`);
-    values.push(updates.status);
-  }
-  if (updates.started_at !== undefined) {
-    setClause.push(`started_at = $${paramIndex++}`);
-    values.push(updates.started_at);
-  }
-  if (updates.completed_at !== undefined) {
-    setClause.push(`completed_at = $${paramIndex++}`);
-    values.push(updates.completed_at);
-  }
-  if (updates.error !== undefined) {
-    setClause.push(`error = $${paramIndex++}`);
-    values.push(updates.error);
-  }
-
-  if (setClause.length === 0) {
+  if (Object.values(updates).every((value) => value === undefined)) {
     return getExecutionById(id);
   }
 
-  values.push(id);
-
+  // One statement text for every combination of fields, so it can stay
+  // prepared: each column takes its new value only when its flag is set
   const result = await query<WorkflowExecution>(
-    `UPDATE workflow_executions SET ${setClause.join(', ')} WHERE id = $${paramIndex} RETURNING *`,
-    values
+    prepared(
+      'executions.update',
+      `UPDATE workflow_executions SET
+         status = CASE WHEN $2::boolean THEN $3 ELSE status END,
+         started_at = CASE WHEN $4::boolean THEN $5::timestamptz ELSE started_at END,
+         completed_at = CASE WHEN $6::boolean THEN $7::timestamptz ELSE completed_at END,
+         error = CASE WHEN $8::boolean THEN $9 ELSE error END
+       WHERE id = $1
+       RETURNING *`
+    ),
+    [
+      id,
+      updates.status !== undefined, updates.status ?? null,
+      updates.started_at !== undefined, updates.started_at ?? null,
+      updates.completed_at !== undefined, updates.completed_at ?? null,
+      updates.error !== undefined, updates.error ?? null,
+    ]
   );
 
   return result.rows[0] || null;
@@ -244,71 +325,118 @@ export async function updateExecution(
 
 // Step execution operations
 
-export async function createStepExecution(
-  executionId: string,
-  stepId: string,
-  stepType: string,
-  inputData?: Record<string, any>
-): Promise<StepExecution> {
-  const result = await query<StepExecution>(
-    `INSERT INTO step_executions (execution_id, step_id, step_type, input_data, status)
-     VALUES ($1, $2, $3, $4, 'pending')
-     RETURNING *`,
-    [executionId, stepId, stepType, inputData ? JSON.stringify(inputData) : null]
-  );
-  
-  return result.rows[0];
+export interface StepExecutionRecord {
+  id: string;
+  execution_id: string;
+  step_id: string;
+  step_type: string;
+  status: StepExecution['status'];
+  input_data: StepInputReference | null;
+  output_data: any;
+  error: string | null;
+  started_at: Date | null;
+  completed_at: Date | null;
+  created_at: Date;
 }
 
-export async function updateStepExecution(
-  id: string,
-  updates: Partial<Pick<StepExecution, 'status' | 'output_data' | 'error' | 'started_at' | 'completed_at'>>
-): Promise<StepExecution | null> {
-  const setClause: string[] = [];
-  const values: any[] = [];
-  let paramIndex = 1;
-
-  if (updates.status !== undefined) {
-    setClause.push(`status = $${paramIndex++}`);
-    values.push(updates.status);
-  }
-  if (updates.output_data !== undefined) {
-    setClause.push(`output_data = $${paramIndex++}`);
-    values.push(JSON.stringify(updates.output_data));
-  }
-  if (updates.error !== undefined) {
-    setClause.push(`error = $${paramIndex++}`);
-    values.push(updates.error);
-  }
-  if (updates.started_at !== undefined) {
-    setClause.push(`started_at = $${paramIndex++}`);
-    values.push(updates.started_at);
-  }
-  if (updates.completed_at !== undefined) {
-    setClause.push(`completed_at = $${paramIndex++}`);
-    values.push(updates.completed_at);
+// Insert or update a batch of step executions in a single round trip
+export async function upsertStepExecutions(records: StepExecutionRecord[]): Promise<void> {
+  if (records.length === 0) {
+    return;
   }
 
-  if (setClause.length === 0) {
-    return null;
-  }
-
-  values.push(id);
-
-  const result = await query<StepExecution>(
-    `UPDATE step_executions SET ${setClause.join(', ')} WHERE id = $${paramIndex} RETURNING *`,
-    values
+  await query(
+    prepared(
+      'steps.upsert-many',
+      `INSERT INTO step_executions
+         (id, execution_id, step_id, step_type, status, input_data, output_data, error, started_at, completed_at, created_at)
+       SELECT id, execution_id, step_id, step_type, status, input_data, output_data, error, started_at, completed_at, created_at
+       FROM jsonb_to_recordset($1::jsonb) AS t(
+         id UUID, execution_id UUID, step_id VARCHAR, step_type VARCHAR, status VARCHAR,
+         input_data JSONB, output_data JSONB, error TEXT,
+         started_at TIMESTAMPTZ, completed_at TIMESTAMPTZ, created_at TIMESTAMPTZ
+       )
+       ON CONFLICT (id) DO UPDATE SET
+         status = EXCLUDED.status,
+         -- Keep email delivery outcomes the email worker merged in
+         output_data = CASE
+           WHEN jsonb_typeof(EXCLUDED.output_data) = 'object' THEN EXCLUDED.output_data || jsonb_strip_nulls(jsonb_build_object(
+             'delivery', step_executions.output_data->'delivery',
+             'failedDeliveries', step_executions.output_data->'failedDeliveries'
+           ))
+           ELSE EXCLUDED.output_data
+         END,
+         error = EXCLUDED.error,
+         started_at = EXCLUDED.started_at,
+         completed_at = EXCLUDED.completed_at`
+    ),
+    [JSON.stringify(records)]
   );
-
-  return result.rows[0] || null;
 }
 
 export async function getStepExecutionsByExecutionId(
   executionId: string
 ): Promise<StepExecution[]> {
   const result = await query<StepExecution>(
-    'SELECT * FROM step_executions WHERE execution_id = $1 ORDER BY created_at',
+    prepared('steps.by-execution', 'SELECT * FROM step_executions WHERE execution_id = $1 ORDER BY created_at'),
+    [executionId]
+  );
+  return result.rows;
+}
+
+// Minimal view of an execution's step rows used to continue it
+export async function getStepCheckpoints(
+  executionId: string
+): Promise<Pick<StepExecution, 'id' | 'step_id' | 'status' | 'output_data'>[]> {
+  const result = await query<Pick<StepExecution, 'id' | 'step_id' | 'status' | 'output_data'>>(
+    prepared(
+      'steps.checkpoints',
+      'SELECT id, step_id, status, output_data FROM step_executions WHERE execution_id = $1 ORDER BY created_at'
+    ),
     [executionId]
   );
   return result.rows;
 }
+
+function isStepInputReference(inputData: Record<string, any> | null): inputData is StepInputReference {
+  return !!inputData && Array.isArray(inputData.refs) && Array.isArray(inputData.paths);
+}
+
+// Rebuild each step's input context from the execution's trigger data and
+// the outputs of the steps it referenced. Rows written before inputs were
+// stored as references already hold a full context copy and pass through.
+export function hydrateStepInputs(
+  execution: WorkflowExecution,
+  steps: StepExecution[]
+): StepExecution[] {
+  const context: Record<string, any> = {
+    trigger: {
+      type: execution.trigger_type,
+      data: execution.trigger_data || {},
+    },
+  };
+  for (const step of steps) {
+    if (step.status === 'completed') {
+      context[step.step_id] = { response: step.output_data };
+    }
+  }
+
+  return steps.map(step => {
+    if (!isStepInputReference(step.input_data)) {
+      return step;
+    }
+
+    const referenced: Record<string, any> = {};
+    for (const ref of step.input_data.refs) {
+      referenced[ref] = context[ref];
+    }
+
+    return {
+      ...step,
+      input_data: {
+        context: referenced,
+        paths: step.input_data.paths,
+      },
+    };
+  });
+}
@@ -32,21 +32,62 @@ export interface ConversationMessage {
 export const TriggerTypeSchema = z.enum(['schedule', 'webhook', 'manual']);
 export type TriggerType = z.infer<typeof TriggerTypeSchema>;
 
-export const StepTypeSchema = z.enum(['http_request', 'send_email', 'transform_data', 'conditional', 'delay']);
+export const StepTypeSchema = z.enum(['http_request', 'send_email', 'transform_data', 'conditional', 'delay', 'foreach']);
 export type StepType = z.infer<typeof StepTypeSchema>;
 
 export const HttpMethodSchema = z.enum(['GET', 'POST', 'PUT', 'PATCH', 'DELETE']);
 export type HttpMethod = z.infer<typeof HttpMethodSchema>;
 
+// How a webhook's requests are captured into trigger data
+export const WebhookIngestionSchema = z.object({
+  // Requests with larger bodies are rejected with 413 (capped by WEBHOOK_MAX_BODY_BYTES)
+  maxBodyBytes: z.number().int().positive().optional(),
+  // Opt-in: bodies above this size go to the blob store and trigger data
+  // keeps only a { $blob, size, contentType } handle
+  spillAboveBytes: z.number().int().min(0).optional(),
+  // Header names to keep (case-insensitive); all but credentials when unset
+  headers: z.array(z.string()).optional(),
+});
+export type WebhookIngestion = z.infer<typeof WebhookIngestionSchema>;
+
+// Duplicate suppression for senders that retry deliveries
+export const WebhookIdempotencySchema = z.object({
+  // Header with the sender's delivery id, e.g. Idempotency-Key or X-GitHub-Delivery
+  header: z.string().optional(),
+  // Key on a SHA-256 of the raw body when there is no header key
+  bodyHash: z.boolean().optional(),
+  // How long a key is remembered
+  ttlSeconds: z.number().int().positive().max(7 * 24 * 60 * 60).optional(),
+});
+export type WebhookIdempotency = z.infer<typeof WebhookIdempotencySchema>;
+
+// Turns bursts of requests into fewer executions
+export const WebhookCoalesceSchema = z.object({
+  // debounce: latest payload after windowMs of quiet; throttle: latest payload
+  // at most once per windowMs; batch: payloads collected over windowMs as an array
+  mode: z.enum(['debounce', 'throttle', 'batch']),
+  windowMs: z.number().int().positive().max(60 * 60 * 1000),
+  // debounce: run anyway once the oldest pending request is this old
+  maxWaitMs: z.number().int().positive().optional(),
+  // batch: run early once this many payloads are pending (default 100)
+  maxBatchSize: z.number().int().positive().max(1000).optional(),
+});
+export type WebhookCoalesce = z.infer<typeof WebhookCoalesceSchema>;
+
 export const TriggerConfigSchema = z.discriminatedUnion('type', [
   z.object({
     type: z.literal('schedule'),
     cron: z.string(),
     timezone: z.string().optional().default('UTC'),
+    // Spread runs over this window after each cron time, by a fixed per-workflow offset
+    jitterSeconds: z.number().int().min(0).max(3600).optional(),
   }),
   z.object({
     type: z.literal('webhook'),
     webhook_id: z.string().optional(),
+    ingestion: WebhookIngestionSchema.optional(),
+    idempotency: WebhookIdempotencySchema.optional(),
+    coalesce: WebhookCoalesceSchema.optional(),
   }),
   z.object({
     type: z.literal('manual'),
@@ -63,6 +104,19 @@ export const HttpRequestConfigSchema = z.object({
     type: z.enum(['basic', 'bearer', 'api_key']),
     credentials: z.record(z.string()),
   }).optional(),
+  // Opt-in shared cache for GET: seconds to keep the response fresh, or 0 to
+  // follow the response's Cache-Control/ETag headers
+  cacheTtl: z.number().int().nonnegative().optional(),
+  response: z.object({
+    // In-memory budget for the body; capped by HTTP_MAX_RESPONSE_BYTES
+    maxBytes: z.number().int().positive().optional(),
+    // Store oversized bodies in the blob store instead of failing the step;
+    // the output keeps a { $blob, size, contentType } handle, and steps
+    // reading the body load it from the store
+    spillToBlob: z.boolean().optional(),
+    // Keep only these body paths, or those referenced by other steps' templates
+    select: z.union([z.literal('referenced'), z.array(z.string())]).optional(),
+  }).optional(),
 });
 export type HttpRequestConfig = z.infer<typeof HttpRequestConfigSchema>;
 
@@ -78,6 +132,9 @@ export type SendEmailConfig = z.infer<typeof SendEmailConfigSchema>;
 
 export const TransformDataConfigSchema = z.object({
   expression: z.string(),
+  // 'template' substitutes {{...}} placeholders and parses the result as
+  // JSON; 'expression' evaluates it with the expression language
+  language: z.enum(['template', 'expression']).optional(),
   outputKey: z.string().optional(),
 });
 export type TransformDataConfig = z.infer<typeof TransformDataConfigSchema>;
@@ -95,6 +152,24 @@ export const DelayConfigSchema = z.object({
 });
 export type DelayConfig = z.infer<typeof DelayConfigSchema>;
 
+export const ForEachConfigSchema = z.object({
+  // Expression (or {{template}}) that yields the array to iterate
+  items: z.string(),
+  // Run once per item; its config can read {{item}} and {{index}}
+  step: z.object({
+    type: z.enum(['http_request', 'send_email', 'transform_data']),
+    config: z.record(z.any()),
+  }),
+  parallelism: z.number().int().min(1).max(50).optional().default(5),
+  // Items scheduled at a time; bounds pending work for large arrays
+  chunkSize: z.number().int().min(1).max(1000).optional().default(100),
+  itemRetries: z.number().int().min(0).max(5).optional().default(0),
+  itemRetryDelay: z.number().int().min(0).optional().default(1000),
+  // Record failed items in the output instead of failing the step
+  continueOnError: z.boolean().optional().default(false),
+});
+export type ForEachConfig = z.infer<typeof ForEachConfigSchema>;
+
 export const WorkflowStepSchema = z.object({
   id: z.string(),
   name: z.string().optional(),
@@ -105,6 +180,7 @@ export const WorkflowStepSchema = z.object({
     TransformDataConfigSchema,
     ConditionalConfigSchema,
     DelayConfigSchema,
+    ForEachConfigSchema,
   ]),
   dependsOn: z.array(z.string()).optional(),
   retryConfig: z.object({
@@ -138,7 +214,7 @@ export interface Workflow {
 }
 
 // Execution types
-export type ExecutionStatus = 'pending' | 'running' | 'completed' | 'failed' | 'cancelled';
+export type ExecutionStatus = 'pending' | 'running' | 'waiting' | 'completed' | 'failed' | 'cancelled';
 
 export interface WorkflowExecution {
   id: string;
@@ -152,6 +228,14 @@ export interface WorkflowExecution {
   created_at: Date;
 }
 
+// Step inputs are stored as references into the execution context rather
+// than copies of it: `refs` are the context entries (trigger or prior steps)
+// the step read, `paths` the template paths it resolved against them.
+export interface StepInputReference {
+  refs: string[];
+  paths: string[];
+}
+
 export interface StepExecution {
   id: string;
   execution_id: string;
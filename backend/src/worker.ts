@@ -1,5 +1,10 @@
 import dotenv from 'dotenv';
 import { createWorkflowWorker, createScheduledWorker } from './lib/queue.js';
+import { startMetricsServer } from './lib/metrics.js';
+import { createEmailWorker } from './services/email.js';
+import { createCoalesceWorker } from './services/webhookCoalesce.js';
+import { startScheduler } from './services/scheduler.js';
+import { startBlobSweeper } from './lib/blobStore.js';
 
 dotenv.config();
 
@@ -8,15 +13,45 @@ console.log('🔧 Starting workflow workers...');
 // Create workers
 const workflowWorker = createWorkflowWorker();
 const scheduledWorker = createScheduledWorker();
+const emailWorker = createEmailWorker();
+const coalesceWorker = createCoalesceWorker();
+
+// Cron ticks; replicas share the table safely, so this only trims idle
+// polling to one loop per host under the cluster runner
+const runScheduler =
+  process.env.SCHEDULER_ENABLED !== 'false' && (process.env.WORKER_INDEX || '0') === '0';
+const scheduler = runScheduler ? startScheduler() : null;
+// Spilled payloads are not referenced forever; one sweeper per host is enough
+const blobSweeper = (process.env.WORKER_INDEX || '0') === '0' ? startBlobSweeper() : null;
 
 console.log('✅ Workflow execution worker started');
 console.log('✅ Scheduled jobs worker started');
+console.log('✅ Email delivery worker started');
+console.log('✅ Webhook coalescing worker started');
+if (scheduler) console.log('✅ Cron scheduler started');
+
+// Optional stats endpoint (HTTP pools, caches, queues) for this process;
+// clustered children listen on consecutive ports
+const metricsServer = process.env.WORKER_METRICS_PORT
+  ? startMetricsServer(
+      parseInt(process.env.WORKER_METRICS_PORT) + parseInt(process.env.WORKER_INDEX || '0')
+    )
+  : null;
 
 // Graceful shutdown
+let shuttingDown = false;
+
 async function shutdown() {
+  if (shuttingDown) return;
+  shuttingDown = true;
   console.log('Shutting down workers...');
+  await scheduler?.stop();
+  if (blobSweeper) clearInterval(blobSweeper);
   await workflowWorker.close();
   await scheduledWorker.close();
+  await emailWorker.close();
+  await coalesceWorker.close();
+  metricsServer?.close();
   process.exit(0);
 }
 
@@ -0,0 +1,36 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import { parseBody } from '../src/lib/body.js';
+import { saveBlob, readBlobBody, deleteBlob } from '../src/lib/blobStore.js';
+
+describe('parseBody', () => {
+  it('parses JSON, including +json types', () => {
+    assert.deepEqual(parseBody(Buffer.from('{"a":[1,2]}'), 'application/json; charset=utf-8'), { a: [1, 2] });
+    assert.deepEqual(parseBody(Buffer.from('{"a":1}'), 'application/vnd.api+json'), { a: 1 });
+    assert.throws(() => parseBody(Buffer.from('{'), 'application/json'), SyntaxError);
+  });
+
+  it('parses urlencoded bodies with nested keys, like express.urlencoded({ extended: true })', () => {
+    const body = parseBody(
+      Buffer.from('user[name]=Ada&user[langs][]=en&user[langs][]=fr&plain=a+b'),
+      'application/x-www-form-urlencoded'
+    );
+    assert.deepEqual(body, { user: { name: 'Ada', langs: ['en', 'fr'] }, plain: 'a b' });
+  });
+
+  it('keeps other types as text and empty bodies as {}', () => {
+    assert.equal(parseBody(Buffer.from('<a/>'), 'application/xml'), '<a/>');
+    assert.deepEqual(parseBody(Buffer.alloc(0), 'application/json'), {});
+  });
+});
+
+describe('readBlobBody', () => {
+  it('reads a spilled body back as it would have been parsed', async () => {
+    const handle = await saveBlob(Buffer.from('items[0]=x&items[1]=y'), 'application/x-www-form-urlencoded');
+    try {
+      assert.deepEqual(await readBlobBody(handle), { items: ['x', 'y'] });
+    } finally {
+      await deleteBlob(handle);
+    }
+  });
+});
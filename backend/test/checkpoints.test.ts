@@ -0,0 +1,70 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import { restoreCheckpoints, type StepCheckpoint } from '../src/services/checkpoints.js';
+import { buildStepGraph, runStepGraph } from '../src/services/dag.js';
+import type { WorkflowStep } from '../src/types/index.js';
+
+const get = (id: string): WorkflowStep =>
+  ({ id, type: 'http_request', config: { method: 'GET', url: `https://example.com/${id}` } }) as WorkflowStep;
+const conditional = (id: string, trueBranch: string[], falseBranch: string[]): WorkflowStep =>
+  ({ id, type: 'conditional', config: { condition: 'trigger.data.ok', trueBranch, falseBranch } }) as WorkflowStep;
+
+const checkpoint = (step_id: string, status: StepCheckpoint['status'], output_data: any = null): StepCheckpoint =>
+  ({ id: `row-${step_id}`, step_id, status, output_data });
+
+// Resumes `steps` from `checkpoints` and returns the ids of the steps run
+async function resume(steps: WorkflowStep[], checkpoints: StepCheckpoint[]) {
+  const restored = restoreCheckpoints(steps, checkpoints);
+  const ran: string[] = [];
+  await runStepGraph(buildStepGraph(steps), {
+    concurrency: 4,
+    completed: restored.completed,
+    skipped: restored.skipped,
+    runStep: async (step) => {
+      ran.push(step.id);
+    },
+  });
+  return { restored, ran };
+}
+
+describe('restoreCheckpoints', () => {
+  it('restores completed outputs and runs only the remaining steps', async () => {
+    const steps = [get('a'), get('b'), get('c')];
+    const { restored, ran } = await resume(steps, [
+      checkpoint('a', 'completed', { status: 200, body: 'A' }),
+      checkpoint('b', 'failed'),
+    ]);
+
+    assert.deepEqual(restored.outputs, { a: { status: 200, body: 'A' } });
+    assert.deepEqual([...restored.completed], ['a']);
+    // The failed step runs again on its own row
+    assert.deepEqual([...restored.existingRows], [['b', 'row-b']]);
+    assert.deepEqual(ran, ['b', 'c']);
+  });
+
+  it('keeps the untaken branch of a completed conditional skipped', async () => {
+    const steps = [conditional('check', ['yes'], ['no']), get('yes'), get('no')];
+    const { restored, ran } = await resume(steps, [checkpoint('check', 'completed', { result: false })]);
+
+    assert.deepEqual([...restored.skipped], ['yes']);
+    assert.deepEqual(ran, ['no']);
+  });
+
+  it('restores resume times of suspended delays and finished foreach items', () => {
+    const restored = restoreCheckpoints([], [
+      checkpoint('wait', 'waiting', { resumeAt: '2030-01-01T00:00:00.000Z' }),
+      checkpoint('loop', 'running', { completedItems: [[0, 3], [5, 6]] }),
+    ]);
+
+    assert.equal(restored.waitingUntil.get('wait'), Date.parse('2030-01-01T00:00:00.000Z'));
+    assert.deepEqual(restored.foreachDone.get('loop'), new Set([0, 1, 2, 5]));
+    assert.deepEqual([...restored.existingRows.keys()], ['wait', 'loop']);
+    assert.equal(restored.completed.size, 0);
+  });
+
+  it('starts from scratch without checkpoints', async () => {
+    const { restored, ran } = await resume([get('a'), get('b')], []);
+    assert.deepEqual(restored.outputs, {});
+    assert.deepEqual(ran, ['a', 'b']);
+  });
+});
@@ -0,0 +1,198 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import { buildStepGraph, runStepGraph } from '../src/services/dag.js';
+import type { WorkflowStep } from '../src/types/index.js';
+
+const get = (id: string, extra: Partial<WorkflowStep> = {}): WorkflowStep =>
+  ({ id, type: 'http_request', config: { method: 'GET', url: `https://example.com/${id}` }, ...extra }) as WorkflowStep;
+const post = (id: string, extra: Partial<WorkflowStep> = {}): WorkflowStep =>
+  ({ id, type: 'http_request', config: { method: 'POST', url: `https://example.com/${id}` }, ...extra }) as WorkflowStep;
+const email = (id: string, extra: Partial<WorkflowStep> = {}): WorkflowStep =>
+  ({ id, type: 'send_email', config: { to: 'a@example.com', subject: id, body: 'hi' }, ...extra }) as WorkflowStep;
+const delay = (id: string, extra: Partial<WorkflowStep> = {}): WorkflowStep =>
+  ({ id, type: 'delay', config: { duration: 1, unit: 'hours' }, ...extra }) as WorkflowStep;
+const transform = (id: string, expression: string, extra: Partial<WorkflowStep> = {}): WorkflowStep =>
+  ({ id, type: 'transform_data', config: { expression, language: 'expression' }, ...extra }) as WorkflowStep;
+const conditional = (id: string, trueBranch: string[], falseBranch: string[] = []): WorkflowStep =>
+  ({ id, type: 'conditional', config: { condition: 'trigger.data.ok', trueBranch, falseBranch } }) as WorkflowStep;
+
+// Runs the graph, recording start/finish events; `fail` maps step ids to errors
+async function run(
+  steps: WorkflowStep[],
+  options: {
+    concurrency?: number;
+    fail?: Record<string, Error>;
+    skip?: Record<string, string[]>;
+    completed?: Set<string>;
+  } = {}
+) {
+  const events: string[] = [];
+  const ran: string[] = [];
+  const skipped = new Set<string>();
+  let error: unknown;
+  try {
+    await runStepGraph(buildStepGraph(steps), {
+      concurrency: options.concurrency ?? 4,
+      completed: options.completed,
+      skipped,
+      runStep: async (step) => {
+        events.push(`start:${step.id}`);
+        ran.push(step.id);
+        await new Promise((resolve) => setTimeout(resolve, 5));
+        events.push(`end:${step.id}`);
+        if (options.fail?.[step.id]) throw options.fail[step.id];
+        return options.skip?.[step.id];
+      },
+    });
+  } catch (caught) {
+    error = caught;
+  }
+  return { events, ran, skipped, error };
+}
+
+const overlaps = (events: string[], a: string, b: string) =>
+  events.indexOf(`start:${b}`) < events.indexOf(`end:${a}`) &&
+  events.indexOf(`start:${a}`) < events.indexOf(`end:${b}`);
+
+describe('buildStepGraph ordering', () => {
+  it('runs workflows without dependsOn strictly in definition order', async () => {
+    const { events } = await run([post('a'), post('b'), email('c'), get('d')]);
+    assert.deepEqual(events, [
+      'start:a', 'end:a', 'start:b', 'end:b', 'start:c', 'end:c', 'start:d', 'end:d',
+    ]);
+  });
+
+  it('ignores references to later steps in definition order', () => {
+    const graph = buildStepGraph([get('a', { config: { method: 'GET', url: 'https://x/{{b.response}}' } as any }), get('b')]);
+    assert.deepEqual(graph.order, ['a', 'b']);
+    assert.equal(graph.dataDependencies.get('a')!.size, 0);
+  });
+
+  it('runs independent steps concurrently once a workflow uses dependsOn', async () => {
+    const { events } = await run([get('a', { dependsOn: [] }), get('b'), transform('c', 'a.response & b.response')]);
+    assert.ok(overlaps(events, 'a', 'b'));
+    assert.ok(events.indexOf('start:c') > events.indexOf('end:a'));
+    assert.ok(events.indexOf('start:c') > events.indexOf('end:b'));
+  });
+
+  it('keeps side-effecting steps in definition order in dependsOn mode', async () => {
+    const { events } = await run([post('a', { dependsOn: [] }), get('r'), email('b'), post('c')]);
+    assert.ok(events.indexOf('start:b') > events.indexOf('end:a'));
+    assert.ok(events.indexOf('start:c') > events.indexOf('end:b'));
+    assert.ok(overlaps(events, 'a', 'r'));
+  });
+
+  it('makes a delay wait for earlier steps and hold back later ones', () => {
+    const graph = buildStepGraph([get('a', { dependsOn: [] }), get('b'), delay('wait'), email('c'), get('d')]);
+    assert.deepEqual([...graph.dependencies.get('wait')!].sort(), ['a', 'b']);
+    assert.ok(graph.dependencies.get('c')!.has('wait'));
+    assert.ok(graph.dependencies.get('d')!.has('wait'));
+    // Ordering edges carry no data
+    assert.equal(graph.dataDependencies.get('c')!.size, 0);
+  });
+
+  it('orders steps after their dependencies even when defined earlier', () => {
+    const graph = buildStepGraph([get('b', { dependsOn: ['a'] }), get('a')]);
+    assert.deepEqual(graph.order, ['a', 'b']);
+  });
+});
+
+describe('delay suspension', () => {
+  class Suspended extends Error {}
+
+  it('does not start steps after a delay that suspends', async () => {
+    for (const steps of [
+      [post('before'), delay('wait'), email('after'), post('later')],
+      [post('before', { dependsOn: [] }), delay('wait'), email('after'), get('read')],
+    ]) {
+      const { ran, error } = await run(steps, { fail: { wait: new Suspended() } });
+      assert.ok(error instanceof Suspended);
+      assert.deepEqual(ran, ['before', 'wait']);
+    }
+  });
+
+  it('continues after the delay once it completes on resume', async () => {
+    const steps = [post('before'), delay('wait'), email('after')];
+    const { ran } = await run(steps, { completed: new Set(['before']) });
+    assert.deepEqual(ran, ['wait', 'after']);
+  });
+});
+
+describe('buildStepGraph validation', () => {
+  it('rejects dependency cycles', () => {
+    assert.throws(
+      () => buildStepGraph([get('a', { dependsOn: ['b'] }), get('b', { dependsOn: ['a'] }), get('c')]),
+      /dependency cycle: a, b/
+    );
+  });
+
+  it('rejects a cycle through template references', () => {
+    assert.throws(
+      () => buildStepGraph([
+        get('a', { dependsOn: [], config: { method: 'GET', url: 'https://x/{{b.response}}' } as any }),
+        get('b', { config: { method: 'GET', url: 'https://x/{{a.response}}' } as any }),
+      ]),
+      /dependency cycle/
+    );
+  });
+
+  it('rejects duplicate ids, unknown dependencies and unknown branches', () => {
+    assert.throws(() => buildStepGraph([get('a'), get('a')]), /Duplicate step id: a/);
+    assert.throws(() => buildStepGraph([get('a', { dependsOn: ['x'] })]), /unknown step: x/);
+    assert.throws(() => buildStepGraph([conditional('c', ['x'])]), /branches to unknown step: x/);
+    assert.throws(() => buildStepGraph([conditional('c', ['c'])]), /cannot branch to itself/);
+  });
+});
+
+describe('runStepGraph skipping', () => {
+  it('skips the untaken branch and steps that only read from it', async () => {
+    const steps = [
+      conditional('check', ['yes'], ['no']),
+      post('yes'),
+      post('no'),
+      get('reads-no', { config: { method: 'GET', url: 'https://x/{{no.response.id}}' } as any }),
+      email('always'),
+    ];
+    const { ran, skipped } = await run(steps, { skip: { check: ['no'] } });
+    assert.deepEqual(ran, ['check', 'yes', 'always']);
+    assert.deepEqual([...skipped].sort(), ['no', 'reads-no']);
+  });
+
+  it('runs a step that also reads from a step that did run', async () => {
+    const steps = [
+      conditional('check', ['yes'], ['no']),
+      post('yes'),
+      post('no'),
+      transform('both', 'yes.response & no.response'),
+    ];
+    const { ran } = await run(steps, { skip: { check: ['no'] } });
+    assert.deepEqual(ran, ['check', 'yes', 'both']);
+  });
+
+  it('stops scheduling after a failure and rethrows it', async () => {
+    const failure = new Error('boom');
+    const { ran, error } = await run([post('a'), post('b'), post('c')], { fail: { b: failure } });
+    assert.equal(error, failure);
+    assert.deepEqual(ran, ['a', 'b']);
+  });
+
+  it('does not rerun completed steps', async () => {
+    const { ran } = await run([post('a'), post('b'), post('c')], { completed: new Set(['a', 'b']) });
+    assert.deepEqual(ran, ['c']);
+  });
+
+  it('keeps at most `concurrency` steps in flight', async () => {
+    let inFlight = 0;
+    let peak = 0;
+    const steps = ['a', 'b', 'c', 'd', 'e'].map((id, i) => get(id, i === 0 ? { dependsOn: [] } : {}));
+    await runStepGraph(buildStepGraph(steps), {
+      concurrency: 2,
+      runStep: async () => {
+        peak = Math.max(peak, ++inFlight);
+        await new Promise((resolve) => setTimeout(resolve, 5));
+        inFlight--;
+      },
+    });
+    assert.equal(peak, 2);
+  });
+});
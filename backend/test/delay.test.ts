@@ -0,0 +1,68 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import { buildStepGraph, runStepGraph } from '../src/services/dag.js';
+import { executeDelay, ExecutionSuspended } from '../src/services/delay.js';
+import type { DelayConfig, WorkflowStep } from '../src/types/index.js';
+
+const steps = [
+  { id: 'fetch', type: 'http_request', config: { method: 'GET', url: 'https://example.com' } },
+  { id: 'wait', type: 'delay', config: { duration: 1, unit: 'hours' } },
+  { id: 'notify', type: 'send_email', config: { to: 'a@example.com', subject: 's', body: 'b' } },
+] as WorkflowStep[];
+
+// Runs the workflow the way executeWorkflow does, with delays continued
+// from `waitingUntil`; returns the steps that ran and the resume time
+async function runOnce(waitingUntil: Map<string, number>, completed: Set<string>) {
+  const ran: string[] = [];
+  let resumeAt: number | undefined;
+  try {
+    await runStepGraph(buildStepGraph(steps), {
+      concurrency: 4,
+      completed,
+      runStep: async (step) => {
+        ran.push(step.id);
+        if (step.type === 'delay') {
+          await executeDelay(step.config as DelayConfig, waitingUntil.get(step.id));
+        }
+        completed.add(step.id);
+      },
+    });
+  } catch (error) {
+    if (!(error instanceof ExecutionSuspended)) throw error;
+    resumeAt = error.resumeAt;
+  }
+  return { ran, resumeAt };
+}
+
+describe('delay steps', () => {
+  it('suspends long delays and waits out short ones', async () => {
+    const before = Date.now();
+    await assert.rejects(executeDelay({ duration: 1, unit: 'hours' }), (error: unknown) => {
+      assert.ok(error instanceof ExecutionSuspended);
+      assert.ok(error.resumeAt >= before + 60 * 60 * 1000);
+      return true;
+    });
+    assert.deepEqual(await executeDelay({ duration: 0.01, unit: 'seconds' }), { delayed: 10 });
+  });
+
+  it('does not run steps after a delay before its resume time', async () => {
+    const completed = new Set<string>();
+    const waitingUntil = new Map<string, number>();
+
+    const first = await runOnce(waitingUntil, completed);
+    assert.deepEqual(first.ran, ['fetch', 'wait']);
+    assert.ok(first.resumeAt! > Date.now());
+
+    // Re-run early (e.g. a retried job): the delay suspends again
+    waitingUntil.set('wait', first.resumeAt!);
+    const early = await runOnce(waitingUntil, completed);
+    assert.deepEqual(early.ran, ['wait']);
+    assert.equal(early.resumeAt, first.resumeAt);
+
+    // At the resume time the delay completes and the email runs
+    waitingUntil.set('wait', Date.now());
+    const resumed = await runOnce(waitingUntil, completed);
+    assert.deepEqual(resumed.ran, ['wait', 'notify']);
+    assert.equal(resumed.resumeAt, undefined);
+  });
+});
@@ -0,0 +1,184 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import {
+  parseExpression,
+  evaluateExpression,
+  collectExpressionRefs,
+  compileExpression,
+} from '../src/lib/expression.js';
+
+const evaluate = (source: string, context: Record<string, any> = {}) =>
+  evaluateExpression(parseExpression(source), context);
+
+const orders = {
+  fetch: {
+    response: {
+      body: {
+        items: [
+          { name: 'pen', price: 2, qty: 10, tags: ['office'] },
+          { name: 'lamp', price: 30, qty: 1, tags: ['home', 'office'] },
+          { name: 'desk', price: 200, qty: 2, tags: ['office'] },
+        ],
+      },
+    },
+  },
+};
+
+describe('expression paths', () => {
+  it('reads nested fields and returns undefined for missing ones', () => {
+    assert.equal(evaluate('fetch.response.body.items[0].name', orders), 'pen');
+    assert.equal(evaluate('fetch.response.missing.deeper', orders), undefined);
+  });
+
+  it('maps a path over arrays and flattens nested arrays', () => {
+    assert.deepEqual(evaluate('fetch.response.body.items.name', orders), ['pen', 'lamp', 'desk']);
+    assert.deepEqual(evaluate('fetch.response.body.items.tags', orders), ['office', 'home', 'office', 'office']);
+  });
+
+  it('indexes arrays, from the end with negative indexes, and by template-style numeric keys', () => {
+    assert.equal(evaluate('fetch.response.body.items[-1].name', orders), 'desk');
+    assert.equal(evaluate('fetch.response.body.items.1.name', orders), 'lamp');
+  });
+
+  it('reads root entries through templates and $$', () => {
+    assert.equal(evaluate('{{fetch.response.body.items.0.price}} + 1', orders), 3);
+    assert.deepEqual(evaluate('fetch.response.body.items[price > $$.limit].name', { ...orders, limit: 20 }), ['lamp', 'desk']);
+  });
+
+  it('never reaches the prototype chain', () => {
+    assert.equal(evaluate('a.constructor', { a: {} }), undefined);
+    assert.equal(evaluate('a.__proto__', { a: {} }), undefined);
+    assert.deepEqual(evaluate('{ "__proto__": 1, "x": 2 }'), { x: 2 });
+  });
+});
+
+describe('expression filters and operators', () => {
+  it('filters with predicates evaluated per element', () => {
+    assert.deepEqual(evaluate('fetch.response.body.items[price > 10].name', orders), ['lamp', 'desk']);
+    assert.deepEqual(evaluate('fetch.response.body.items["home" in tags].name', orders), ['lamp']);
+    assert.deepEqual(evaluate('fetch.response.body.items[price > 1000]', orders), []);
+  });
+
+  it('compares loosely between numbers and numeric strings', () => {
+    assert.equal(evaluate('status == "200"', { status: 200 }), true);
+    assert.equal(evaluate('status != 200', { status: '200' }), false);
+  });
+
+  it('supports boolean keywords, ternaries and concatenation', () => {
+    assert.equal(evaluate('a and not b or false', { a: true, b: false }), true);
+    assert.equal(evaluate('n > 1 ? "many" : "one"', { n: 2 }), 'many');
+    assert.equal(evaluate('"n=" & n', { n: 3 }), 'n=3');
+  });
+
+  it('treats empty arrays as false', () => {
+    assert.equal(evaluate('items ? "yes" : "no"', { items: [] }), 'no');
+  });
+
+  it('rejects arithmetic on non-numbers', () => {
+    assert.throws(() => evaluate('a * 2', { a: 'x' }), /Operator "\*" expects numbers, got "x"/);
+  });
+});
+
+describe('expression built-ins', () => {
+  it('aggregates', () => {
+    assert.equal(evaluate('$sum(fetch.response.body.items.price)', orders), 232);
+    assert.equal(evaluate('$count(fetch.response.body.items)', orders), 3);
+    assert.equal(evaluate('$max(fetch.response.body.items.price)', orders), 200);
+    assert.equal(evaluate('$avg([])'), undefined);
+  });
+
+  it('transforms strings and arrays', () => {
+    assert.equal(evaluate('$join($map(["a", "b"], function($s) { $uppercase($s) }), "-")'), 'A-B');
+    assert.deepEqual(evaluate('$distinct([1, 2, 1, 3])'), [1, 2, 3]);
+    assert.deepEqual(evaluate('$sort(fetch.response.body.items, function($i) { -$i.price }).name', orders), ['desk', 'lamp', 'pen']);
+    assert.deepEqual(evaluate('$keys($merge([{ "a": 1 }, { "b": 2 }]))'), ['a', 'b']);
+    assert.equal(evaluate('$round(2.345, 2)'), 2.35);
+  });
+
+  it('lets a variable shadow a built-in', () => {
+    assert.equal(evaluate('$reduce([function($x) { $x * 2 }], function($acc, $count) { $count(5) }, 0)'), 10);
+  });
+});
+
+describe('expression lambdas', () => {
+  it('maps, filters and reduces with lambdas', () => {
+    assert.deepEqual(evaluate('$map(fetch.response.body.items, function($i) { $i.qty * $i.price })', orders), [20, 30, 400]);
+    assert.deepEqual(evaluate('$filter([1, 2, 3, 4], function($n, $i) { $n % 2 = 0 })'), [2, 4]);
+    assert.equal(evaluate('$reduce([1, 2, 3], function($acc, $n) { $acc + $n }, 10)'), 16);
+  });
+
+  it('closes over the scope it was created in', () => {
+    assert.deepEqual(
+      evaluate('$map([1, 2], function($x) { $map([10], function($y) { $x + $y }) })'),
+      [[11], [12]]
+    );
+  });
+
+  it('refuses to return a function', () => {
+    assert.throws(() => evaluate('function($x) { $x }'), /evaluated to a function/);
+  });
+
+  it('does not take data shaped like a function for one', () => {
+    const data = { payload: { params: ['a'], body: { type: 'literal', value: 1 }, scope: {} } };
+    assert.deepEqual(evaluate('payload', data), data.payload);
+    assert.deepEqual(evaluate('payload.params', data), ['a']);
+    assert.throws(() => evaluate('$map([1], payload)', data), /Expected a function argument/);
+  });
+});
+
+describe('expression errors', () => {
+  it('reports the position of syntax errors', () => {
+    assert.throws(() => parseExpression('a + * b'), /Unexpected token "\*" at position 4/);
+    assert.throws(() => parseExpression('a[1'), /Expected "\]" at position 3/);
+    assert.throws(() => parseExpression('"abc'), /Unterminated string at position 0/);
+    assert.throws(() => parseExpression('{{a.b'), /Unterminated template at position 0/);
+    assert.throws(() => parseExpression('a # b'), /Unexpected character "#" at position 2/);
+    assert.throws(() => parseExpression('a b'), /Unexpected token "b" at position 2/);
+    assert.throws(() => parseExpression('(a'), /Expected "\)" at position 2/);
+    assert.throws(() => parseExpression('a +'), /Unexpected end of expression/);
+  });
+});
+
+describe('collectExpressionRefs', () => {
+  const refs = (source: string) => collectExpressionRefs(parseExpression(source)).sort();
+
+  it('collects root names and template roots', () => {
+    assert.deepEqual(refs('fetch.response.body.total > limit.value'), ['fetch', 'limit']);
+    assert.deepEqual(refs('{{check.response.status}} == 200'), ['check']);
+  });
+
+  it('ignores names inside predicates, variables and literals', () => {
+    assert.deepEqual(refs('orders[price > 10].name'), ['orders']);
+    assert.deepEqual(refs('$count($x) + 1'), []);
+    assert.deepEqual(refs('"fetch" & 1'), []);
+  });
+
+  it('collects through calls, lambdas, objects and ternaries', () => {
+    assert.deepEqual(refs('$map(items, function($i) { $i.qty * rate.value })'), ['items', 'rate']);
+    assert.deepEqual(refs('{ "a": left, "b": [right] }'), ['left', 'right']);
+    assert.deepEqual(refs('cond ? yes : no'), ['cond', 'no', 'yes']);
+  });
+
+  it('is what compileExpression exposes', () => {
+    assert.deepEqual(compileExpression('a.b + c').refs.sort(), ['a', 'c']);
+    assert.equal(compileExpression('a.b + c'), compileExpression('a.b + c'));
+  });
+});
+
+describe('isSimpleExpression', () => {
+  const simple = (source: string) => compileExpression(source).simple;
+
+  it('accepts paths, comparisons, arithmetic and literal indexes', () => {
+    assert.equal(simple('{{check.response.status}} == 200 && !done'), true);
+    assert.equal(simple('fetch.response.body.items[0].price * 2 > limit'), true);
+    assert.equal(simple('items[-1]'), true);
+    assert.equal(simple('ok ? { "a": [1, x.y] } : null'), true);
+  });
+
+  it('rejects calls, lambdas and predicates', () => {
+    assert.equal(simple('$count(items) > 0'), false);
+    assert.equal(simple('items[price > 10]'), false);
+    assert.equal(simple('items[-n]'), false);
+    assert.equal(simple('ok ? $map(items, function($i) { $i }) : []'), false);
+  });
+});
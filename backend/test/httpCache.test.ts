@@ -0,0 +1,78 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import { redis } from '../src/lib/redis.js';
+import {
+  freshnessLifetime,
+  httpCacheKey,
+  isFresh,
+  hasValidators,
+  storeCachedResponse,
+  getCachedResponse,
+  type CachedResponse,
+} from '../src/lib/httpCache.js';
+
+const entry = (overrides: Partial<CachedResponse> = {}): CachedResponse => ({
+  status: 200,
+  statusText: 'OK',
+  headers: {},
+  body: { ok: true },
+  expiresAt: Date.now() + 60_000,
+  ...overrides,
+});
+
+describe('freshnessLifetime', () => {
+  it('uses the step cacheTtl when positive, else max-age / s-maxage', () => {
+    assert.equal(freshnessLifetime({ 'cache-control': 'max-age=5' }, 30), 30_000);
+    assert.equal(freshnessLifetime({ 'cache-control': 'public, max-age=5' }, 0), 5_000);
+    assert.equal(freshnessLifetime({ 'cache-control': 's-maxage=7' }, 0), 7_000);
+    assert.equal(freshnessLifetime({}, 0), 0);
+  });
+
+  it('makes no-cache responses stale at once, so they are revalidated', () => {
+    assert.equal(freshnessLifetime({ 'cache-control': 'no-cache, max-age=60' }, 0), 0);
+  });
+
+  it('refuses no-store, private and Vary: * even with a cacheTtl', () => {
+    assert.equal(freshnessLifetime({ 'cache-control': 'no-store' }, 30), null);
+    assert.equal(freshnessLifetime({ 'cache-control': 'private, max-age=60' }, 30), null);
+    assert.equal(freshnessLifetime({ vary: 'Accept, *' }, 30), null);
+    assert.equal(freshnessLifetime({ vary: 'Accept' }, 30), 30_000);
+  });
+});
+
+describe('cache entries', () => {
+  it('keys on the URL and every request header', () => {
+    const key = httpCacheKey('https://api.example.com/a', { Authorization: 'Bearer 1', Accept: 'x' });
+    assert.equal(key, httpCacheKey('https://api.example.com/a', { Accept: 'x', Authorization: 'Bearer 1' }));
+    assert.notEqual(key, httpCacheKey('https://api.example.com/a', { Authorization: 'Bearer 2', Accept: 'x' }));
+    assert.notEqual(key, httpCacheKey('https://api.example.com/b', { Authorization: 'Bearer 1', Accept: 'x' }));
+  });
+
+  it('tells fresh entries and revalidatable ones apart', () => {
+    assert.equal(isFresh(entry()), true);
+    assert.equal(isFresh(entry({ expiresAt: Date.now() - 1 })), false);
+    assert.equal(hasValidators(entry()), false);
+    assert.equal(hasValidators(entry({ etag: '"v1"' })), true);
+    assert.equal(hasValidators(entry({ lastModified: 'Wed, 01 Jan 2025 00:00:00 GMT' })), true);
+  });
+
+  it('keeps stale entries with validators for revalidation, and drops those without', async (t) => {
+    const writes: [string, number][] = [];
+    t.mock.method(redis, 'set', async (key: string, _value: string, _px: string, ms: number) => {
+      writes.push([key, ms]);
+      return 'OK';
+    });
+    t.mock.method(redis, 'get', async () => null);
+
+    await storeCachedResponse('stale-without-validators', entry({ expiresAt: Date.now() - 1 }));
+    assert.equal(writes.length, 0);
+    assert.equal(await getCachedResponse('stale-without-validators'), null);
+
+    const revalidatable = entry({ expiresAt: Date.now() - 1, etag: '"v1"' });
+    await storeCachedResponse('stale-with-etag', revalidatable);
+    assert.equal(writes.length, 1);
+    assert.ok(writes[0][1] > 0);
+    // Served from the in-process layer without another Redis read
+    assert.deepEqual(await getCachedResponse('stale-with-etag'), revalidatable);
+  });
+});
@@ -0,0 +1,21 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import { toIndexRanges, fromIndexRanges } from '../src/lib/indexRanges.js';
+
+describe('index ranges', () => {
+  it('collapses runs of indexes into [start, end) ranges', () => {
+    assert.deepEqual(toIndexRanges([5, 0, 1, 2, 7, 6, 2]), [[0, 3], [5, 8]]);
+    assert.deepEqual(toIndexRanges([]), []);
+  });
+
+  it('keeps a checkpoint of many completed items small', () => {
+    const done = new Set(Array.from({ length: 10000 }, (_, i) => i));
+    done.delete(4321);
+    assert.deepEqual(toIndexRanges(done), [[0, 4321], [4322, 10000]]);
+  });
+
+  it('round-trips', () => {
+    const indexes = new Set([0, 3, 4, 5, 9, 11, 12]);
+    assert.deepEqual(fromIndexRanges(toIndexRanges(indexes)), indexes);
+  });
+});
@@ -0,0 +1,104 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import { setTimeout as sleep } from 'node:timers/promises';
+import { createExecutionJournal } from '../src/services/journal.js';
+import type { StepExecutionRecord } from '../src/services/workflows.js';
+import type { WorkflowStep } from '../src/types/index.js';
+
+function step(id: string): WorkflowStep {
+  return { id, name: id, type: 'transform_data', config: { expression: '1' } } as WorkflowStep;
+}
+
+function recordingWriter() {
+  const batches: StepExecutionRecord[][] = [];
+  return {
+    batches,
+    write: async (records: StepExecutionRecord[]) => {
+      batches.push(records);
+    },
+  };
+}
+
+describe('execution journal', () => {
+  it('writes the latest state of every changed row in one batch', async () => {
+    const { batches, write } = recordingWriter();
+    const journal = createExecutionJournal('exec-1', write);
+
+    const a = journal.stepStarted(step('a'), null);
+    const b = journal.stepStarted(step('b'), null);
+    journal.stepCompleted(a, { ok: true });
+    journal.stepFailed(b, 'boom');
+    await journal.flush();
+
+    assert.equal(batches.length, 1);
+    const byStep = Object.fromEntries(batches[0].map(record => [record.step_id, record]));
+    assert.equal(byStep.a.status, 'completed');
+    assert.deepEqual(byStep.a.output_data, { ok: true });
+    assert.equal(byStep.b.status, 'failed');
+    assert.equal(byStep.b.error, 'boom');
+    assert.ok(batches[0].every(record => record.execution_id === 'exec-1'));
+
+    // Nothing changed since: no empty write
+    await journal.close();
+    assert.equal(batches.length, 1);
+  });
+
+  it('flushes on a timer after step boundaries', async () => {
+    const { batches, write } = recordingWriter();
+    const journal = createExecutionJournal('exec-2', write);
+    journal.stepStarted(step('a'), null);
+    assert.equal(batches.length, 0);
+
+    await sleep(400);
+    assert.equal(batches.length, 1);
+    await journal.close();
+  });
+
+  it('flushes at once when a batch is full', async () => {
+    const { batches, write } = recordingWriter();
+    const journal = createExecutionJournal('exec-3', write);
+    for (let i = 0; i < 50; i++) {
+      journal.stepStarted(step(`s${i}`), null);
+    }
+    await sleep(0);
+    assert.equal(batches.length, 1);
+    assert.equal(batches[0].length, 50);
+    await journal.close();
+  });
+
+  it('continues an existing row when given its id', async () => {
+    const { batches, write } = recordingWriter();
+    const journal = createExecutionJournal('exec-4', write);
+    const id = journal.stepStarted(step('wait'), null, 'row-from-earlier-run');
+    journal.stepWaiting(id, { resumeAt: '2030-01-01T00:00:00.000Z' });
+    await journal.close();
+
+    assert.equal(id, 'row-from-earlier-run');
+    assert.equal(batches[0][0].id, 'row-from-earlier-run');
+    assert.equal(batches[0][0].status, 'waiting');
+  });
+
+  it('keeps rows dirty when a write fails, so the next flush retries them', async () => {
+    const batches: StepExecutionRecord[][] = [];
+    let fail = true;
+    const journal = createExecutionJournal('exec-5', async (records) => {
+      if (fail) throw new Error('db down');
+      batches.push(records);
+    });
+
+    const id = journal.stepStarted(step('a'), null);
+    journal.stepCompleted(id, 42);
+    await assert.rejects(journal.flush(), /db down/);
+
+    fail = false;
+    await journal.close();
+    assert.equal(batches.length, 1);
+    assert.equal(batches[0][0].status, 'completed');
+    assert.equal(batches[0][0].output_data, 42);
+  });
+
+  it('rejects transitions of unknown rows', () => {
+    const journal = createExecutionJournal('exec-6', async () => {});
+    assert.throws(() => journal.stepCompleted('nope', null), /Unknown step execution/);
+  });
+});
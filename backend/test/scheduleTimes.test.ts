@@ -0,0 +1,65 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import { computeNextRun, computeNextDue, scheduleOffsetMs } from '../src/services/scheduleTimes.js';
+
+describe('computeNextRun', () => {
+  it('evaluates cron expressions in the schedule time zone', () => {
+    const after = new Date('2025-03-03T10:00:00Z'); // a Monday
+    assert.equal(computeNextRun('0 9 * * MON', 'UTC', after).toISOString(), '2025-03-10T09:00:00.000Z');
+    // 09:00 in New York is 14:00 UTC before the DST switch
+    assert.equal(computeNextRun('0 9 * * *', 'America/New_York', after).toISOString(), '2025-03-03T14:00:00.000Z');
+  });
+
+  it('accepts a leading seconds field', () => {
+    const after = new Date('2025-03-03T10:00:00Z');
+    assert.equal(computeNextRun('30 * * * * *', 'UTC', after).toISOString(), '2025-03-03T10:00:30.000Z');
+  });
+
+  it('throws on invalid expressions and time zones', () => {
+    assert.throws(() => computeNextRun('not a cron', 'UTC'));
+    assert.throws(() => computeNextRun('0 9 * * *', 'Mars/Olympus'));
+  });
+});
+
+describe('scheduleOffsetMs', () => {
+  it('is a stable offset within the jitter window', () => {
+    const offset = scheduleOffsetMs('workflow-1', 300);
+    assert.equal(scheduleOffsetMs('workflow-1', 300), offset);
+    assert.ok(offset >= 0 && offset < 300_000);
+  });
+
+  it('spreads workflows over the window', () => {
+    const offsets = new Set(Array.from({ length: 50 }, (_, i) => scheduleOffsetMs(`workflow-${i}`, 60)));
+    assert.ok(offsets.size > 40);
+  });
+
+  it('is zero without jitter', () => {
+    assert.equal(scheduleOffsetMs('workflow-1', 0), 0);
+  });
+});
+
+describe('computeNextDue', () => {
+  const offsetMs = 90_000;
+
+  it('runs at the offset after each cron time', () => {
+    const after = new Date('2025-03-03T08:00:00Z');
+    assert.equal(computeNextDue('0 9 * * *', 'UTC', offsetMs, after).toISOString(), '2025-03-03T09:01:30.000Z');
+  });
+
+  it('keeps the current tick while its offset run is still ahead', () => {
+    // Past the cron time but before cron time + offset
+    const after = new Date('2025-03-03T09:00:30Z');
+    assert.equal(computeNextDue('0 9 * * *', 'UTC', offsetMs, after).toISOString(), '2025-03-03T09:01:30.000Z');
+  });
+
+  it('moves on once the offset run is due', () => {
+    const after = new Date('2025-03-03T09:01:30Z');
+    assert.equal(computeNextDue('0 9 * * *', 'UTC', offsetMs, after).toISOString(), '2025-03-04T09:01:30.000Z');
+  });
+
+  it('fires a schedule that fell behind once, then continues from now', () => {
+    // Due days ago; the next due time is computed from the poll time
+    const now = new Date('2025-03-10T12:00:00Z');
+    assert.equal(computeNextDue('0 9 * * *', 'UTC', 0, now).toISOString(), '2025-03-11T09:00:00.000Z');
+  });
+});
@@ -0,0 +1,77 @@
+import { describe, it } from 'node:test';
+import assert from 'node:assert/strict';
+import {
+  compileTemplate,
+  compileConfig,
+  getCompiledConfig,
+  getWorkflowVersionKey,
+} from '../src/services/templates.js';
+
+const context = {
+  trigger: { data: { name: 'Ada', tags: ['a', 'b'], count: 0, empty: null } },
+  fetch: { response: { status: 200, body: { items: [{ id: 1 }] } } },
+};
+
+describe('compileTemplate', () => {
+  it('substitutes context paths, including array indexes', () => {
+    const render = compileTemplate('Hi {{ trigger.data.name }}, item {{fetch.response.body.items.0.id}}!');
+    assert.equal(render(context), 'Hi Ada, item 1!');
+  });
+
+  it('renders objects as JSON and keeps falsy values', () => {
+    assert.equal(compileTemplate('{{trigger.data.tags}}')(context), '["a","b"]');
+    assert.equal(compileTemplate('n={{trigger.data.count}}')(context), 'n=0');
+    assert.equal(compileTemplate('{{trigger.data.empty}}')(context), 'null');
+  });
+
+  it('keeps the placeholder of a missing path', () => {
+    assert.equal(compileTemplate('x {{trigger.data.missing.deep}} y')(context), 'x {{trigger.data.missing.deep}} y');
+    assert.equal(compileTemplate('{{nope}}')(context), '{{nope}}');
+  });
+
+  it('collects the paths it reads', () => {
+    const paths = new Set<string>();
+    compileTemplate('{{ a.b }} and {{c}}', paths);
+    assert.deepEqual([...paths], ['a.b', 'c']);
+  });
+});
+
+describe('compileConfig', () => {
+  it('renders nested objects and arrays and lists every path', () => {
+    const config = {
+      url: 'https://api.example.com/users/{{trigger.data.name}}',
+      method: 'GET',
+      headers: { 'X-Count': '{{fetch.response.status}}' },
+      list: ['static', '{{trigger.data.tags}}'],
+    };
+    const compiled = compileConfig(config);
+    assert.deepEqual(compiled.render(context), {
+      url: 'https://api.example.com/users/Ada',
+      method: 'GET',
+      headers: { 'X-Count': '200' },
+      list: ['static', '["a","b"]'],
+    });
+    assert.deepEqual(compiled.paths.sort(), ['fetch.response.status', 'trigger.data.name', 'trigger.data.tags']);
+  });
+
+  it('shares configs and subtrees without templates instead of copying them', () => {
+    const plain = { method: 'GET', headers: { accept: 'application/json' } };
+    assert.equal(compileConfig(plain).render(context), plain);
+
+    const config = { url: '{{trigger.data.name}}', headers: plain.headers };
+    assert.equal(compileConfig(config).render(context).headers, plain.headers);
+  });
+});
+
+describe('getCompiledConfig', () => {
+  it('caches per workflow version and step', () => {
+    const versionKey = getWorkflowVersionKey({ id: 'wf', updated_at: '2025-01-01T00:00:00Z' });
+    const first = getCompiledConfig(versionKey, 'step_1', { body: '{{trigger.data.name}}' });
+    assert.equal(getCompiledConfig(versionKey, 'step_1', { body: 'ignored' }), first);
+
+    // An edit bumps updated_at and with it the version key
+    const edited = getWorkflowVersionKey({ id: 'wf', updated_at: '2025-01-02T00:00:00Z' });
+    assert.notEqual(edited, versionKey);
+    assert.deepEqual(getCompiledConfig(edited, 'step_1', { body: 'plain' }).render(context), { body: 'plain' });
+  });
+});
@@ -0,0 +1,78 @@
+import { describe, it, type TestContext } from 'node:test';
+import assert from 'node:assert/strict';
+import type { Request } from 'express';
+import { redis } from '../src/lib/redis.js';
+import {
+  headerIdempotencyKey,
+  claimIdempotencyKey,
+  releaseIdempotencyKey,
+} from '../src/services/webhookIdempotency.js';
+
+// In-memory stand-in for the SET NX EX / GET / DEL the claims use
+function fakeRedis(t: TestContext) {
+  const store = new Map<string, { value: string; ttl: number }>();
+  t.mock.method(redis, 'set', async (key: string, value: string, _ex: string, ttl: number, _nx: string) => {
+    if (store.has(key)) return null;
+    store.set(key, { value, ttl });
+    return 'OK';
+  });
+  t.mock.method(redis, 'get', async (key: string) => store.get(key)?.value ?? null);
+  t.mock.method(redis, 'del', async (key: string) => (store.delete(key) ? 1 : 0));
+  return store;
+}
+
+describe('headerIdempotencyKey', () => {
+  const req = (headers: Record<string, string | string[]>) => ({ headers }) as unknown as Request;
+
+  it('reads the configured header case-insensitively', () => {
+    const idempotency = { header: 'Idempotency-Key' };
+    assert.equal(headerIdempotencyKey(req({ 'idempotency-key': 'abc' }), idempotency), 'header:abc');
+    assert.equal(headerIdempotencyKey(req({ 'idempotency-key': ['a', 'b'] }), idempotency), 'header:a');
+    assert.equal(headerIdempotencyKey(req({}), idempotency), null);
+  });
+
+  it('is off without a configured header', () => {
+    assert.equal(headerIdempotencyKey(req({ 'idempotency-key': 'abc' }), null), null);
+    assert.equal(headerIdempotencyKey(req({ 'idempotency-key': 'abc' }), { bodyHash: true }), null);
+  });
+});
+
+describe('idempotency claims', () => {
+  it('gives a repeated delivery the first execution id', async (t) => {
+    fakeRedis(t);
+    assert.equal(await claimIdempotencyKey('wf', 'header:1', 'exec-1', {}), null);
+    assert.equal(await claimIdempotencyKey('wf', 'header:1', 'exec-2', {}), 'exec-1');
+  });
+
+  it('scopes keys to the workflow and applies the trigger ttl', async (t) => {
+    const store = fakeRedis(t);
+    await claimIdempotencyKey('wf-a', 'header:1', 'exec-1', { ttlSeconds: 60 });
+    assert.equal(await claimIdempotencyKey('wf-b', 'header:1', 'exec-2', {}), null);
+    assert.equal(store.get('webhook-idempotency:wf-a:header:1')?.ttl, 60);
+    assert.equal(store.get('webhook-idempotency:wf-b:header:1')?.ttl, 24 * 60 * 60);
+  });
+
+  it('lets the sender retry once a rejected delivery released its key', async (t) => {
+    const store = fakeRedis(t);
+    await claimIdempotencyKey('wf', 'body:abc', 'exec-1', {});
+    await releaseIdempotencyKey('wf', 'body:abc');
+    assert.equal(await claimIdempotencyKey('wf', 'body:abc', 'exec-2', {}), null);
+    assert.equal(store.get('webhook-idempotency:wf:body:abc')?.value, 'exec-2');
+  });
+
+  it('claims again when the key expires between SET and GET', async (t) => {
+    const store = fakeRedis(t);
+    const set = redis.set as unknown as { mock: { callCount(): number } };
+    // The first GET finds the key gone, as if it expired after SET NX failed
+    store.set('webhook-idempotency:wf:header:1', { value: 'exec-old', ttl: 1 });
+    const get = t.mock.method(redis, 'get', async (key: string) => {
+      store.delete(key);
+      return null;
+    });
+
+    assert.equal(await claimIdempotencyKey('wf', 'header:1', 'exec-new', {}), null);
+    assert.equal(get.mock.callCount(), 1);
+    assert.equal(set.mock.callCount(), 2);
+    assert.equal(store.get('webhook-idempotency:wf:header:1')?.value, 'exec-new');
+  });
+});
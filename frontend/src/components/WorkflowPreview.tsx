@@ -11,8 +11,10 @@ import {
   Rocket,
   ChevronDown,
   ChevronUp,
+  GitBranch,
+  Repeat,
 } from 'lucide-react';
-import type { WorkflowDefinition, HttpRequestConfig, SendEmailConfig, DelayConfig } from '../types';
+import type { WorkflowDefinition, HttpRequestConfig, SendEmailConfig, DelayConfig, ForEachConfig } from '../types';
 import { useChatStore, useAuthStore } from '../stores';
 import { chatApi } from '../lib/api';
 
@@ -31,7 +33,9 @@ const stepIcons: Record<string, React.ElementType> = {
   http_request: Globe,
   send_email: Mail,
   transform_data: ArrowRight,
+  conditional: GitBranch,
   delay: Timer,
+  foreach: Repeat,
 };
 
 const triggerLabels: Record<string, string> = {
@@ -44,7 +48,9 @@ const stepLabels: Record<string, string> = {
   http_request: 'HTTP Request',
   send_email: 'Send Email',
   transform_data: 'Transform Data',
+  conditional: 'Condition',
   delay: 'Delay',
+  foreach: 'For Each',
 };
 
 export function WorkflowPreview({ workflow, isComplete }: WorkflowPreviewProps) {
@@ -153,6 +159,8 @@ export function WorkflowPreview({ workflow, isComplete }: WorkflowPreviewProps)
                               `To: ${(step.config as SendEmailConfig).to}`}
                             {step.type === 'delay' &&
                               `Wait ${(step.config as DelayConfig).duration} ${(step.config as DelayConfig).unit}`}
+                            {step.type === 'foreach' &&
+                              `Each of ${(step.config as ForEachConfig).items}: ${stepLabels[(step.config as ForEachConfig).step.type]}`}
                           </div>
                         </div>
                         <div className="text-xs text-gray-400">#{index + 1}</div>
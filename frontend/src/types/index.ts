@@ -15,7 +15,7 @@ export interface AuthState {
 
 // Workflow types
 export type TriggerType = 'schedule' | 'webhook' | 'manual';
-export type StepType = 'http_request' | 'send_email' | 'transform_data' | 'conditional' | 'delay';
+export type StepType = 'http_request' | 'send_email' | 'transform_data' | 'conditional' | 'delay' | 'foreach';
 export type HttpMethod = 'GET' | 'POST' | 'PUT' | 'PATCH' | 'DELETE';
 
 export interface TriggerConfig {
@@ -47,19 +47,39 @@ export interface SendEmailConfig {
 
 export interface TransformDataConfig {
   expression: string;
+  language?: 'template' | 'expression';
   outputKey?: string;
 }
 
+export interface ConditionalConfig {
+  condition: string;
+  trueBranch: string[];
+  falseBranch?: string[];
+}
+
 export interface DelayConfig {
   duration: number;
   unit: 'seconds' | 'minutes' | 'hours' | 'days';
 }
 
+export interface ForEachConfig {
+  items: string;
+  step: {
+    type: 'http_request' | 'send_email' | 'transform_data';
+    config: Record<string, any>;
+  };
+  parallelism?: number;
+  chunkSize?: number;
+  itemRetries?: number;
+  itemRetryDelay?: number;
+  continueOnError?: boolean;
+}
+
 export interface WorkflowStep {
   id: string;
   name?: string;
   type: StepType;
-  config: HttpRequestConfig | SendEmailConfig | TransformDataConfig | DelayConfig;
+  config: HttpRequestConfig | SendEmailConfig | TransformDataConfig | ConditionalConfig | DelayConfig | ForEachConfig;
   dependsOn?: string[];
   retryConfig?: {
     maxRetries: number;
@@ -90,7 +110,7 @@ export interface Workflow {
 }
 
 // Execution types
-export type ExecutionStatus = 'pending' | 'running' | 'completed' | 'failed' | 'cancelled';
+export type ExecutionStatus = 'pending' | 'running' | 'waiting' | 'completed' | 'failed' | 'cancelled';
 
 export interface WorkflowExecution {
   id: string;